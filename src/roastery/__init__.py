@@ -1,4 +1,4 @@
-from roastery import formats, cli, edit, importer, term
+from roastery import formats, bulk, cli, edit, importer, rules, server, sources, term
 
 from roastery.cli import make_cli
 from roastery.config import Config
@@ -12,9 +12,13 @@ __all__ = [
     "import_csv",
     "make_cli",
     # Re-export modules.
+    "bulk",
     "cli",
     "edit",
     "importer",
+    "rules",
+    "server",
+    "sources",
     "term",
     "formats",
 ]
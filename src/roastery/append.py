@@ -0,0 +1,253 @@
+"""
+Import statements that only ever grow, by reading just the new rows.
+
+Some banks offer a running export: a single CSV file to which new transactions
+are appended. :py:func:`import_csv_append` imports such a file incrementally.
+After each import it records, under ``.roastery/append/``:
+
+- The header of the CSV file.
+- The byte offset up to which the file was imported, and fingerprints of the
+  first few kilobytes of the file and of the last row before that offset.
+- The size and line count of the generated beancount file.
+
+On the next import, the recorded header and fingerprints are compared with the
+file. If they match, only the rows after the offset are parsed, and the new
+transactions are appended to the beancount file. The cost of an import then
+depends on the number of new rows, not on the size of the file.
+
+If anything doesn't match, for example because the bank rewrote older rows, or
+the beancount file was changed by something else, the whole file is imported
+again with :py:func:`roastery.importer.import_csv`, which also records it in the
+:py:mod:`roastery.catalog`. Rows in the middle of a large file are not checked,
+as that would mean reading the whole file again.
+
+Appended transactions only get the manual edits, flags, and cleaning rules that
+exist at the time they are appended. Use :py:func:`roastery.importer.import_csv`
+or :py:mod:`roastery.plugin` to apply later changes to older transactions. With
+:py:obj:`roastery.config.Config.sort_entries`, only the new transactions are sorted
+among themselves. With :py:obj:`roastery.config.Config.assert_balances`, only the
+first, full import writes balance assertions: appended transactions don't get any.
+Append mode is not used for compressed files or archive
+members, or with :py:obj:`roastery.config.Config.export_columns`: those are always
+imported in full.
+
+API
+---
+
+.. autofunction:: import_csv_append
+"""
+
+import csv
+import hashlib
+import io
+import itertools
+import json
+from pathlib import Path
+from typing import Any, BinaryIO, Iterator
+
+from roastery import atomic, catalog
+from roastery.config import Config
+from roastery.importer import (
+    CleanFn,
+    Entry,
+    ExtractFn,
+    import_csv,
+    process_entries,
+    write_entries,
+)
+from roastery.sources import Source, as_source
+
+__all__ = [
+    "import_csv_append",
+]
+
+# Version of the state format. Bump this when changing what is stored.
+_STATE_VERSION = 1
+
+# Number of bytes at the start of the file that must not change.
+_HEAD_BYTES = 4096
+
+# Size of the blocks in which the last row is searched, from the end of the file.
+_BLOCK_BYTES = 65536
+
+
+def _fingerprint(data: bytes) -> str:
+    return hashlib.blake2b(data).hexdigest()
+
+
+def _last_line_start(f: BinaryIO, start: int, end: int) -> int:
+    """Offset of the last line between ``start`` and ``end``, read backwards."""
+    pos = end - 1
+    while pos > start:
+        size = min(_BLOCK_BYTES, pos - start)
+        f.seek(pos - size)
+        newline = f.read(size).rfind(b"\n")
+        if newline >= 0:
+            return pos - size + newline + 1
+        pos -= size
+    return start
+
+
+def _read_state(path: Path) -> dict[str, Any] | None:
+    try:
+        state = json.loads(path.read_text())
+    except (ValueError, FileNotFoundError):
+        return None
+    return state if state.get("version") == _STATE_VERSION else None
+
+
+def _can_append(
+    state: dict[str, Any] | None, header: bytes, csv_file: Path, beancount_file: Path
+) -> bool:
+    if state is None or state["header"] != _fingerprint(header):
+        return False
+
+    try:
+        if beancount_file.stat().st_size != state["beancount_offset"]:
+            return False
+        with csv_file.open("rb") as f:
+            head = f.read(min(state["offset"], _HEAD_BYTES))
+            f.seek(state["last_row_start"])
+            last_row = f.read(state["offset"] - state["last_row_start"])
+    except FileNotFoundError:
+        return False
+
+    return (
+        _fingerprint(head) == state["head"]
+        and _fingerprint(last_row) == state["last_row"]
+    )
+
+
+def import_csv_append(
+    *,
+    csv_file: Path | Source,
+    config: Config,
+    extract: ExtractFn,
+    beancount_file: Path = None,
+    clean: CleanFn = None,
+    csv_args: dict[str, any] = None,
+) -> bool:
+    """Import the rows that were added to ``csv_file`` since the last import.
+
+    The parameters are the same as for :py:func:`roastery.importer.import_csv`.
+
+    :return: ``True`` if only the new rows were imported, ``False`` if the whole
+      file was imported.
+    """
+    source = as_source(csv_file)
+    beancount_file = (
+        source.beancount_file() if beancount_file is None else beancount_file
+    )
+    kwargs = dict(
+        csv_file=source,
+        config=config,
+        extract=extract,
+        beancount_file=beancount_file,
+        clean=clean,
+        csv_args=csv_args,
+    )
+    if source.member is not None or source.is_compressed or config.export_columns:
+        import_csv(**kwargs)
+        return False
+
+    _csv_args = {} if csv_args is None else csv_args
+    state_path = config.state_file("append", beancount_file, ".json")
+    state = _read_state(state_path)
+
+    with source.path.open("rb") as f:
+        # Headerless files have their column names in the arguments.
+        header = b"" if "fieldnames" in _csv_args else f.readline()
+    appending = _can_append(state, header, source.path, beancount_file)
+
+    if appending:
+        start = state["offset"]
+        n_rows, end, offset = _append_rows(
+            source,
+            state,
+            header,
+            config=config,
+            extract=extract,
+            clean=clean,
+            beancount_file=beancount_file,
+            csv_args=_csv_args,
+        )
+    else:
+        start = len(header)
+        end = import_csv(**kwargs)
+        info = catalog.lookup(config, source, extract=extract)
+        if info is None:
+            # The file changed during the import: start over next time.
+            state_path.unlink(missing_ok=True)
+            return False
+        n_rows, offset = info.rows, info.size
+
+    with source.path.open("rb") as f:
+        if appending and offset == start:
+            last_row_start = state["last_row_start"]
+        else:
+            last_row_start = _last_line_start(f, start, offset)
+        f.seek(0)
+        head = f.read(min(offset, _HEAD_BYTES))
+        f.seek(last_row_start)
+        last_row = f.read(offset - last_row_start)
+
+    atomic.write_json(
+        state_path,
+        {
+            "version": _STATE_VERSION,
+            "header": _fingerprint(header),
+            "head": _fingerprint(head),
+            "offset": offset,
+            "last_row_start": last_row_start,
+            "last_row": _fingerprint(last_row),
+            "rows": n_rows,
+            "beancount_line": end[0],
+            "beancount_offset": end[1],
+        },
+    )
+    return appending
+
+
+def _append_rows(
+    source: Source,
+    state: dict[str, Any],
+    header: bytes,
+    *,
+    config: Config,
+    extract: ExtractFn,
+    clean: CleanFn,
+    beancount_file: Path,
+    csv_args: dict[str, Any],
+) -> tuple[int, tuple[int, int], int]:
+    """Import the rows after the recorded offset, and append them to the journal.
+
+    :return: The number of rows in the file, the end of the beancount file, and the
+      byte offset up to which the file was read.
+    """
+    n_rows = state["rows"]
+
+    with source.path.open("rb") as f:
+        f.seek(state["offset"])
+        text = io.TextIOWrapper(f, encoding="utf-8", newline="")
+        lines = itertools.chain([header.decode("utf-8")] if header else [], text)
+        rows = csv.DictReader(lines, **csv_args)
+
+        def extracted() -> Iterator[Entry]:
+            nonlocal n_rows
+            for row in rows:
+                n_rows += 1
+                entry = extract(row)
+                entry.row = n_rows
+                yield entry
+
+        end = write_entries(
+            process_entries(extracted(), config=config, clean=clean),
+            config=config,
+            beancount_file=beancount_file,
+            statement=source,
+            start=(state["beancount_line"], state["beancount_offset"]),
+        )
+        offset = f.tell()
+        text.detach()
+
+    return n_rows, end, offset
@@ -0,0 +1,324 @@
+"""
+Archive closed years, so the active journal only holds the recent ones.
+
+Everything that loads the journal loads its full history, even though old years
+never change. :py:func:`archive_year` freezes all years up to and including a
+given year:
+
+.. code-block::
+
+   $ ./cli.py archive 2023
+
+This:
+
+1. Loads the journal, and refuses to continue if it has errors, or if any
+   transaction up to the end of the year still has an ``Unknown`` account. See
+   :py:obj:`roastery.config.Config.default_account_name_suffix`.
+2. Moves every generated beancount file that only has transactions in those years
+   to ``archive/<year>/``, next to :py:obj:`roastery.config.Config.journal_path`,
+   and writes ``archive/<year>.beancount``, which includes them.
+3. Writes ``archive/opening.beancount``, with one transaction per account that
+   brings its balance to what it was at the end of the year. Balances of income
+   and expense accounts are moved to ``Equity:Earnings:Previous``. The other side
+   of every transaction is ``Equity:Opening-Balances``.
+4. Removes the ``include`` lines for the moved files from the main journal, and
+   adds one for ``archive/opening.beancount``. Glob patterns are left as is.
+
+A file counts as generated if it only has transactions with a ``digest``, and
+``balance`` assertions. Other included files, such as your account definitions,
+stay where they are. A generated file with transactions on both sides of the end
+of the year can't be split, so the archive is refused. Generated files should be
+included from the main journal.
+
+The archived years are only loaded on demand, with
+``load_journal(config, history=True)`` or ``./cli.py check --history``. This loads
+the archived files instead of the opening balances. See
+:py:func:`roastery.loading.load_journal`.
+
+Once a year is archived, set :py:obj:`roastery.config.Config.do_not_import_before`
+to its last day. Otherwise, importing the statements again would add the archived
+transactions to the active journal a second time.
+
+API
+---
+
+.. autofunction:: archive_year
+.. autofunction:: archived_years
+.. autofunction:: archive_dir
+.. autofunction:: opening_path
+.. autoexception:: ArchiveError
+"""
+
+import collections
+import datetime
+import glob
+import hashlib
+import os
+import re
+from pathlib import Path
+
+from beancount.core import account_types, data, inventory
+from beancount.ops import summarize
+from beancount.parser import options, printer
+
+from roastery import atomic, loading
+from roastery.config import Config
+
+__all__ = [
+    "archive_year",
+    "archived_years",
+    "archive_dir",
+    "opening_path",
+    "ArchiveError",
+]
+
+_INCLUDE = re.compile(r'^include\s+"([^"]*)"')
+
+
+class ArchiveError(ValueError):
+    """The year can't be archived.
+
+    :ivar problems: Description of each problem.
+    """
+
+    def __init__(self, problems: list[str]) -> None:
+        super().__init__(f"{len(problems)} problem(s)")
+        self.problems = problems
+
+
+def archive_dir(config: Config) -> Path:
+    """Directory with the archived years."""
+    return config.journal_path.parent / "archive"
+
+
+def opening_path(config: Config) -> Path:
+    """File with the opening balances of the active journal."""
+    return archive_dir(config) / "opening.beancount"
+
+
+def archived_years(config: Config) -> list[int]:
+    """The years that have been archived, in order."""
+    return sorted(
+        int(path.stem)
+        for path in archive_dir(config).glob("*.beancount")
+        if path.stem.isdigit()
+    )
+
+
+def _is_generated(entries: list[data.Directive]) -> bool:
+    return all(
+        isinstance(entry, data.Balance)
+        or (isinstance(entry, data.Transaction) and "digest" in entry.meta)
+        for entry in entries
+    )
+
+
+def _is_unknown(config: Config, account: str) -> bool:
+    return account.rsplit(":", 1)[-1] == config.default_account_name_suffix
+
+
+def _opening_entries(
+    balances: dict[str, inventory.Inventory],
+    date: datetime.date,
+    options_map: dict,
+    opened: set[str],
+) -> list[data.Directive]:
+    types = options.get_account_types(options_map)
+    equity = options_map["name_equity"]
+    opening_account = f"{equity}:{options_map['account_previous_balances']}"
+    earnings_account = f"{equity}:{options_map['account_previous_earnings']}"
+
+    balance_sheet = collections.defaultdict(inventory.Inventory)
+    for account, balance in balances.items():
+        if account_types.is_income_statement_account(account, types):
+            balance_sheet[earnings_account].add_inventory(balance)
+        else:
+            balance_sheet[account].add_inventory(balance)
+
+    meta = data.new_metadata("<archive>", 0)
+    entries = [
+        data.Open(meta, date, account, None, None)
+        for account in (opening_account, earnings_account)
+        if account not in opened
+    ]
+    entries.extend(
+        summarize.create_entries_from_balances(
+            balance_sheet,
+            date,
+            opening_account,
+            True,
+            meta,
+            "S",
+            "Opening balance for '{account}'",
+        )
+    )
+    return entries
+
+
+def _unique_target(directory: Path, path: Path, taken: set[Path]) -> Path:
+    target = directory / path.name
+    if target.exists() or target in taken:
+        key = hashlib.md5(str(path.resolve()).encode("utf-8")).hexdigest()
+        target = directory / f"{path.stem}-{key[:12]}{path.suffix}"
+    return target
+
+
+def _commit(outputs: dict[Path, str], moves: list[tuple[Path, Path]]) -> None:
+    """Write ``outputs`` and move the files in ``moves``, or change nothing at all.
+
+    The new contents are written to temporary files first, so that a full disk
+    fails before anything is moved. The moves and renames that follow are undone
+    if one of them fails.
+    """
+    staged = {}
+    moved = []
+    replaced = {}
+    try:
+        for path, text in outputs.items():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            staged[path] = tmp = atomic.temporary_path(path)
+            tmp.write_text(text)
+        for source, target in moves:
+            target.parent.mkdir(parents=True, exist_ok=True)
+            source.replace(target)
+            moved.append((source, target))
+        for path, tmp in staged.items():
+            replaced[path] = path.read_text() if path.exists() else None
+            tmp.replace(path)
+    except BaseException:
+        for path, text in replaced.items():
+            if text is None:
+                path.unlink(missing_ok=True)
+            else:
+                path.write_text(text)
+        for source, target in reversed(moved):
+            target.replace(source)
+        for tmp in staged.values():
+            tmp.unlink(missing_ok=True)
+        raise
+
+
+def _updated_main(config: Config, moved: set[str]) -> str:
+    main = config.journal_path
+    cwd = os.path.dirname(os.path.abspath(main))
+    lines = []
+    for line in main.read_text().splitlines(keepends=True):
+        match = _INCLUDE.match(line.strip())
+        if (
+            match is not None
+            and not glob.has_magic(match[1])
+            and os.path.normpath(os.path.join(cwd, match[1])) in moved
+        ):
+            continue
+        lines.append(line)
+
+    opening = os.path.relpath(opening_path(config), cwd)
+    include = f'include "{opening}"'
+    if not any(line.strip() == include for line in lines):
+        if lines and not lines[-1].endswith("\n"):
+            lines.append("\n")
+        lines.append(include + "\n")
+    return "".join(lines)
+
+
+def archive_year(config: Config, year: int) -> list[Path]:
+    """Archive all years up to and including ``year``.
+
+    See the module documentation for what this does.
+
+    :return: The archived beancount files, at their new location.
+    :raises ArchiveError: If the year can't be archived. Nothing is changed in
+      that case. If moving or writing a file fails, the changes that were already
+      made are undone before the error is raised.
+    """
+    if year >= datetime.date.today().year:
+        raise ArchiveError([f"{year} is not over yet"])
+    if (done := archived_years(config)) and year <= done[-1]:
+        raise ArchiveError([f"{done[-1]} is already archived"])
+
+    entries, errors, options_map = loading.load_journal(config)
+    if errors:
+        raise ArchiveError(
+            [f"The journal has {len(errors)} error(s). Run the check command."]
+        )
+
+    end = datetime.date(year, 12, 31)
+    opening = os.path.abspath(opening_path(config))
+    main = os.path.abspath(config.journal_path)
+
+    by_file = collections.defaultdict(list)
+    for entry in entries:
+        by_file[entry.meta.get("filename")].append(entry)
+
+    problems = []
+    to_move = []
+    for filename in options_map["include"]:
+        file_entries = by_file.get(filename)
+        if filename in (main, opening) or not file_entries:
+            continue
+        if not _is_generated(file_entries):
+            continue
+
+        # Balance assertions are dated the day after the statement ends.
+        dates = [e.date for e in file_entries if isinstance(e, data.Transaction)]
+        if not dates:
+            continue
+        first, last = min(dates), max(dates)
+        if last <= end:
+            to_move.append((filename, last.year))
+        elif first <= end:
+            problems.append(f"{filename} has transactions before and after {end}")
+
+    moved = {filename for filename, _ in to_move}
+    balances = collections.defaultdict(inventory.Inventory)
+    for entry in data.filter_txns(entries):
+        if entry.meta.get("filename") not in moved | {opening}:
+            continue
+        for posting in entry.postings:
+            if _is_unknown(config, posting.account):
+                problems.append(
+                    f"{entry.date} {entry.payee or ''} {entry.narration or ''} "
+                    + f"({entry.meta.get('digest')}) is booked to {posting.account}"
+                )
+            balances[posting.account].add_position(posting)
+
+    if problems:
+        raise ArchiveError(problems)
+    if not to_move:
+        raise ArchiveError([f"There are no generated files up to {year} to archive"])
+
+    opened = {
+        entry.account
+        for entry in entries
+        if isinstance(entry, data.Open) and entry.meta.get("filename") != opening
+    }
+    opening_entries = _opening_entries(
+        balances, end + datetime.timedelta(days=1), options_map, opened
+    )
+
+    # Group the moved files by the year of their last transaction.
+    moves = []
+    per_year = collections.defaultdict(list)
+    for filename, file_year in sorted(to_move):
+        directory = archive_dir(config) / str(file_year)
+        target = _unique_target(directory, Path(filename), {t for _, t in moves})
+        moves.append((Path(filename), target))
+        per_year[file_year].append(target)
+
+    outputs = {}
+    for file_year in range(min(per_year), year + 1):
+        include_file = archive_dir(config) / f"{file_year}.beancount"
+        existing = include_file.read_text() if include_file.exists() else ""
+        outputs[include_file] = existing + "".join(
+            f'include "{target.relative_to(archive_dir(config))}"\n'
+            for target in per_year.get(file_year, [])
+        )
+    outputs[opening_path(config)] = (
+        f"; Opening balances after archiving up to and including {year}.\n"
+        + "; Generated by roastery, do not edit.\n\n"
+        + "".join(printer.format_entry(entry) + "\n" for entry in opening_entries)
+    )
+    outputs[config.journal_path] = _updated_main(config, moved)
+
+    _commit(outputs, moves)
+    return [target for _, target in moves]
@@ -0,0 +1,68 @@
+"""
+Write files without leaving them half written.
+
+Roastery keeps its state in files: the manual edits and the skip list, and the
+caches and indexes under ``.roastery/``. An import or edit session that is
+interrupted halfway through a write must not leave a truncated file behind.
+
+The functions in this module write the new contents to a temporary file next to
+the target, ``.<name>.tmp``, and then replace the target with it. Readers see
+either the old or the new contents, never a mix.
+
+API
+---
+
+.. autofunction:: replacing
+.. autofunction:: write_text
+.. autofunction:: write_json
+.. autofunction:: temporary_path
+"""
+
+import contextlib
+import json
+import typing
+from pathlib import Path
+
+__all__ = [
+    "replacing",
+    "write_text",
+    "write_json",
+    "temporary_path",
+]
+
+
+def temporary_path(path: Path) -> Path:
+    """The temporary file that the new contents of ``path`` are written to."""
+    return path.with_name(f".{path.name}.tmp")
+
+
+@contextlib.contextmanager
+def replacing(path: Path, mode: str = "w") -> typing.Iterator[typing.IO]:
+    """Open a temporary file for the new contents of ``path``.
+
+    ``path`` is replaced when the block ends. If the block raises, the temporary
+    file is removed, and ``path`` is left as it was. The parent directory is
+    created if needed.
+
+    :param mode: ``"w"`` for text, or ``"wb"`` for bytes.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = temporary_path(path)
+    try:
+        with tmp.open(mode) as f:
+            yield f
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+    tmp.replace(path)
+
+
+def write_text(path: Path, text: str) -> None:
+    """Replace the contents of ``path`` with ``text``."""
+    with replacing(path) as f:
+        f.write(text)
+
+
+def write_json(path: Path, val: typing.Any) -> None:
+    """Replace the contents of ``path`` with ``val`` as indented JSON."""
+    write_text(path, json.dumps(val, indent=4) + "\n")
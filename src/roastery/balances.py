@@ -0,0 +1,278 @@
+"""
+Check the running balance of imported statements for missing and duplicate rows.
+
+Most banks include the balance of the account in every row of a statement. If a row
+is missing, or the same rows are imported twice from overlapping statements, the
+running balance no longer adds up. Beancount only notices this at the next
+``balance`` assertion, if there is one, and does not say which row is to blame.
+
+When :py:obj:`roastery.config.Config.check_balances` is set, every import checks
+the running balance of the statement, and warns about each row where it breaks:
+
+``gap``
+  The balance before the row is not the balance after the previous row. The
+  difference is the total amount of the missing rows.
+``overlap``
+  The same, but the row was seen before: its digest appears earlier in the
+  statement.
+
+Entries take their balance from their metadata: ``balance_after`` is the balance
+after the transaction, as in :py:func:`roastery.formats.extract_demo`.
+``balance_before`` is the balance before the transaction, as in
+:py:func:`roastery.formats.extract_asn`. Entries without either are not checked.
+
+Entries are checked in the order of the statement, by
+:py:obj:`roastery.importer.Entry.row`, for each asset account and currency
+separately. Statements that list the newest transaction first are detected
+automatically. The check itself is a cumulative sum over NumPy arrays, so it takes
+well under a second for a million rows.
+
+When :py:obj:`roastery.config.Config.assert_balances` is set, the generated file
+also gets a ``balance`` assertion for every asset account, on the day after the last
+transaction in the statement. One assertion per statement is enough for beancount to
+catch gaps between statements as well. This assumes that a statement does not end
+halfway through a day. Rows that :py:mod:`roastery.append` adds to a file later
+don't get assertions of their own: only a full import writes them.
+
+The checker can be used on its own too:
+
+.. code-block:: python
+
+   from roastery.balances import BalanceChecker
+
+   checker = BalanceChecker()
+   for entry in iter_entries(csv_file=..., config=config, extract=extract_asn):
+       checker.add(entry)
+   for brk in checker.check():
+       print(brk.kind, brk.row, brk.missing)
+
+This module requires NumPy. Install it with ``pip install roastery[report]``.
+
+API
+---
+
+.. autoclass:: BalanceChecker
+   :members:
+.. autoclass:: BalanceBreak
+   :members:
+.. autodata:: SCALE
+.. autofunction:: scaled
+.. autofunction:: unscaled
+"""
+
+from __future__ import annotations
+
+import dataclasses
+import datetime
+from decimal import Decimal
+from typing import TYPE_CHECKING
+
+import numpy as np
+from beancount.core import data
+from beancount.core.number import D
+
+from roastery import term
+
+if TYPE_CHECKING:
+    from roastery.importer import Digest, Entry
+
+__all__ = [
+    "BalanceChecker",
+    "BalanceBreak",
+    "SCALE",
+    "scaled",
+    "unscaled",
+]
+
+BALANCE_AFTER = "balance_after"
+"""Metadata key of the balance after a transaction."""
+
+BALANCE_BEFORE = "balance_before"
+"""Metadata key of the balance before a transaction."""
+
+SCALE = 4
+"""Amounts are compared and summed as integers, in units of ``10**-SCALE``."""
+
+
+@dataclasses.dataclass(frozen=True)
+class BalanceBreak:
+    """A row at which the running balance does not add up."""
+
+    asset_account: str
+    currency: str
+
+    kind: str
+    """``gap`` or ``overlap``. See the module documentation."""
+
+    digest: Digest
+    date: datetime.date
+
+    row: int | None
+    """:py:obj:`roastery.importer.Entry.row` of the entry, if known."""
+
+    index: int
+    """Position of the entry in the order it was passed to
+    :py:meth:`BalanceChecker.add`."""
+
+    missing: Decimal
+    """Balance before this row, minus the balance after the previous row. For a
+    gap, this is the total of the missing rows. For an overlap, it is minus the
+    total of the rows that were seen twice: positive if those rows are payments."""
+
+    def describe(self) -> str:
+        """One line description, for the terminal."""
+        where = f"row {self.row}" if self.row is not None else f"entry {self.index}"
+        return (
+            f"[bold]{self.asset_account}[/bold] {self.kind} of {self.missing} "
+            + f"{self.currency} before {where} ({self.date}, {self.digest})"
+        )
+
+
+def scaled(number: Decimal) -> int:
+    """``number`` as an integer in units of ``10**-SCALE``."""
+    return int(number.scaleb(SCALE).to_integral_value())
+
+
+def unscaled(number: np.integer) -> Decimal:
+    """The inverse of :py:func:`scaled`, with two decimals if that is exact."""
+    exact = Decimal(int(number)).scaleb(-SCALE)
+    # Most currencies have two decimals; don't show more than needed.
+    cents = exact.quantize(Decimal("0.01"))
+    return cents if cents == exact else exact
+
+
+def _breaks(amount: np.ndarray, after: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Positions where the balance does not continue, and the difference there."""
+    # The balance after row i is the opening balance plus the cumulative sum of the
+    # amounts, plus the total of any missing rows before i. That last term can only
+    # change at a break.
+    offset = after - np.cumsum(amount)
+    jumps = np.diff(offset)
+    positions = np.flatnonzero(jumps) + 1
+    return positions, jumps[positions - 1]
+
+
+class BalanceChecker:
+    """Collects the running balance of entries, and checks that it adds up."""
+
+    def __init__(self) -> None:
+        self._groups: dict[tuple[str, str], int] = {}
+        self._group: list[int] = []
+        self._order: list[int] = []
+        self._amount: list[int] = []
+        self._after: list[int] = []
+        self._balance: list[Decimal] = []
+        self._digest: list[str] = []
+        self._date: list[datetime.date] = []
+        self._row: list[int | None] = []
+        self._index: list[int] = []
+        self._seen = 0
+
+    def add(self, entry: Entry) -> None:
+        """Add an entry. Entries without balance metadata are ignored."""
+        index = self._seen
+        self._seen += 1
+
+        if BALANCE_AFTER in entry.meta:
+            after = D(str(entry.meta[BALANCE_AFTER]))
+        elif BALANCE_BEFORE in entry.meta:
+            after = D(str(entry.meta[BALANCE_BEFORE])) + entry.amount.number
+        else:
+            return
+
+        key = (entry.asset_account, entry.amount.currency)
+        self._group.append(self._groups.setdefault(key, len(self._groups)))
+        self._order.append(index if entry.row is None else entry.row)
+        self._amount.append(scaled(entry.amount.number))
+        self._after.append(scaled(after))
+        self._balance.append(after)
+        self._digest.append(entry.digest)
+        self._date.append(entry.date)
+        self._row.append(entry.row)
+        self._index.append(index)
+
+    def _chronological(
+        self,
+    ) -> list[tuple[tuple[str, str], np.ndarray, tuple[np.ndarray, np.ndarray]]]:
+        """For each group: the positions of its entries, oldest first, and the breaks."""
+        group = np.array(self._group, dtype=np.int32)
+        amount = np.array(self._amount, dtype=np.int64)
+        after = np.array(self._after, dtype=np.int64)
+        # Sort by group, and then by position in the statement.
+        order = np.lexsort((np.array(self._order, dtype=np.int64), group))
+        bounds = np.searchsorted(group[order], np.arange(len(self._groups) + 1))
+
+        result = []
+        for key, code in self._groups.items():
+            members = order[bounds[code] : bounds[code + 1]]
+            forward = _breaks(amount[members], after[members])
+            backward = _breaks(amount[members[::-1]], after[members[::-1]])
+            if len(backward[0]) < len(forward[0]):
+                members = members[::-1]
+                forward = backward
+            result.append((key, members, forward))
+        return result
+
+    def check(self) -> list[BalanceBreak]:
+        """Rows at which the running balance does not add up, in statement order."""
+        if not self._group:
+            return []
+
+        digests = np.array(self._digest, dtype=object)
+        breaks = []
+        for (account, currency), members, (positions, jumps) in self._chronological():
+            if len(positions) == 0:
+                continue
+            # A row is an overlap if an earlier row has the same digest.
+            _, first, inverse = np.unique(
+                digests[members], return_index=True, return_inverse=True
+            )
+            repeated = first[inverse] < np.arange(len(members))
+            for position, jump in zip(positions, jumps):
+                i = members[position]
+                breaks.append(
+                    BalanceBreak(
+                        asset_account=account,
+                        currency=currency,
+                        kind="overlap" if repeated[position] else "gap",
+                        digest=self._digest[i],
+                        date=self._date[i],
+                        row=self._row[i],
+                        index=self._index[i],
+                        missing=unscaled(jump),
+                    )
+                )
+        breaks.sort(key=lambda b: b.index)
+        return breaks
+
+    def assertions(self) -> list[data.Balance]:
+        """A ``balance`` assertion for each asset account and currency, on the day
+        after the last transaction, with the balance after that transaction."""
+        if not self._group:
+            return []
+
+        result = []
+        for (account, currency), members, _ in self._chronological():
+            last = members[-1]
+            result.append(
+                data.Balance(
+                    meta={},
+                    date=self._date[last] + datetime.timedelta(days=1),
+                    account=account,
+                    amount=data.Amount(self._balance[last], currency),
+                    tolerance=None,
+                    diff_amount=None,
+                )
+            )
+        return result
+
+    def warn(self, name: str) -> list[BalanceBreak]:
+        """Print a warning for each break in statement ``name``, and return them."""
+        breaks = self.check()
+        if breaks:
+            term.warn(
+                f"The running balance of {name} does not add up at "
+                + f"{len(breaks)} row(s):",
+                *(brk.describe() for brk in breaks),
+            )
+        return breaks
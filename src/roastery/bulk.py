@@ -0,0 +1,233 @@
+"""
+Classify transactions in bulk, in a spreadsheet or text editor.
+
+:py:func:`roastery.edit.main` asks about one transaction at a time. For a large
+backlog, it can be faster to export the queue of unclassified transactions to a
+file, fill in the accounts in a spreadsheet, and apply the result in one go:
+
+.. code-block::
+
+   $ ./cli.py export queue.tsv --from 2024-01-01 --payee albert
+   $ $EDITOR queue.tsv
+   $ ./cli.py apply queue.tsv
+
+The file has one row per transaction, with the columns in :py:data:`COLUMNS`.
+Fill in the ``account`` column to classify a transaction, or write ``Skip`` to
+add it to the skip list. Rows with an empty ``account`` are ignored. The
+``payee`` and ``narration`` columns can be edited as well; they are stored as
+the manual edits of the transaction, together with the account. Clear a cell to
+keep the original or cleaned value.
+
+The ``amount`` is signed as on the bank statement: money received is positive.
+
+Files ending in ``.csv`` are comma separated. Other files are tab separated.
+
+Applying a file is all or nothing: if any row refers to an unknown account or
+transaction, nothing is stored.
+
+Applying a file is also idempotent. The manual edits and the skip list are two
+files, so an apply that is interrupted can store one but not the other. A row for
+a transaction that is no longer in the queue is therefore accepted if the stored
+answer is the same as the row, and stored again. Run ``apply`` again with the same
+file to complete an interrupted apply.
+
+API
+---
+
+.. autodata:: COLUMNS
+.. autofunction:: export_queue
+.. autofunction:: apply_queue
+.. autofunction:: is_stored
+.. autoexception:: QueueError
+"""
+
+import csv
+import datetime
+import decimal
+from pathlib import Path
+from typing import TextIO
+
+from roastery import edit
+from roastery.config import Config
+from roastery.edit import ManualEdits
+
+__all__ = [
+    "COLUMNS",
+    "export_queue",
+    "apply_queue",
+    "is_stored",
+    "QueueError",
+]
+
+COLUMNS = [
+    "digest",
+    "date",
+    "amount",
+    "currency",
+    "payee",
+    "narration",
+    "type",
+    "suggested_account",
+    "account",
+]
+"""Columns of an exported queue."""
+
+
+def _amount(item: edit.Unprocessed) -> decimal.Decimal:
+    # The queue holds the Unknown posting: its opposite is what the bank shows.
+    return -item.position.units.number
+
+
+SORT_KEYS = {
+    "date": lambda item: (item.date, item.digest),
+    "payee": lambda item: ((item.payee or "").lower(), item.date, item.digest),
+    "amount": lambda item: (item.position.units.number, item.date, item.digest),
+    "template": lambda item: (item.template or "", item.date, item.digest),
+}
+"""Ways to sort the exported queue."""
+
+
+class QueueError(ValueError):
+    """The file passed to :py:func:`apply_queue` has invalid rows.
+
+    :ivar problems: Description of each problem, including the line number.
+    """
+
+    def __init__(self, problems: list[str]) -> None:
+        super().__init__(f"{len(problems)} invalid row(s)")
+        self.problems = problems
+
+
+def delimiter_for(path: Path) -> str:
+    """Delimiter to use for ``path``: comma for ``.csv`` files, tab otherwise."""
+    return "," if path.suffix == ".csv" else "\t"
+
+
+def export_queue(
+    config: Config,
+    f: TextIO,
+    *,
+    client=None,
+    delimiter: str = "\t",
+    start: datetime.date | None = None,
+    end: datetime.date | None = None,
+    payee: str | None = None,
+    sort: str = "date",
+) -> int:
+    """Write the queue of unclassified transactions to ``f``.
+
+    :param client: Optional :py:class:`roastery.server.Client`. See
+      :py:func:`roastery.edit.load_queue`.
+    :param delimiter: Field delimiter.
+    :param start: Only export transactions on or after this date.
+    :param end: Only export transactions on or before this date.
+    :param payee: Only export transactions with a payee that contains this string,
+      ignoring case.
+    :param sort: One of the keys of :py:data:`SORT_KEYS`.
+    :return: The number of exported transactions.
+    """
+    accounts, unprocessed = edit.load_queue(config, client=client)
+    history = edit.account_history(config)
+    needle = None if payee is None else payee.lower()
+
+    items = [
+        item
+        for item in unprocessed
+        if (start is None or item.date >= start)
+        and (end is None or item.date <= end)
+        and (needle is None or needle in (item.payee or "").lower())
+    ]
+    items.sort(key=SORT_KEYS[sort])
+
+    writer = csv.writer(f, delimiter=delimiter, lineterminator="\n")
+    writer.writerow(COLUMNS)
+    for item in items:
+        suggestions = edit.suggest_accounts(history, item.payee, accounts)
+        writer.writerow(
+            [
+                item.digest,
+                item.date.isoformat(),
+                _amount(item),
+                item.position.units.currency,
+                item.payee or "",
+                item.narration or "",
+                item.type or "",
+                suggestions[0] if suggestions else "",
+                "",
+            ]
+        )
+    return len(items)
+
+
+def is_stored(
+    digest: str, account: str, stored: dict[str, ManualEdits], skipped: set[str]
+) -> bool:
+    """Whether ``account`` is already the stored answer for ``digest``.
+
+    :param account: An account, or ``Skip``.
+    :param stored: See :py:func:`roastery.edit.read_manual_edits`.
+    :param skipped: See :py:func:`roastery.edit.read_skip`.
+    """
+    if account == "Skip":
+        return digest in skipped
+    return stored.get(digest, {}).get("account") == account
+
+
+def apply_queue(
+    config: Config,
+    f: TextIO,
+    *,
+    client=None,
+    delimiter: str = "\t",
+) -> tuple[int, int]:
+    """Store the accounts filled in in an exported queue.
+
+    :param client: Optional :py:class:`roastery.server.Client`. See
+      :py:func:`roastery.edit.load_queue`.
+    :param delimiter: Field delimiter.
+    :return: The number of stored edits, and the number of skipped transactions.
+    :raises QueueError: If any of the rows is invalid. Nothing is stored in that case.
+    """
+    accounts, unprocessed = edit.load_queue(config, client=client)
+    known_accounts = set(accounts)
+    known_digests = {item.digest for item in unprocessed}
+    stored = edit.read_manual_edits(config)
+    skipped = edit.read_skip(config)
+
+    to_save: dict[str, ManualEdits] = {}
+    to_skip: set[str] = set()
+    problems = []
+
+    reader = csv.DictReader(f, delimiter=delimiter)
+    missing = {"digest", "account"} - set(reader.fieldnames or [])
+    if missing:
+        raise QueueError([f"Missing column(s): {', '.join(sorted(missing))}"])
+
+    for row in reader:
+        line = reader.line_num
+        digest = row["digest"].strip()
+        account = (row["account"] or "").strip()
+
+        if not account:
+            continue
+        if digest not in known_digests and not is_stored(
+            digest, account, stored, skipped
+        ):
+            problems.append(
+                f"Line {line}: unknown or already classified digest {digest}"
+            )
+        elif account == "Skip":
+            to_skip.add(digest)
+        elif account not in known_accounts:
+            problems.append(f"Line {line}: unknown account {account}")
+        else:
+            # Empty cells keep the original or cleaned value.
+            to_save[digest] = {"account": account} | {
+                key: row[key] for key in ("payee", "narration") if row.get(key)
+            }
+
+    if problems:
+        raise QueueError(problems)
+
+    edit.save_answers(config, to_save, to_skip, client=client)
+    return len(to_save), len(to_skip)
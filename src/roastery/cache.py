@@ -0,0 +1,182 @@
+"""
+Cache of extracted entries per statement.
+
+Statements never change after you download them. Still, every import parses the
+CSV file and runs the ``extract`` function on every row again. When
+:py:obj:`roastery.config.Config.cache_entries` is set, the extracted entries are
+stored in a binary file under ``.roastery/cache/`` the first time a statement is
+imported. Later imports, and :py:func:`roastery.reclean.reclean`, load the
+entries from that file instead.
+
+Cache files are keyed by:
+
+- The hash of the decompressed contents of the statement.
+- The :py:func:`roastery.rules.rule_fingerprint` of the ``extract`` function, so
+  changing the extract function invalidates the cache.
+- The :py:func:`roastery.rules.module_hash` of the module that defines
+  ``extract``, so changing a helper next to it, such as ``parse_date``,
+  invalidates the cache too, even if the module is part of an installed package.
+- The fields of :py:class:`roastery.importer.Entry` and the version of the file
+  format, so a change to either never loads entries in an old layout.
+- The ``csv_args``.
+
+Entries are stored as pickled tuples of plain values, and unpickled in one go.
+
+Old cache files are not removed automatically. It is safe to delete the
+``.roastery/cache/`` directory at any time.
+
+API
+---
+
+.. autofunction:: extract_cached
+.. autofunction:: cache_path
+"""
+
+import dataclasses
+import datetime
+import hashlib
+import pickle
+from pathlib import Path
+from typing import Iterator
+
+from beancount.core import data
+from beancount.core.number import D
+
+from roastery import atomic
+from roastery.config import Config
+from roastery.importer import Cleanable, Entry, ExtractFn, extract_csv
+from roastery.rules import module_hash, rule_fingerprint
+from roastery.sources import Source, as_source
+
+__all__ = [
+    "extract_cached",
+    "cache_path",
+]
+
+# Version of the file format. Bump this when changing `_pack`.
+_FORMAT_VERSION = 2
+
+
+def _pack(entry: Entry) -> tuple:
+    return (
+        entry.digest,
+        entry.date.toordinal(),
+        str(entry.amount.number),
+        entry.amount.currency,
+        entry.asset_account,
+        dataclasses.astuple(entry.account),
+        dataclasses.astuple(entry.payee),
+        dataclasses.astuple(entry.narration),
+        dict(entry.meta),
+        sorted(entry.tags),
+        sorted(entry.links),
+        entry.flag,
+        entry.row,
+    )
+
+
+def _unpack(row: tuple) -> Entry:
+    (
+        digest,
+        date,
+        number,
+        currency,
+        asset_account,
+        account,
+        payee,
+        narration,
+        meta,
+        tags,
+        links,
+        flag,
+        n,
+    ) = row
+    return Entry(
+        digest=digest,
+        date=datetime.date.fromordinal(date),
+        amount=data.Amount(D(number), currency),
+        asset_account=asset_account,
+        account=Cleanable(*account),
+        payee=Cleanable(*payee),
+        narration=Cleanable(*narration),
+        meta=meta,
+        tags=set(tags),
+        links=set(links),
+        flag=flag,
+        row=n,
+    )
+
+
+def _fields(cls: type) -> list[tuple[str, str]]:
+    return [(field.name, str(field.type)) for field in dataclasses.fields(cls)]
+
+
+_ENTRY_LAYOUT = repr((_fields(Entry), _fields(Cleanable)))
+"""Changes when a field is added to, removed from, or renamed in an entry."""
+
+
+def cache_path(
+    *,
+    csv_file: Path | Source,
+    config: Config,
+    extract: ExtractFn,
+    csv_args: dict[str, any] = None,
+) -> Path:
+    """Cache file for the entries that ``extract`` extracts from ``csv_file``."""
+    source = as_source(csv_file)
+    key = hashlib.md5(
+        "\0".join(
+            [
+                str(_FORMAT_VERSION),
+                _ENTRY_LAYOUT,
+                source.content_hash(),
+                rule_fingerprint(extract),
+                module_hash(extract, libraries=True) or "",
+                repr(sorted((csv_args or {}).items())),
+            ]
+        ).encode("utf-8")
+    ).hexdigest()
+    return config.state_dir / "cache" / f"{source.stem}-{key}.pickle"
+
+
+def _load(path: Path) -> list[tuple] | None:
+    try:
+        with path.open("rb") as f:
+            return pickle.load(f)
+    except (FileNotFoundError, pickle.UnpicklingError, EOFError):
+        return None
+
+
+def _store(path: Path, rows: list[tuple]) -> None:
+    with atomic.replacing(path, "wb") as f:
+        pickle.dump(rows, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def extract_cached(
+    *,
+    csv_file: Path | Source,
+    config: Config,
+    extract: ExtractFn,
+    csv_args: dict[str, any] = None,
+) -> Iterator[Entry]:
+    """The same as :py:func:`roastery.importer.extract_csv`, but using the cache.
+
+    On a cache miss, the statement is parsed and the cache is written once all
+    entries have been extracted.
+    """
+    path = cache_path(
+        csv_file=csv_file, config=config, extract=extract, csv_args=csv_args
+    )
+
+    if (rows := _load(path)) is not None:
+        for row in rows:
+            yield _unpack(row)
+        return
+
+    rows = []
+    for entry in extract_csv(csv_file=csv_file, extract=extract, csv_args=csv_args):
+        # Pack before yielding: the rest of the pipeline mutates the entry.
+        rows.append(_pack(entry))
+        yield entry
+
+    _store(path, rows)
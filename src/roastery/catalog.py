@@ -0,0 +1,221 @@
+"""
+A catalog of imported statements, with the dates they cover.
+
+Every import records the following about the statement in
+``.roastery/catalog/``:
+
+- The first and last booking date, and the number of rows.
+- Whether the rows are sorted by date, ascending or descending.
+- The format: the name and the fingerprint of the ``extract`` function.
+- The size and modification time of the file, and when the entry was recorded.
+
+An entry is only used while the size and modification time of the file are
+unchanged, and while the statement is imported with the same ``extract`` function
+as before. A fix to the date parsing of an extract function changes its
+:py:func:`~roastery.rules.rule_fingerprint`, so the dates in the catalog are not
+trusted anymore. Otherwise the statement is read as usual, and the entry is
+refreshed.
+
+A file can change without a new modification time if it is written again within
+the resolution of the timestamps of the file system. For a file that was modified
+shortly before it was recorded, the catalog therefore also stores a hash of its
+contents, and only uses the entry while that matches as well. Other files are not
+hashed, so a lookup does not read them.
+
+The catalog is used to avoid reading statements that don't matter:
+
+- A statement that ends before :py:obj:`roastery.config.Config.do_not_import_before`
+  is not read at all. Its beancount file is written empty, as it would be anyway.
+- In a statement that is sorted newest first, reading stops at the first row before
+  :py:obj:`~roastery.config.Config.do_not_import_before`.
+- :py:meth:`roastery.registry.FormatRegistry.import_statements` and the ``import``
+  command accept a date window, and skip statements that don't overlap with it.
+  Re-importing a single quarter does not read ten years of statements.
+
+API
+---
+
+.. autofunction:: lookup
+.. autofunction:: overlaps
+.. autofunction:: recording
+.. autodata:: RACY_NS
+.. autoclass:: StatementInfo
+   :members:
+"""
+
+import dataclasses
+import datetime
+import hashlib
+import json
+import time
+from pathlib import Path
+from typing import Iterable, Iterator
+
+from roastery import atomic
+from roastery.config import Config
+from roastery.importer import Entry, ExtractFn
+from roastery.rules import rule_fingerprint, rule_name
+from roastery.sources import Source, as_source
+
+__all__ = [
+    "StatementInfo",
+    "lookup",
+    "overlaps",
+    "recording",
+    "RACY_NS",
+]
+
+RACY_NS = 2_000_000_000
+"""Files modified less than this many nanoseconds before they are recorded are
+hashed. Two seconds covers the coarsest common timestamps, of FAT file systems."""
+
+
+@dataclasses.dataclass(frozen=True)
+class StatementInfo:
+    """What the catalog knows about a statement."""
+
+    name: str
+    """See :py:obj:`roastery.sources.Source.name`."""
+
+    format: str
+    """Name of the ``extract`` function the statement was imported with."""
+
+    fingerprint: str
+    """:py:func:`~roastery.rules.rule_fingerprint` of the ``extract`` function."""
+
+    rows: int
+    min_date: datetime.date | None
+    """Earliest booking date. ``None`` for statements without rows."""
+    max_date: datetime.date | None
+    """Latest booking date. ``None`` for statements without rows."""
+
+    order: str | None
+    """``"ascending"`` or ``"descending"`` if the rows are sorted by date."""
+
+    content_hash: str | None
+    """Hash of the contents, if the file was modified within :py:data:`RACY_NS` of
+    being recorded."""
+
+    size: int
+    mtime_ns: int
+    recorded_ns: int
+
+    def to_json(self) -> dict:
+        return dataclasses.asdict(self) | {
+            "min_date": self.min_date and self.min_date.isoformat(),
+            "max_date": self.max_date and self.max_date.isoformat(),
+        }
+
+    @classmethod
+    def from_json(cls, val: dict) -> "StatementInfo":
+        return cls(
+            **val
+            | {
+                "min_date": val["min_date"]
+                and datetime.date.fromisoformat(val["min_date"]),
+                "max_date": val["max_date"]
+                and datetime.date.fromisoformat(val["max_date"]),
+            }
+        )
+
+
+def _is_racy(mtime_ns: int, recorded_ns: int) -> bool:
+    return recorded_ns - mtime_ns < RACY_NS
+
+
+def _catalog_path(config: Config, source: Source) -> Path:
+    key = hashlib.md5(source.name.encode("utf-8")).hexdigest()
+    return config.state_dir / "catalog" / f"{source.stem}-{key[:12]}.json"
+
+
+def lookup(
+    config: Config, csv_file: Path | Source, *, extract: ExtractFn | None = None
+) -> StatementInfo | None:
+    """The catalog entry of ``csv_file``, if there is one and the file didn't change.
+
+    :param extract: If given, entries that were recorded with a different
+      ``extract`` function, or with an older version of it, are ignored as well.
+    """
+    source = as_source(csv_file)
+    try:
+        info = StatementInfo.from_json(
+            json.loads(_catalog_path(config, source).read_text())
+        )
+        stat = source.path.stat()
+    except (ValueError, TypeError, KeyError, FileNotFoundError):
+        return None
+
+    if (info.size, info.mtime_ns) != (stat.st_size, stat.st_mtime_ns):
+        return None
+    if _is_racy(info.mtime_ns, info.recorded_ns) and (
+        source.content_hash() != info.content_hash
+    ):
+        return None
+    if extract is not None and (info.format, info.fingerprint) != (
+        rule_name(extract),
+        rule_fingerprint(extract),
+    ):
+        return None
+    return info
+
+
+def overlaps(
+    info: StatementInfo, start: datetime.date | None, end: datetime.date | None
+) -> bool:
+    """Whether the statement has rows between ``start`` and ``end``, inclusive."""
+    if info.min_date is None:
+        return False
+    return (start is None or info.max_date >= start) and (
+        end is None or info.min_date <= end
+    )
+
+
+def recording(
+    config: Config,
+    csv_file: Path | Source,
+    entries: Iterable[Entry],
+    *,
+    extract: ExtractFn,
+) -> Iterator[Entry]:
+    """Yield ``entries``, and store the catalog entry of ``csv_file`` at the end.
+
+    :param entries: All extracted entries of the statement, in order.
+    :param extract: The function that extracted ``entries``.
+    """
+    source = as_source(csv_file)
+    stat = source.path.stat()
+    recorded_ns = time.time_ns()
+    racy = _is_racy(stat.st_mtime_ns, recorded_ns)
+    # Hash before reading, so a write during the import is noticed next time.
+    content_hash = source.content_hash() if racy else None
+    format, fingerprint = rule_name(extract), rule_fingerprint(extract)
+
+    rows = 0
+    last = min_date = max_date = None
+    ascending = descending = True
+    for entry in entries:
+        rows += 1
+        if last is not None:
+            ascending &= entry.date >= last
+            descending &= entry.date <= last
+        else:
+            min_date = max_date = entry.date
+        last = entry.date
+        min_date = min(min_date, entry.date)
+        max_date = max(max_date, entry.date)
+        yield entry
+
+    info = StatementInfo(
+        name=source.name,
+        format=format,
+        fingerprint=fingerprint,
+        rows=rows,
+        min_date=min_date,
+        max_date=max_date,
+        order="ascending" if ascending else "descending" if descending else None,
+        content_hash=content_hash,
+        size=stat.st_size,
+        mtime_ns=stat.st_mtime_ns,
+        recorded_ns=recorded_ns,
+    )
+    atomic.write_json(_catalog_path(config, source), info.to_json())
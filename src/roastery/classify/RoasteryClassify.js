@@ -0,0 +1,177 @@
+// Client side of the Classify page. The queue lives on the server; this only
+// fetches the page that is shown, and posts the selected rows to `assign`.
+
+function endpoint(name, params) {
+  const url = new URL(name, window.location.href.split("?")[0]);
+  for (const [key, val] of Object.entries(params || {})) {
+    if (val !== null && val !== undefined) url.searchParams.set(key, val);
+  }
+  return url;
+}
+
+function cell(row, text) {
+  const td = document.createElement("td");
+  td.textContent = text ?? "";
+  row.appendChild(td);
+  return td;
+}
+
+function header(table, names) {
+  const row = document.createElement("tr");
+  for (const name of names) {
+    const th = document.createElement("th");
+    th.textContent = name;
+    row.appendChild(th);
+  }
+  table.tHead.replaceChildren(row);
+}
+
+export default {
+  onExtensionPageLoad() {
+    const root = document.getElementById("roastery-classify");
+    if (!root) return;
+
+    const controls = document.getElementById("roastery-classify-controls");
+    const account = document.getElementById("roastery-classify-account");
+    const accounts = document.getElementById("roastery-classify-accounts");
+    const assign = document.getElementById("roastery-classify-assign");
+    const status = document.getElementById("roastery-classify-status");
+    const table = root.querySelector("table");
+    const pager = document.getElementById("roastery-classify-pager");
+
+    const state = { page: 1, payee: null, selected: new Set() };
+
+    function grouped() {
+      return controls.elements.group.checked && state.payee === null;
+    }
+
+    function updateAssign() {
+      const n = state.selected.size;
+      assign.disabled = n === 0;
+      assign.textContent = grouped()
+        ? `Assign to ${n} payee(s)`
+        : `Assign to ${n} row(s)`;
+    }
+
+    function checkbox(row, key) {
+      const input = document.createElement("input");
+      input.type = "checkbox";
+      input.checked = state.selected.has(key);
+      input.addEventListener("change", () => {
+        if (input.checked) state.selected.add(key);
+        else state.selected.delete(key);
+        updateAssign();
+      });
+      cell(row, "").appendChild(input);
+    }
+
+    async function load() {
+      const params = {
+        page: state.page,
+        per_page: controls.elements.per_page.value,
+        sort: controls.elements.sort.value,
+      };
+      if (grouped()) params.group = "payee";
+      if (state.payee !== null) params.payee = state.payee;
+
+      const response = await fetch(endpoint("queue", params));
+      const data = await response.json();
+      const body = table.tBodies[0];
+      body.replaceChildren();
+
+      if (data.groups) {
+        header(table, ["", "Payee", "Transactions", "Total", "Suggestion"]);
+        for (const group of data.groups) {
+          const row = body.insertRow();
+          checkbox(row, group.key);
+          const link = document.createElement("a");
+          link.href = "#";
+          link.textContent = group.payee || "(no payee)";
+          link.addEventListener("click", (event) => {
+            event.preventDefault();
+            state.payee = group.key;
+            state.page = 1;
+            state.selected.clear();
+            load();
+          });
+          cell(row, "").appendChild(link);
+          cell(row, group.count);
+          cell(
+            row,
+            Object.entries(group.totals)
+              .map(([currency, n]) => `${n} ${currency}`)
+              .join(", "),
+          );
+          cell(row, group.suggestion);
+        }
+      } else {
+        header(table, ["", "Date", "Payee", "Narration", "Amount", "Suggestion"]);
+        for (const item of data.rows) {
+          const row = body.insertRow();
+          checkbox(row, item.digest);
+          cell(row, item.date);
+          cell(row, item.payee);
+          cell(row, item.narration);
+          cell(row, `${item.amount} ${item.currency}`);
+          cell(row, item.suggestion);
+        }
+      }
+
+      const pages = Math.max(1, Math.ceil(data.total / data.per_page));
+      pager.querySelector("span").textContent =
+        `Page ${data.page} of ${pages} (${data.total} total)`;
+      pager.querySelector('[data-step="-1"]').disabled = data.page <= 1;
+      pager.querySelector('[data-step="1"]').disabled = data.page >= pages;
+      updateAssign();
+    }
+
+    async function loadAccounts() {
+      const response = await fetch(endpoint("accounts"));
+      const data = await response.json();
+      accounts.replaceChildren(
+        ...data.accounts.map((name) => {
+          const option = document.createElement("option");
+          option.value = name;
+          return option;
+        }),
+      );
+    }
+
+    assign.addEventListener("click", async () => {
+      const keys = [...state.selected];
+      const body = grouped()
+        ? { account: account.value, payees: keys }
+        : { account: account.value, digests: keys };
+      const response = await fetch(endpoint("assign"), {
+        method: "POST",
+        headers: { "Content-Type": "application/json" },
+        body: JSON.stringify(body),
+      });
+      const data = await response.json();
+      if (!response.ok) {
+        status.textContent = (data.problems || [data.error]).join("; ");
+        return;
+      }
+      status.textContent = `Assigned ${data.assigned}, ${data.remaining} left`;
+      state.selected.clear();
+      load();
+    });
+
+    controls.addEventListener("change", () => {
+      state.page = 1;
+      state.payee = null;
+      state.selected.clear();
+      load();
+    });
+
+    pager.addEventListener("click", (event) => {
+      const step = Number(event.target.dataset?.step);
+      if (!step) return;
+      state.page += step;
+      load();
+    });
+
+    loadAccounts();
+    load();
+  },
+};
@@ -0,0 +1,384 @@
+"""
+Classify transactions in bulk in Fava.
+
+:py:func:`roastery.edit.main` classifies one transaction at a time in the terminal.
+This Fava extension adds a *Classify* page to Fava instead, where you can select
+many transactions at once and assign an account to all of them. Enable it in your
+main journal:
+
+.. code-block:: beancount
+
+   2024-01-01 custom "fava-extension" "roastery.classify"
+
+The page shows the transactions that are still booked to an ``Unknown`` account,
+a page at a time. They can be sorted by any of the keys of
+:py:data:`roastery.bulk.SORT_KEYS`, or grouped by payee, so you can classify all
+transactions of a payee at once. The account that was most often chosen for the
+payee before is suggested.
+
+With the :py:mod:`roastery.plugin`, Fava also reloads the journal when the
+manual edits or flags change.
+
+The queue is computed once, when Fava loads the journal, and kept on the server.
+The browser only receives the page it shows. Assigning an account stores the
+manual edits of all selected transactions in one write, through
+:py:func:`roastery.edit.save_answers`, and removes them from the queue. The
+journal is not loaded again. As with ``./cli.py apply``, assigning ``Skip`` adds
+the transactions to the skip list.
+
+Assigning is idempotent, as ``apply`` is: digests that are no longer in the queue
+are accepted if the stored answer is the same. If storing was interrupted, assign
+the same transactions again to complete it.
+
+The extension needs a :py:class:`~roastery.config.Config` to know where the manual
+edits are. It creates one with :py:meth:`~roastery.config.Config.with_defaults`
+when it is loaded, with the project root from the extension configuration, relative
+to the main journal:
+
+.. code-block:: beancount
+
+   2024-01-01 custom "fava-extension" "roastery.classify" "{'project_root': '..'}"
+
+Without it, the :envvar:`PROJECT_ROOT` environment variable is used, and then the
+parent of the directory of the main journal.
+
+Endpoints
+---------
+
+All endpoints are under ``/<ledger>/extension/RoasteryClassify/``.
+
+``GET queue``
+  A page of the queue. Parameters: ``page`` (starting at 1), ``per_page``,
+  ``sort``, and ``group=payee``. With ``group=payee``, the page has one row per
+  payee instead of per transaction. ``payee`` only returns the transactions of a
+  single payee.
+``GET accounts``
+  The accounts to choose from.
+``POST assign``
+  JSON body with an ``account``, and either the ``digests`` of the transactions, or
+  the ``payees`` of groups to assign it to.
+
+API
+---
+
+.. autoclass:: RoasteryClassify
+   :members: rebuild, page, groups, assign
+"""
+
+from __future__ import annotations
+
+import collections
+import os
+import threading
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
+
+from fava.ext import FavaExtensionBase, extension_endpoint
+from flask import jsonify, request
+
+from roastery import bulk, edit, plugin, server
+from roastery.config import Config
+from roastery.edit import ManualEdits
+
+if TYPE_CHECKING:
+    from fava.core import FavaLedger
+
+    from roastery.edit import Unprocessed
+
+__all__ = [
+    "RoasteryClassify",
+]
+
+PER_PAGE = 50
+"""Default number of rows per page."""
+
+MAX_PER_PAGE = 500
+"""Maximum number of rows per page."""
+
+SKIP = "Skip"
+"""Account name that adds the transactions to the skip list."""
+
+
+def _payee_key(item: Unprocessed) -> str:
+    return (item.payee or "").strip().lower()
+
+
+def _int_arg(name: str, default: int, *, lo: int, hi: int) -> int:
+    try:
+        val = int(request.args.get(name, default))
+    except ValueError:
+        val = default
+    return min(max(val, lo), hi)
+
+
+class RoasteryClassify(FavaExtensionBase):
+    """The Fava extension. See the module documentation."""
+
+    report_title = "Classify"
+    has_js_module = True
+
+    def __init__(self, ledger: FavaLedger, config: str | None = None) -> None:
+        super().__init__(ledger, config)
+        self._lock = threading.Lock()
+        self._items: list[Unprocessed] = []
+        self._accounts: list[str] = []
+        self._history: dict[str, collections.Counter] = {}
+        self._sorted: dict[str, list[Unprocessed]] = {}
+        self._groups: list[dict[str, Any]] | None = None
+        self._config = self._load_config()
+
+    @property
+    def roastery_config(self) -> Config:
+        """The config to read and store the manual edits with."""
+        return self._config
+
+    def _load_config(self) -> Config:
+        options = self.config if isinstance(self.config, dict) else {}
+        if "project_root" in options:
+            root = Path(self.ledger.join_path(options["project_root"]))
+        elif "PROJECT_ROOT" in os.environ:
+            root = Path(os.environ["PROJECT_ROOT"])
+        else:
+            root = Path(self.ledger.beancount_file_path).resolve().parent.parent
+        return Config.with_defaults(project_root=root)
+
+    def after_load_file(self) -> None:
+        self._watch_stores()
+        self.rebuild()
+
+    def _watch_stores(self) -> None:
+        # Reload when the plugin's manual edits or flags change. Missing files are
+        # left out: Fava treats them as changed on every check.
+        stores = [
+            path
+            for path in map(Path, self.ledger.options.get(plugin.STORES_OPTION, []))
+            if path.exists()
+        ]
+        if stores:
+            files, folders = self.ledger.paths_to_watch()
+            self.ledger.watcher.update([*files, *stores], folders)
+
+    def rebuild(self) -> None:
+        """Compute the queue from the loaded journal."""
+        config = self.roastery_config
+        entries, options = self.ledger.all_entries, self.ledger.options
+        done = edit.read_skip(config) | edit.read_manual_edits(config).keys()
+        items = [
+            item
+            for item in edit.get_unprocessed(entries, options)
+            if item.digest not in done
+        ]
+        with self._lock:
+            self._items = items
+            self._accounts = sorted(edit.get_accounts(entries))
+            self._history = edit.account_history(config)
+            self._sorted = {}
+            self._groups = None
+
+    def _suggestion(self, item: Unprocessed) -> str | None:
+        suggestions = edit.suggest_accounts(self._history, item.payee, self._accounts)
+        return suggestions[0] if suggestions else None
+
+    def _encode(self, item: Unprocessed) -> dict[str, Any]:
+        return {
+            "digest": item.digest,
+            "date": item.date.isoformat(),
+            "amount": str(item.position.units.number),
+            "currency": item.position.units.currency,
+            "payee": item.payee,
+            "narration": item.narration,
+            "type": item.type,
+            "suggestion": self._suggestion(item),
+        }
+
+    def page(
+        self,
+        *,
+        page: int = 1,
+        per_page: int = PER_PAGE,
+        sort: str = "date",
+        payee: str | None = None,
+    ) -> dict[str, Any]:
+        """A page of the queue, as sent to the browser.
+
+        Sorted lists are computed once per sort key, and reused for every page.
+
+        :param payee: Only include transactions of this payee, as returned by
+          :py:meth:`groups`.
+        """
+        with self._lock:
+            if sort not in self._sorted:
+                self._sorted[sort] = sorted(self._items, key=bulk.SORT_KEYS[sort])
+            items = self._sorted[sort]
+            if payee is not None:
+                items = [item for item in items if _payee_key(item) == payee]
+            start = (page - 1) * per_page
+            rows = [self._encode(item) for item in items[start : start + per_page]]
+            return {
+                "total": len(items),
+                "page": page,
+                "per_page": per_page,
+                "rows": rows,
+            }
+
+    def _group_rows(self) -> list[dict[str, Any]]:
+        groups: dict[str, list[Unprocessed]] = collections.defaultdict(list)
+        for item in self._items:
+            groups[_payee_key(item)].append(item)
+
+        rows = []
+        for key, items in groups.items():
+            totals = collections.Counter()
+            for item in items:
+                totals[item.position.units.currency] += item.position.units.number
+            rows.append(
+                {
+                    "key": key,
+                    "payee": items[0].payee,
+                    "count": len(items),
+                    "totals": {currency: str(n) for currency, n in totals.items()},
+                    "suggestion": self._suggestion(items[0]),
+                }
+            )
+        rows.sort(key=lambda row: (-row["count"], row["key"]))
+        return rows
+
+    def groups(self, *, page: int = 1, per_page: int = PER_PAGE) -> dict[str, Any]:
+        """A page of the payees in the queue, with the most transactions first."""
+        with self._lock:
+            if self._groups is None:
+                self._groups = self._group_rows()
+            start = (page - 1) * per_page
+            return {
+                "total": len(self._groups),
+                "page": page,
+                "per_page": per_page,
+                "groups": self._groups[start : start + per_page],
+            }
+
+    def assign(
+        self,
+        account: str,
+        *,
+        digests: list[str] | None = None,
+        payees: list[str] | None = None,
+    ) -> int:
+        """Assign ``account`` to transactions in the queue, and store the edits.
+
+        :param digests: Digests of the transactions.
+        :param payees: Assign to all transactions of these payees, as returned by
+          :py:meth:`groups`.
+        :return: The number of transactions the account was assigned to.
+        :raises roastery.bulk.QueueError: If the account, any of the digests, or any
+          of the payees is unknown. Nothing is stored in that case.
+        """
+        config = self.roastery_config
+        with self._lock:
+            problems = []
+            if account != SKIP and account not in self._accounts:
+                problems.append(f"Unknown account {account}")
+
+            by_digest = {item.digest: item for item in self._items}
+            selected = [by_digest[d] for d in digests or [] if d in by_digest]
+            # Digests of answers that were stored before, see the module docs.
+            stored, skipped = {}, set()
+            if any(d not in by_digest for d in digests or []):
+                stored = edit.read_manual_edits(config)
+                skipped = edit.read_skip(config)
+            again = [
+                d
+                for d in digests or []
+                if d not in by_digest and bulk.is_stored(d, account, stored, skipped)
+            ]
+            problems.extend(
+                f"Unknown or already classified digest {d}"
+                for d in digests or []
+                if d not in by_digest and d not in again
+            )
+
+            wanted = set(payees or [])
+            problems.extend(
+                f"Unknown or already classified payee {key}"
+                for key in sorted(wanted - {_payee_key(item) for item in self._items})
+            )
+            chosen = {item.digest for item in selected}
+            selected.extend(
+                item
+                for item in self._items
+                if _payee_key(item) in wanted and item.digest not in chosen
+            )
+            if problems:
+                raise bulk.QueueError(problems)
+
+            to_save: dict[str, ManualEdits] = {}
+            to_skip: set[str] = set()
+            for digest in again:
+                if account == SKIP:
+                    to_skip.add(digest)
+                else:
+                    to_save[digest] = stored[digest]
+            for item in selected:
+                if account == SKIP:
+                    to_skip.add(item.digest)
+                else:
+                    # The query has "" for a missing payee: don't store it.
+                    to_save[item.digest] = {"account": account} | {
+                        key: val
+                        for key, val in (
+                            ("payee", item.payee),
+                            ("narration", item.narration),
+                        )
+                        if val
+                    }
+
+            edit.save_answers(config, to_save, to_skip, client=server.connect(config))
+
+            assigned = to_save.keys() | to_skip
+            self._items = [item for item in self._items if item.digest not in assigned]
+            self._sorted = {
+                sort: [item for item in items if item.digest not in assigned]
+                for sort, items in self._sorted.items()
+            }
+            self._groups = None
+            if account != SKIP:
+                for item in selected:
+                    key = _payee_key(item)
+                    self._history.setdefault(key, collections.Counter())[account] += 1
+            return len(assigned)
+
+    @extension_endpoint("queue")
+    def queue_endpoint(self):
+        per_page = _int_arg("per_page", PER_PAGE, lo=1, hi=MAX_PER_PAGE)
+        page = _int_arg("page", 1, lo=1, hi=1_000_000)
+        if request.args.get("group") == "payee":
+            return jsonify(self.groups(page=page, per_page=per_page))
+
+        sort = request.args.get("sort", "date")
+        if sort not in bulk.SORT_KEYS:
+            return jsonify({"error": f"Unknown sort key {sort}"}), 400
+        return jsonify(
+            self.page(
+                page=page,
+                per_page=per_page,
+                sort=sort,
+                payee=request.args.get("payee"),
+            )
+        )
+
+    @extension_endpoint("accounts")
+    def accounts_endpoint(self):
+        with self._lock:
+            return jsonify({"accounts": [*self._accounts, SKIP]})
+
+    @extension_endpoint("assign", ["POST"])
+    def assign_endpoint(self):
+        body = request.get_json(silent=True) or {}
+        try:
+            n = self.assign(
+                body.get("account", ""),
+                digests=body.get("digests"),
+                payees=body.get("payees"),
+            )
+        except bulk.QueueError as e:
+            return jsonify({"error": str(e), "problems": e.problems}), 400
+        return jsonify({"assigned": n, "remaining": len(self._items)})
@@ -22,9 +22,22 @@ This will result in the following CLI:
    │ --help          Show this message and exit.                         │
    ╰─────────────────────────────────────────────────────────────────────╯
    ╭─ Commands ──────────────────────────────────────────────────────────╮
-   │ edit     Edit transactions that haven't been classified yet.        │
-   │ fava     Start fava, the beancount web UI.                          │
-   │ flag     Flag an entry for later review, based on digest.           │
+   │ apply       Store the accounts filled in in an exported queue.      │
+   │ archive     Archive all years up to and including YEAR.             │
+   │ check       Load the journal and report any errors.                 │
+   │ edit        Edit transactions that haven't been classified yet.     │
+   │ export      Export transactions that haven't been classified yet.   │
+   │ fava        Start fava, the beancount web UI.                       │
+   │ flag        Flag an entry for later review, based on digest.        │
+   │ import      Import the statements in the statements directory.      │
+   │ open        Open the transaction with a digest in $EDITOR.          │
+   │ query       Run a BQL query against the journal.                    │
+   │ regenerate  Regenerate files with edited or flagged transactions.   │
+   │ report      Print monthly totals per account and the top payees.    │
+   │ serve       Keep the journal loaded in memory for other commands.   │
+   │ show        Show where the transaction with a digest came from.     │
+   │ stats       Summarise the timings of recorded edit sessions.        │
+   │ synthesize  Turn repeated manual edits into rules.                  │
    ╰─────────────────────────────────────────────────────────────────────╯
 
 Command reference
@@ -38,34 +51,153 @@ API
 .. autofunction:: make_cli
 """
 
+import datetime
 import json
 import os
+import shlex
 import sys
+from pathlib import Path
+from typing import TYPE_CHECKING, Annotated, Optional
 
+import click
 import typer
+from beancount.parser import printer
 from rich.traceback import install as install_traceback_handler
 
+from roastery import atomic, bulk, edit, loading, locator, server, term
 from roastery.config import Config
 from roastery.edit import main as edit_main
+from roastery.importer import CleanFn
+
+if TYPE_CHECKING:
+    from roastery.registry import FormatRegistry
 
 __all__ = [
     "make_cli",
 ]
 
 
-def make_cli(config: Config) -> typer.Typer:
+def make_cli(
+    config: Config,
+    *,
+    registry: "FormatRegistry | None" = None,
+    clean: CleanFn = None,
+) -> typer.Typer:
     """Create a roastery CLI application from the given config.
 
     This function returns a Typer instance. You can customize the the instance with
     your own commands. See :doc:`/getting-started/index` for more information.
+
+    :param registry: Formats of your statements. With a registry, the ``import`` and
+      ``regenerate`` commands are available, and the files affected by an ``edit``
+      session are regenerated when it ends. See :py:mod:`roastery.regenerate`.
+    :param clean: Cleaning function to use when importing statements.
     """
     install_traceback_handler(show_locals=True)
     cli = typer.Typer(no_args_is_help=True, add_completion=False)
 
+    def locate(digest: str) -> locator.Location:
+        if not locator.index_path(config).exists():
+            term.error("There is no digest index yet")
+            term.hint("Set `Config.index_digests` and import your statements again")
+            sys.exit(1)
+
+        with locator.DigestIndex(config) as index:
+            location = index.lookup(digest)
+        if location is None:
+            term.error(f"Digest {digest} is not in the index")
+            sys.exit(1)
+        return location
+
+    @cli.command(name="apply")
+    def apply_cmd(path: Path) -> None:
+        """Store the accounts filled in in an exported queue."""
+        try:
+            with path.open(newline="") as f:
+                n_edits, n_skips = bulk.apply_queue(
+                    config,
+                    f,
+                    client=server.connect(config),
+                    delimiter=bulk.delimiter_for(path),
+                )
+        except bulk.QueueError as e:
+            term.error(f"Nothing was stored, {e}:", *e.problems)
+            sys.exit(1)
+
+        term.info(f"Stored {n_edits} edit(s) and {n_skips} skip(s)")
+
+    @cli.command(name="archive")
+    def archive_cmd(year: int) -> None:
+        """Archive all years up to and including YEAR."""
+        from roastery import archive
+
+        try:
+            archived = archive.archive_year(config, year)
+        except archive.ArchiveError as e:
+            term.error(f"Can't archive {year}:", *e.problems)
+            sys.exit(1)
+
+        term.info(f"Archived {len(archived)} file(s) to {archive.archive_dir(config)}")
+        cutoff = config.do_not_import_before
+        if cutoff is None or cutoff < datetime.date(year, 12, 31):
+            term.hint(
+                f"Set `Config.do_not_import_before` to {year}-12-31, so the archived "
+                + "statements are not imported again"
+            )
+
+    @cli.command(name="check")
+    def check_cmd(
+        history: Annotated[bool, typer.Option("--history")] = False,
+    ) -> None:
+        """Load the journal and report any errors."""
+        entries, errors, options = loading.load_journal(config, history=history)
+        if errors:
+            printer.print_errors(errors, file=sys.stdout)
+            term.error(f"{len(errors)} error(s) in {config.journal_path}")
+            sys.exit(1)
+
+        term.info(f"Loaded {len(entries)} entries without errors")
+
+    def regenerate() -> None:
+        from roastery.regenerate import regenerate
+
+        for beancount_file in regenerate(config, registry, clean=clean):
+            term.info(f"Regenerated {beancount_file}")
+
     @cli.command(name="edit")
     def edit_cmd() -> None:
         """Edit transactions that haven't been classified yet."""
-        edit_main(config)
+        edit_main(config, client=server.connect(config))
+        if registry is not None:
+            regenerate()
+
+    @cli.command(name="export")
+    def export_cmd(
+        path: Annotated[Optional[Path], typer.Argument()] = None,
+        start: Annotated[Optional[datetime.datetime], typer.Option("--from")] = None,
+        end: Annotated[Optional[datetime.datetime], typer.Option("--to")] = None,
+        payee: Optional[str] = None,
+        sort: Annotated[
+            str, typer.Option(click_type=click.Choice(list(bulk.SORT_KEYS)))
+        ] = "date",
+    ) -> None:
+        """Export transactions that haven't been classified yet."""
+        kwargs = dict(
+            client=server.connect(config),
+            start=start and start.date(),
+            end=end and end.date(),
+            payee=payee,
+            sort=sort,
+        )
+        if path is None:
+            bulk.export_queue(config, sys.stdout, **kwargs)
+            return
+
+        with path.open("w", newline="") as f:
+            n = bulk.export_queue(
+                config, f, delimiter=bulk.delimiter_for(path), **kwargs
+            )
+        term.info(f"Exported {n} transaction(s) to {path}")
 
     @cli.command(name="fava")
     def fava_cmd() -> None:
@@ -82,13 +214,162 @@ def make_cli(config: Config) -> typer.Typer:
             print("Digest should be a 32 character md5 hash")
             sys.exit(1)
 
+        if client := server.connect(config):
+            client.flag(digest)
+            return
+
         try:
             flags = set(json.loads(config.flags_path.read_text()))
         except Exception:
             flags = set()
 
         flags.add(digest)
-        config.flags_path.parent.mkdir(exist_ok=True)
-        config.flags_path.write_text(json.dumps(sorted(flags), indent=4) + "\n")
+        atomic.write_json(config.flags_path, sorted(flags))
+        edit.mark_changed(config, [digest])
+
+    @cli.command(name="import")
+    def import_cmd(
+        start: Annotated[Optional[datetime.datetime], typer.Option("--from")] = None,
+        end: Annotated[Optional[datetime.datetime], typer.Option("--to")] = None,
+    ) -> None:
+        """Import the statements in the statements directory."""
+        if registry is None:
+            term.error("The import command requires a format registry")
+            term.hint("Pass `registry` to `make_cli`")
+            sys.exit(1)
+
+        detected = registry.import_statements(
+            config.statements_dir,
+            clean=clean,
+            start=start and start.date(),
+            end=end and end.date(),
+        )
+        imported = sum(fmt is not None for fmt in detected.values())
+        term.info(f"Imported {imported} statement(s)")
+
+    @cli.command(name="open")
+    def open_cmd(digest: str) -> None:
+        """Open the transaction with a digest in $EDITOR."""
+        location = locate(digest)
+        editor = shlex.split(os.environ.get("EDITOR", "vi"))
+        os.execvp(
+            editor[0], [*editor, f"+{location.line}", str(location.beancount_file)]
+        )
+
+    @cli.command(name="query")
+    def query_cmd(query: str) -> None:
+        """Run a BQL query against the journal."""
+        client = server.connect(config)
+        if client is None:
+            state = server.JournalState(config)
+            state.refresh()
+            client = server.LocalClient(state)
+
+        try:
+            columns, rows = client.query(query)
+        except RuntimeError as e:
+            term.error(str(e))
+            sys.exit(1)
+
+        print("\t".join(columns))
+        for row in rows:
+            print("\t".join("" if val is None else str(val) for val in row))
+
+    @cli.command(name="regenerate")
+    def regenerate_cmd() -> None:
+        """Regenerate files with edited or flagged transactions."""
+        if registry is None:
+            term.error("The regenerate command requires a format registry")
+            term.hint("Pass `registry` to `make_cli`")
+            sys.exit(1)
+        regenerate()
+
+    @cli.command(name="report")
+    def report_cmd(
+        start: Annotated[Optional[datetime.datetime], typer.Option("--from")] = None,
+        end: Annotated[Optional[datetime.datetime], typer.Option("--to")] = None,
+        top: int = 10,
+    ) -> None:
+        """Print monthly totals per account and the top payees."""
+        try:
+            from roastery import report
+        except ImportError:
+            term.error("The report command requires NumPy")
+            term.hint("Install it with `pip install roastery[report]`")
+            sys.exit(1)
+
+        report.print_report(
+            config,
+            start=start and start.date(),
+            end=end and end.date(),
+            top=top,
+        )
+
+    @cli.command(name="serve")
+    def serve_cmd() -> None:
+        """Keep the journal loaded in memory for other commands."""
+        server.serve(config)
+
+    @cli.command(name="show")
+    def show_cmd(digest: str) -> None:
+        """Show where the transaction with a digest came from."""
+        location = locate(digest)
+        try:
+            flags = set(json.loads(config.flags_path.read_text()))
+        except Exception:
+            flags = set()
+        manual_edit = edit.read_manual_edits(config).get(digest)
+
+        print(f"Statement:   {location.statement or '-'}, row {location.row or '-'}")
+        print(f"Ledger:      {location.beancount_file}:{location.line}")
+        print(f"Flagged:     {'yes' if digest in flags else 'no'}")
+        print(f"Manual edit: {json.dumps(manual_edit) if manual_edit else '-'}")
+
+        if (text := location.read_transaction()) is None:
+            term.warn(
+                f"{location.beancount_file} has changed since it was indexed",
+                "Import the statement again to update the index",
+            )
+            sys.exit(1)
+        print()
+        print(text, end="")
+
+    @cli.command(name="stats")
+    def stats_cmd() -> None:
+        """Summarise the timings of recorded edit sessions."""
+        from roastery import telemetry
+
+        telemetry.print_stats(config)
+
+    @cli.command(name="synthesize")
+    def synthesize_cmd(
+        min_support: Annotated[int, typer.Option("--min-support")] = 3,
+        min_confidence: Annotated[float, typer.Option("--min-confidence")] = 0.95,
+        write: Annotated[bool, typer.Option("--write")] = False,
+    ) -> None:
+        """Turn repeated manual edits into rules."""
+        from roastery import synthesis
+
+        if registry is None:
+            term.error("The synthesize command requires a format registry")
+            term.hint("Pass `registry` to `make_cli`")
+            sys.exit(1)
+        if write and not config.apply_rules:
+            term.error("The stored rules are only applied with `apply_rules`")
+            term.hint("Pass `apply_rules=True` to `Config.with_defaults`")
+            sys.exit(1)
+
+        result = synthesis.synthesize(
+            config,
+            registry,
+            clean=clean,
+            min_support=min_support,
+            min_confidence=min_confidence,
+        )
+        result.print()
+        if write:
+            synthesis.write_rules(config, result.rules)
+            removed = edit.remove_manual_edits(config, result.redundant)
+            term.info(f"Stored {len(result.rules)} rule(s), removed {removed} edit(s)")
 
     return cli
@@ -19,6 +19,7 @@ API
 
 import dataclasses
 import datetime
+import hashlib
 import os
 import sys
 from pathlib import Path
@@ -64,6 +65,78 @@ class Config:
     This is useful if you want to keep a your entire history of financial statements and
     gradually import / classify them."""
 
+    state_dir: Path = None
+    """Directory for files that Roastery manages itself, such as the socket of
+    :py:mod:`roastery.server`. Defaults to the directory containing
+    :py:obj:`Config.manual_edits_path`."""
+
+    export_columns: bool = False
+    """Also store imported entries as NumPy arrays, for the reports in
+    :py:mod:`roastery.report`. Requires NumPy."""
+
+    cache_entries: bool = False
+    """Cache extracted entries per statement, so statements are only parsed once.
+    See :py:mod:`roastery.cache`."""
+
+    sort_entries: bool = False
+    """Write imported transactions sorted by date, and then by digest, instead of in
+    the order of the statement. See :py:mod:`roastery.sorting`."""
+
+    sort_memory_limit: int = 64 * 1024 * 1024
+    """Approximate number of bytes that sorting may use before it spills sorted runs
+    to disk. See :py:mod:`roastery.sorting`."""
+
+    index_digests: bool = False
+    """Record the statement, row, and location in the generated beancount file of every
+    imported transaction. See :py:mod:`roastery.locator`."""
+
+    overlay_edits: bool = False
+    """Don't apply manual edits and flags when importing. Use this together with the
+    beancount plugin in :py:mod:`roastery.plugin`, which applies them when the
+    journal is loaded."""
+
+    check_balances: bool = False
+    """Warn about missing and duplicate rows in imported statements, based on the
+    running balance in the statement. See :py:mod:`roastery.balances`. Requires
+    NumPy."""
+
+    assert_balances: bool = False
+    """Add a ``balance`` assertion for every asset account at the end of each
+    generated beancount file. See :py:mod:`roastery.balances`. Requires NumPy."""
+
+    apply_rules: bool = False
+    """Apply the rules stored by ``./cli.py synthesize --write`` to every entry that
+    ``clean`` leaves without an account. See :py:mod:`roastery.synthesis`."""
+
+    record_timings: bool = False
+    """Record how long each phase and prompt of ``./cli.py edit`` takes, for
+    ``./cli.py stats``. See :py:mod:`roastery.telemetry`."""
+
+    def __post_init__(self) -> None:
+        if self.state_dir is None:
+            self.state_dir = self.manual_edits_path.parent
+
+    @property
+    def socket_path(self) -> Path:
+        """Unix socket that :py:mod:`roastery.server` listens on."""
+        return self.state_dir / "server.sock"
+
+    @property
+    def changed_path(self) -> Path:
+        """File with the digests of transactions that were edited or flagged since
+        the generated files were regenerated. See :py:mod:`roastery.regenerate`."""
+        return self.state_dir / "changed.json"
+
+    def state_file(self, kind: str, path: Path, suffix: str) -> Path:
+        """File in which Roastery keeps state of type ``kind`` about ``path``.
+
+        For example: ``config.state_file("columns", Path("foo.beancount"), ".npz")``
+        returns ``.roastery/columns/foo-<hash>.npz``. The hash of the absolute
+        path keeps files with the same name in different directories apart.
+        """
+        key = hashlib.md5(str(path.resolve()).encode("utf-8")).hexdigest()
+        return self.state_dir / kind / f"{path.stem}-{key[:12]}{suffix}"
+
     @classmethod
     def with_defaults(
         cls,
@@ -76,6 +149,17 @@ class Config:
         flags_path: Path = None,
         default_account_name_suffix: str = "Unknown",
         do_not_import_before: datetime.date = None,
+        state_dir: Path = None,
+        export_columns: bool = False,
+        cache_entries: bool = False,
+        sort_entries: bool = False,
+        sort_memory_limit: int = 64 * 1024 * 1024,
+        index_digests: bool = False,
+        overlay_edits: bool = False,
+        check_balances: bool = False,
+        assert_balances: bool = False,
+        apply_rules: bool = False,
+        record_timings: bool = False,
     ) -> "Config":
         """
         Create a :py:class:`Config` with default values.
@@ -96,6 +180,17 @@ class Config:
         :param flags_path: See :py:obj:`Config.flags_path`
         :param default_account_name_suffix: See :py:obj:`Config.default_account_name_suffix`
         :param do_not_import_before: See :py:obj:`Config.do_not_import_before`
+        :param state_dir: See :py:obj:`Config.state_dir`
+        :param export_columns: See :py:obj:`Config.export_columns`
+        :param cache_entries: See :py:obj:`Config.cache_entries`
+        :param sort_entries: See :py:obj:`Config.sort_entries`
+        :param sort_memory_limit: See :py:obj:`Config.sort_memory_limit`
+        :param index_digests: See :py:obj:`Config.index_digests`
+        :param overlay_edits: See :py:obj:`Config.overlay_edits`
+        :param check_balances: See :py:obj:`Config.check_balances`
+        :param assert_balances: See :py:obj:`Config.assert_balances`
+        :param apply_rules: See :py:obj:`Config.apply_rules`
+        :param record_timings: See :py:obj:`Config.record_timings`
 
         :return: A new :class:`~roastery.config.Config` instance.
         :raises SystemExit: If one of the filesystem paths cannot be inferred
@@ -132,4 +227,15 @@ class Config:
             flags_path=flags_path or (project_root / ".roastery/flags.json"),
             default_account_name_suffix=default_account_name_suffix,
             do_not_import_before=do_not_import_before,
+            state_dir=state_dir,
+            export_columns=export_columns,
+            cache_entries=cache_entries,
+            sort_entries=sort_entries,
+            sort_memory_limit=sort_memory_limit,
+            index_digests=index_digests,
+            overlay_edits=overlay_edits,
+            check_balances=check_balances,
+            assert_balances=assert_balances,
+            apply_rules=apply_rules,
+            record_timings=record_timings,
         )
@@ -9,22 +9,31 @@ end user are saved in a JSON file that can be version controlled with git.
 
 import datetime
 import json
+import queue
+import threading
 import typing
-from collections import defaultdict
+from collections import Counter, defaultdict
 
-from beancount import loader
 from beancount.core import data
 from beancount.core.number import D
 from beancount.core.position import Position
 from beancount.query.query import run_query
 
-from roastery import term
+from roastery import atomic, loading, telemetry, term
 from roastery.config import Config
 
 
 __all__ = [
     "main",
     "ManualEdits",
+    "load_queue",
+    "save_answers",
+    "remove_manual_edits",
+    "account_history",
+    "suggest_accounts",
+    "read_changed",
+    "write_changed",
+    "mark_changed",
 ]
 
 
@@ -53,9 +62,12 @@ class Unprocessed(typing.Protocol):
     narration: str
     digest: str
     type: str
+    template: str | None
+    """Narration template, if the transaction has one. See :py:mod:`roastery.templates`."""
 
 
-def display(item) -> None:
+def display_text(item) -> list[str]:
+    """Lines of Rich markup that :py:func:`display` logs for ``item``."""
     amount = item.position.units.number
     currency = item.position.units.currency
 
@@ -66,8 +78,11 @@ def display(item) -> None:
         color = "red"
 
     message = f"[bold blue]{item.date}[/bold blue] {item.payee} [bold {color}]{amount} {currency}[/bold {color}]"
-    to_log = [message, item.narration] if item.narration else [message]
-    term.log(*to_log, style="bold blue")
+    return [message, item.narration] if item.narration else [message]
+
+
+def display(item) -> None:
+    term.log(*display_text(item), style="bold blue")
 
 
 def get_unprocessed(entries, options) -> list[Unprocessed]:
@@ -78,14 +93,269 @@ def get_unprocessed(entries, options) -> list[Unprocessed]:
             payee,
             narration,
             any_meta("digest") as digest,
-            any_meta("type") as type
+            any_meta("type") as type,
+            any_meta("narration_template") as template
         where account ~ "Unknown"
     """
     res_type, res_rows = run_query(entries, options, query)
     return res_rows
 
 
-def main(config: Config) -> None:
+def get_accounts(entries) -> list[str]:
+    """Accounts that the user can choose from when classifying an entry."""
+    accounts = {entry.account for entry in entries if isinstance(entry, data.Open)}
+    return [
+        account
+        for account in accounts
+        if "Assets:Bank" not in account and "Equity:Opening-Balances" not in account
+    ]
+
+
+def read_skip(config: Config) -> set[str]:
+    """Digests the user chose to skip in previous edit sessions."""
+    try:
+        return set(json.loads(config.skip_path.read_text()))
+    except FileNotFoundError:
+        return set()
+
+
+def read_manual_edits(config: Config) -> dict[str, ManualEdits]:
+    """Manual edits from previous edit sessions, indexed by digest."""
+    try:
+        return json.loads(config.manual_edits_path.read_text())
+    except (ValueError, FileNotFoundError):
+        return {}
+
+
+def save(config: Config, to_save: dict[str, ManualEdits], to_skip: set[str]) -> None:
+    """Merge ``to_save`` into the manual edits and overwrite the skip list.
+
+    Both files are replaced atomically, so a crash halfway through a write never
+    leaves a truncated file behind.
+    """
+    prev = read_manual_edits(config)
+    atomic.write_json(config.manual_edits_path, prev | to_save)
+    atomic.write_json(config.skip_path, sorted(to_skip))
+    if to_save:
+        mark_changed(config, to_save.keys())
+
+
+def remove_manual_edits(config: Config, digests: typing.Iterable[str]) -> int:
+    """Remove the manual edits of ``digests``, and return how many were removed.
+
+    Used to prune edits that :py:mod:`roastery.synthesis` rules reproduce, so the
+    generated files do not change and nothing is marked as changed.
+    """
+    prev = read_manual_edits(config)
+    kept = {digest: edits for digest, edits in prev.items() if digest not in digests}
+    if len(kept) != len(prev):
+        atomic.write_json(config.manual_edits_path, kept)
+    return len(prev) - len(kept)
+
+
+def read_changed(config: Config) -> set[str]:
+    """Digests of transactions that were edited or flagged since the generated files
+    were last regenerated. See :py:mod:`roastery.regenerate`."""
+    try:
+        return set(json.loads(config.changed_path.read_text()))
+    except (ValueError, FileNotFoundError):
+        return set()
+
+
+def write_changed(config: Config, digests: typing.Iterable[str]) -> None:
+    """Replace the digests returned by :py:func:`read_changed`."""
+    atomic.write_json(config.changed_path, sorted(digests))
+
+
+def mark_changed(config: Config, digests: typing.Iterable[str]) -> None:
+    """Add ``digests`` to the ones returned by :py:func:`read_changed`."""
+    write_changed(config, read_changed(config) | set(digests))
+
+
+def load_queue(config: Config, *, client=None) -> tuple[list[str], list[Unprocessed]]:
+    """The accounts to choose from and the entries that still need to be classified.
+
+    Entries on the skip list, and entries with manual edits that are not imported
+    yet, are left out.
+
+    :param client: Optional :py:class:`roastery.server.Client` to ask instead of
+      loading the journal.
+    """
+    if client is not None:
+        with telemetry.phase("server"):
+            return client.accounts(), client.unprocessed()
+
+    with telemetry.phase("load_journal"):
+        entries, errors, options = loading.load_journal(config)
+    with telemetry.phase("get_unprocessed"):
+        done = read_skip(config) | read_manual_edits(config).keys()
+        unprocessed = [
+            item
+            for item in get_unprocessed(entries, options)
+            if item.digest not in done
+        ]
+        accounts = get_accounts(entries)
+    return accounts, unprocessed
+
+
+def save_answers(
+    config: Config,
+    to_save: dict[str, ManualEdits],
+    to_skip: set[str],
+    *,
+    client=None,
+) -> None:
+    """Add the edits in ``to_save`` and the digests in ``to_skip`` to what is stored.
+
+    :param client: Optional :py:class:`roastery.server.Client` to save through.
+    """
+    if client is None:
+        save(config, to_save, read_skip(config) | to_skip)
+    else:
+        client.save(to_save, to_skip)
+
+
+def _payee_key(payee: str | None) -> str:
+    return (payee or "").strip().lower()
+
+
+def account_history(config: Config) -> dict[str, Counter]:
+    """How often each account was chosen per payee in previous edit sessions.
+
+    Keys are normalised payee names. Use :py:func:`suggest_accounts` to look up a payee.
+    """
+    history = defaultdict(Counter)
+    for edits in read_manual_edits(config).values():
+        if account := edits.get("account"):
+            history[_payee_key(edits.get("payee"))][account] += 1
+    return history
+
+
+def suggest_accounts(
+    history: dict[str, Counter], payee: str | None, accounts: list[str]
+) -> list[str]:
+    """Accounts previously chosen for ``payee``, most common first.
+
+    :param history: See :py:func:`account_history`.
+    :param accounts: Only suggest these accounts.
+    """
+    return [
+        account
+        for account, _ in history.get(_payee_key(payee), Counter()).most_common()
+        if account in accounts
+    ]
+
+
+class _Prepared(typing.NamedTuple):
+    """Everything needed to prompt for an item, computed ahead of time."""
+
+    item: Unprocessed
+    text: list[str]
+    suggestions: list[str]
+
+
+def _prepare_all(
+    unprocessed: list[Unprocessed], accounts: list[str], config: Config
+) -> typing.Iterator[_Prepared]:
+    """Compute display text, suggestions and cluster info for every item.
+
+    This runs on the prefetch thread. Suggested accounts are the ones previously
+    chosen for the same payee, most common first.
+    """
+    history = account_history(config)
+    clusters = Counter(_payee_key(item.payee) for item in unprocessed)
+    seen = Counter()
+
+    for item in unprocessed:
+        key = _payee_key(item.payee)
+        seen[key] += 1
+
+        text = display_text(item)
+        if clusters[key] > 1:
+            text.append(f"[dim]{seen[key]} of {clusters[key]} from this payee[/dim]")
+
+        suggestions = suggest_accounts(history, item.payee, accounts)
+        yield _Prepared(item=item, text=text, suggestions=suggestions)
+
+
+_DONE = object()
+
+
+def _prefetch(
+    prepared: typing.Iterator[_Prepared], *, lookahead: int = 16
+) -> typing.Iterator[_Prepared]:
+    """Consume ``prepared`` on a background thread, ``lookahead`` items ahead."""
+    buffer = queue.Queue(maxsize=lookahead)
+
+    def produce() -> None:
+        try:
+            for val in prepared:
+                buffer.put(val)
+        except BaseException as e:
+            buffer.put(e)
+        buffer.put(_DONE)
+
+    threading.Thread(target=produce, daemon=True).start()
+
+    while (val := buffer.get()) is not _DONE:
+        if isinstance(val, BaseException):
+            raise val
+        yield val
+
+
+class _Writer:
+    """Persists the answers of an edit session on a background thread.
+
+    Every call to :py:meth:`submit` schedules a write of everything answered so far.
+    Writes that pile up while a previous write is in progress are coalesced.
+    """
+
+    def __init__(
+        self, persist: typing.Callable[[dict[str, ManualEdits], set[str]], None]
+    ) -> None:
+        self.to_save: dict[str, ManualEdits] = {}
+        self.to_skip: set[str] = set()
+        self._persist = persist
+        self._lock = threading.Lock()
+        self._pending = threading.Event()
+        self._closed = False
+        self._error: BaseException | None = None
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, digest: str, edits: ManualEdits | None = None) -> None:
+        """Record an answer. ``edits`` is ``None`` when the user skipped the item."""
+        with self._lock:
+            if edits is None:
+                self.to_skip.add(digest)
+            else:
+                self.to_save[digest] = edits
+        self._pending.set()
+
+    def _run(self) -> None:
+        while True:
+            self._pending.wait()
+            self._pending.clear()
+            with self._lock:
+                to_save, to_skip = dict(self.to_save), set(self.to_skip)
+            try:
+                with telemetry.phase("write"):
+                    self._persist(to_save, to_skip)
+            except BaseException as e:
+                self._error = e
+            if self._closed and not self._pending.is_set():
+                return
+
+    def close(self) -> None:
+        """Wait for the last write to finish."""
+        self._closed = True
+        self._pending.set()
+        self._thread.join()
+        if self._error is not None:
+            raise self._error
+
+
+def main(config: Config, *, client=None) -> None:
     """
     Find all unclassified transactions and prompt the user to assign them to a category.
 
@@ -93,49 +363,74 @@ def main(config: Config) -> None:
     select their preferred category. This function assumes that ``fzf`` is installed and
     available on ``PATH``.
 
+    The session is pipelined: while the user answers a prompt, the display text and
+    suggested accounts of the next items are computed on a background thread, and
+    answers are written to disk on another. Accounts that were chosen before for the
+    same payee are listed first.
+
     :param config: The configuration to use to find files on disk.
+    :param client: Optional :py:class:`roastery.server.Client`. When given, the journal,
+      accounts, and queue come from a running :py:mod:`roastery.server` instead of
+      being loaded from disk, and the edits are saved through the server.
+
+    With :py:obj:`~roastery.config.Config.record_timings`, the session is timed. See
+    :py:mod:`roastery.telemetry`.
     """
-    entries, errors, options = loader.load_file(config.journal_path)
+    with telemetry.session(config):
+        _session(config, client=client)
 
-    accounts = {entry.account for entry in entries if isinstance(entry, data.Open)}
-    accounts = [
-        account
-        for account in accounts
-        if "Assets:Bank" not in account and "Equity:Opening-Balances" not in account
-    ]
 
-    to_save = defaultdict(dict)
-    to_skip = set(json.loads(config.skip_path.read_text()))
+def _session(config: Config, *, client=None) -> None:
+    accounts, unprocessed = load_queue(config, client=client)
+    writer = _Writer(
+        lambda to_save, to_skip: save_answers(config, to_save, to_skip, client=client)
+    )
+
+    # Answers for payees seen earlier in this session take precedence over
+    # the suggestions that were computed ahead of time.
+    session = {}
 
     try:
-        for item in get_unprocessed(entries, options):
-            if item.digest in to_skip:
-                continue
+        for prepared in _prefetch(_prepare_all(unprocessed, accounts, config)):
+            item = prepared.item
+            term.log(*prepared.text, style="bold blue")
+
+            key = _payee_key(item.payee)
+            suggestions = ([session[key]] if key in session else []) + [
+                account
+                for account in prepared.suggestions
+                if account != session.get(key)
+            ]
+            options = suggestions + [a for a in accounts if a not in suggestions]
 
-            display(item)
             account_or_skip = term.select_fuzzy_search(
-                "Select account", options=accounts + ["Skip"]
+                "Select account",
+                options=options + ["Skip"],
+                starting=telemetry.phase("fzf_start"),
+                waiting=telemetry.prompt("fzf"),
             )
 
             if account_or_skip == "Skip":
-                to_skip.add(item.digest)
+                writer.submit(item.digest)
+                telemetry.count("skipped")
             else:
                 payee_pretty = (
                     item.payee.title() if item.payee.isupper() else item.payee
                 )
+                with telemetry.prompt("ask"):
+                    payee = term.ask("Payee", default=payee_pretty)
+                with telemetry.prompt("ask"):
+                    narration = term.ask("Narration", default=item.narration)
                 item_edits = {
                     "account": account_or_skip,
-                    "payee": term.ask("Payee", default=payee_pretty),
-                    "narration": term.ask("Narration", default=item.narration),
+                    "payee": payee,
+                    "narration": narration,
                 }
-                to_save[item.digest] = item_edits
+                session[key] = account_or_skip
+                writer.submit(item.digest, item_edits)
+                telemetry.count("classified")
     except KeyboardInterrupt:
         pass
-
-    try:
-        prev = json.loads(config.manual_edits_path.read_text())
-    except (ValueError, FileNotFoundError):
-        prev = {}
-
-    config.manual_edits_path.write_text(json.dumps(prev | to_save, indent=4) + "\n")
-    config.skip_path.write_text(json.dumps(sorted(to_skip), indent=4) + "\n")
+    finally:
+        with telemetry.phase("final_write"):
+            writer.close()
@@ -1,12 +1,17 @@
 import datetime
 import hashlib
-
-from typing import TypedDict, NotRequired
+import html
+import io
+import re
+from pathlib import Path
+from typing import BinaryIO, Iterator, TextIO, TypedDict, NotRequired
+from xml.etree import ElementTree
 
 from beancount.core.data import Amount
 from beancount.core.number import D
 
 from roastery.importer import Entry
+from roastery.sources import Source, as_source
 
 
 DemoCsvRow = TypedDict(
@@ -69,6 +74,7 @@ class AsnMeta(TypedDict):
     type: str
     tegenrekening: NotRequired[str]
     volgnummer: NotRequired[str]
+    balance_before: NotRequired[str]
 
 
 def extract_asn(row: AsnCsvRow) -> Entry[AsnMeta]:
@@ -87,6 +93,9 @@ def extract_asn(row: AsnCsvRow) -> Entry[AsnMeta]:
     if row["Volgnummer transactie"] != "":
         meta |= {"volgnummer": row["Volgnummer transactie"]}
 
+    if row["Saldo rekening voor mutatie"] != "":
+        meta |= {"balance_before": row["Saldo rekening voor mutatie"]}
+
     return Entry.from_row(
         digest=digest,
         date=date,
@@ -99,6 +108,229 @@ def extract_asn(row: AsnCsvRow) -> Entry[AsnMeta]:
     )
 
 
+class Camt053Row(TypedDict):
+    """An entry (``Ntry``) of a CAMT.053 statement, as read by :py:func:`read_camt053`."""
+
+    iban: str
+    """IBAN of the account of the statement."""
+    booking_date: str
+    value_date: str
+    amount: str
+    """Signed amount. Negative for debit entries."""
+    currency: str
+    reference: str
+    """The bank's own reference for this entry: ``AcctSvcrRef``, or else ``NtryRef``."""
+    end_to_end_id: str
+    counterparty: str
+    counterparty_iban: str
+    description: str
+    """Unstructured remittance information, or else the additional entry information."""
+    bank_transaction_code: str
+    status: str
+
+
+def _local(tag: str) -> str:
+    return tag.rpartition("}")[2]
+
+
+def _text(elem: ElementTree.Element, path: str) -> str:
+    found = elem.find(path)
+    return "" if found is None or found.text is None else found.text.strip()
+
+
+def _camt053_row(ntry: ElementTree.Element, iban: str) -> Camt053Row:
+    for el in ntry.iter():
+        el.tag = _local(el.tag)
+
+    debit = _text(ntry, "CdtDbtInd") == "DBIT"
+    amount = ntry.find("Amt")
+    party = "Cdtr" if debit else "Dbtr"
+    tx = "NtryDtls/TxDtls"
+
+    description = " ".join(
+        el.text.strip() for el in ntry.iterfind(f"{tx}/RmtInf/Ustrd") if el.text
+    )
+
+    return {
+        "iban": iban,
+        "booking_date": _text(ntry, "BookgDt/Dt") or _text(ntry, "BookgDt/DtTm")[:10],
+        "value_date": _text(ntry, "ValDt/Dt") or _text(ntry, "ValDt/DtTm")[:10],
+        "amount": ("-" if debit else "") + amount.text.strip(),
+        "currency": amount.get("Ccy", ""),
+        "reference": (
+            _text(ntry, "AcctSvcrRef")
+            or _text(ntry, "NtryRef")
+            or _text(ntry, f"{tx}/Refs/AcctSvcrRef")
+        ),
+        "end_to_end_id": _text(ntry, f"{tx}/Refs/EndToEndId"),
+        "counterparty": (
+            _text(ntry, f"{tx}/RltdPties/{party}/Nm")
+            or _text(ntry, f"{tx}/RltdPties/{party}/Pty/Nm")
+        ),
+        "counterparty_iban": _text(ntry, f"{tx}/RltdPties/{party}Acct/Id/IBAN"),
+        "description": description or _text(ntry, "AddtlNtryInf"),
+        "bank_transaction_code": (
+            _text(ntry, "BkTxCd/Domn/Fmly/SubFmlyCd") or _text(ntry, "BkTxCd/Prtry/Cd")
+        ),
+        "status": _text(ntry, "Sts/Cd") or _text(ntry, "Sts"),
+    }
+
+
+def read_camt053(path: Path | Source) -> Iterator[Camt053Row]:
+    """Stream the entries of an ISO 20022 CAMT.053 statement.
+
+    The file is parsed incrementally. Every entry is removed from the tree once it
+    has been read, so memory use does not grow with the size of the file. All
+    versions of the ``camt.053.001`` namespace are accepted.
+    """
+    with as_source(path).open_binary() as f:
+        yield from _iter_camt053(f)
+
+
+def _iter_camt053(f: BinaryIO) -> Iterator[Camt053Row]:
+    stack = []
+    iban = ""
+
+    for event, elem in ElementTree.iterparse(f, events=("start", "end")):
+        if event == "start":
+            stack.append(elem)
+            continue
+
+        stack.pop()
+        tag = _local(elem.tag)
+
+        # Only the account of the statement, not the accounts of related parties.
+        if tag == "IBAN" and [_local(e.tag) for e in stack[-3:]] == [
+            "Stmt",
+            "Acct",
+            "Id",
+        ]:
+            iban = (elem.text or "").strip()
+        elif tag == "Ntry":
+            yield _camt053_row(elem, iban)
+            stack[-1].remove(elem)
+
+
+def extract_camt053(row: Camt053Row) -> Entry:
+    """Default :py:obj:`~roastery.importer.ExtractFn` for :py:func:`read_camt053`."""
+    digest = hashlib.md5(
+        f"{row['iban']}:{row['reference']}".encode("utf-8")
+        if row["reference"]
+        else str(row).encode("utf-8")
+    ).hexdigest()
+
+    meta = {"type": row["bank_transaction_code"]}
+    if row["counterparty_iban"]:
+        meta |= {"tegenrekening": row["counterparty_iban"]}
+    if row["reference"]:
+        meta |= {"reference": row["reference"]}
+
+    return Entry.from_row(
+        digest=digest,
+        date=parse_date(row["booking_date"]),
+        amount=Amount(D(row["amount"]), row["currency"]),
+        meta=meta,
+        asset_account="Assets:Bank",
+        original_payee=row["counterparty"],
+        original_narration=row["description"],
+    )
+
+
+class OfxRow(TypedDict):
+    """A transaction (``STMTTRN``) of an OFX statement, as read by :py:func:`read_ofx`.
+
+    Keys are the lower case OFX element names, such as ``trntype``, ``dtposted``,
+    ``trnamt``, ``fitid``, ``name``, and ``memo``. Elements that are not present in
+    the file are not present in the row. Two keys are added from the statement:
+    """
+
+    account_id: str
+    """``ACCTID`` of the account of the statement."""
+    currency: str
+    """``CURDEF`` of the statement."""
+
+
+_OFX_TAG = re.compile(r"<(/?)([A-Za-z0-9.]+)>([^<]*)")
+
+
+def _ofx_tags(f: TextIO, chunk_size: int = 1 << 16) -> Iterator[tuple[bool, str, str]]:
+    """Yield ``(is_closing, name, text)`` for every tag, reading ``f`` in chunks.
+
+    Entities in ``text``, such as ``&amp;`` or ``&#233;``, are unescaped.
+    """
+    buffer = ""
+    while chunk := f.read(chunk_size):
+        buffer += chunk
+        # Keep the last, possibly incomplete, tag in the buffer.
+        end = max(buffer.rfind("<"), 0)
+        for match in _OFX_TAG.finditer(buffer, 0, end):
+            closing, name, text = match.groups()
+            yield closing == "/", name.upper(), html.unescape(text.strip())
+        buffer = buffer[end:]
+
+    for match in _OFX_TAG.finditer(buffer):
+        closing, name, text = match.groups()
+        yield closing == "/", name.upper(), html.unescape(text.strip())
+
+
+def read_ofx(path: Path | Source) -> Iterator[OfxRow]:
+    """Stream the transactions of an OFX statement.
+
+    This reads both the SGML based OFX 1 format, where leaf elements have no closing
+    tag, and the XML based OFX 2 format. The file is read in chunks, and only the
+    current transaction is kept in memory.
+    """
+    account_id = ""
+    currency = ""
+    row = None
+
+    with as_source(path).open_binary() as binary:
+        f = io.TextIOWrapper(binary, encoding="utf-8", errors="replace")
+        for closing, name, text in _ofx_tags(f):
+            if name == "STMTTRN":
+                if closing:
+                    yield {"account_id": account_id, "currency": currency} | row
+                    row = None
+                else:
+                    row = {}
+            elif closing:
+                continue
+            elif row is not None and text:
+                row[name.lower()] = text
+            elif name == "ACCTID":
+                account_id = text
+            elif name == "CURDEF":
+                currency = text
+
+
+def extract_ofx(row: OfxRow) -> Entry:
+    """Default :py:obj:`~roastery.importer.ExtractFn` for :py:func:`read_ofx`."""
+    digest = hashlib.md5(
+        f"{row['account_id']}:{row['fitid']}".encode("utf-8")
+        if row.get("fitid")
+        else str(row).encode("utf-8")
+    ).hexdigest()
+
+    meta = {"type": row.get("trntype", "")}
+    if fitid := row.get("fitid"):
+        meta |= {"fitid": fitid}
+
+    return Entry.from_row(
+        digest=digest,
+        date=parse_ofx_date(row["dtposted"]),
+        amount=Amount(D(row["trnamt"].replace(",", ".")), row.get("currency") or "EUR"),
+        meta=meta,
+        asset_account="Assets:Bank",
+        original_payee=row.get("name") or row.get("payee", ""),
+        original_narration=row.get("memo", ""),
+    )
+
+
+def parse_ofx_date(val: str) -> datetime.date:
+    """Parse an OFX date such as ``20240528``, or ``20240528120000.000[-5:EST]``."""
+    return datetime.date(int(val[0:4]), int(val[4:6]), int(val[6:8]))
+
+
 def parse_date(val: str) -> datetime.date:
     try:
         return datetime.date.fromisoformat(val)
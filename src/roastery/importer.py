@@ -1,20 +1,46 @@
 from __future__ import annotations
 
+import copy
 import csv
 import dataclasses
 import datetime
+import itertools
 import json
 from pathlib import Path
-from typing import TypeVar, Callable, Generic, TypeAlias
-
+from typing import (
+    TYPE_CHECKING,
+    TypeVar,
+    Callable,
+    Generic,
+    TypeAlias,
+    Iterable,
+    Iterator,
+)
+
+from beancount import loader
 from beancount.core import data
-from beancount.parser import printer
+from beancount.core.number import MISSING
+from beancount.ops import validation
+from beancount.parser import booking, parser, printer
 
 from roastery.config import Config
 from roastery.edit import ManualEdits
+from roastery.sources import Source, as_source
+
+if TYPE_CHECKING:
+    from roastery.catalog import StatementInfo
 
 __all__ = [
     "import_csv",
+    "import_camt053",
+    "import_ofx",
+    "iter_entries",
+    "extract_csv",
+    "process_entries",
+    "write_entries",
+    "import_transactions",
+    "load_transactions",
+    "write_transactions",
     "CleanFn",
     "ExtractFn",
     "Entry",
@@ -143,6 +169,24 @@ class Entry(Generic[EntryMeta]):
       are highlighted in red in Fava.
     """
 
+    row: int | None = dataclasses.field(default=None, compare=False)
+    """
+    Position of the entry in its statement, starting at 1. This is set by the
+    importers, and is used by :py:mod:`roastery.locator`.
+    """
+
+    payee_template: str | None = dataclasses.field(default=None, compare=False)
+    """
+    Template of the original payee, with volatile tokens such as numbers masked, as
+    clustered by :py:class:`roastery.templates.TemplateStage`. ``None`` unless that
+    stage ran. Rules can match on this instead of on the exact payee.
+    """
+
+    narration_template: str | None = dataclasses.field(default=None, compare=False)
+    """
+    Template of the original narration. See :py:obj:`Entry.payee_template`.
+    """
+
     @classmethod
     def from_row(
         cls,
@@ -246,18 +290,260 @@ For example:
 
 
 ExtractFn: TypeAlias = Callable[[dict], Entry]
-"""Turns a row of CSV data into an :py:class:`Entry`."""
+"""Turns a row of CSV data into an :py:class:`Entry`.
+
+For other source formats, such as :py:func:`import_camt053`, a row is a dictionary
+with the fields of a single entry in the statement."""
+
+
+def iter_entries(
+    *,
+    csv_file: Path | Source,
+    config: Config,
+    extract: ExtractFn,
+    clean: CleanFn = None,
+    csv_args: dict[str, any] = None,
+) -> Iterator[Entry]:
+    """
+    Run the import pipeline on a CSV file and yield the resulting entries.
+
+    This is the part of :py:func:`import_csv` that does not touch the output file.
+    Entries are yielded one by one, so the CSV file is never fully loaded into memory.
+    The parameters are the same as for :py:func:`import_csv`.
+    """
+    from roastery import catalog
+
+    info = catalog.lookup(config, csv_file, extract=extract)
+    yield from _iter_entries(
+        csv_file=csv_file,
+        config=config,
+        extract=extract,
+        clean=clean,
+        csv_args=csv_args,
+        info=info,
+    )
+
+
+def _iter_entries(
+    *,
+    csv_file: Path | Source,
+    config: Config,
+    extract: ExtractFn,
+    clean: CleanFn,
+    csv_args: dict[str, any],
+    info: StatementInfo | None,
+) -> Iterator[Entry]:
+    """:py:func:`iter_entries`, with the catalog entry ``info`` already looked up."""
+    from roastery import catalog
+
+    if config.cache_entries:
+        from roastery import cache
+
+        extracted = cache.extract_cached(
+            csv_file=csv_file, config=config, extract=extract, csv_args=csv_args
+        )
+    else:
+        extracted = extract_csv(csv_file=csv_file, extract=extract, csv_args=csv_args)
+
+    cutoff = config.do_not_import_before
+    if info is None:
+        extracted = catalog.recording(config, csv_file, extracted, extract=extract)
+    elif info.order == "descending" and cutoff is not None:
+        # All remaining rows are before the cutoff.
+        extracted = itertools.takewhile(lambda e: e.date > cutoff, extracted)
+
+    yield from process_entries(extracted, config=config, clean=clean)
+
+
+def process_entries(
+    entries: Iterable[Entry], *, config: Config, clean: CleanFn = None
+) -> Iterator[Entry]:
+    """
+    Apply flags, :py:obj:`~roastery.config.Config.do_not_import_before`, manual edits,
+    and ``clean`` to extracted entries.
+
+    This is the part of the import pipeline that is the same for every source format.
+    Manual edits and flags are left out if
+    :py:obj:`~roastery.config.Config.overlay_edits` is set. With
+    :py:obj:`~roastery.config.Config.apply_rules`, the stored rules of
+    :py:mod:`roastery.synthesis` run after ``clean``.
+    """
+    manual_edits = {}
+    flags = {}
+
+    if not config.overlay_edits:
+        try:
+            manual_edits = json.loads(config.manual_edits_path.read_text())
+        except FileNotFoundError:
+            pass
+
+        try:
+            flags = json.loads(config.flags_path.read_text())
+        except FileNotFoundError:
+            pass
+
+    _clean = (lambda x: None) if clean is None else clean
+
+    rules = None
+    if config.apply_rules:
+        from roastery import synthesis
+
+        rules = synthesis.load_rules(config)
+
+    for entry in entries:
+        if entry.digest in flags:
+            entry.flag = "!"
+
+        if (config.do_not_import_before is not None) and (
+            entry.date <= config.do_not_import_before
+        ):
+            continue
+
+        entry.apply_manual_edits(manual_edits)
+        _clean(entry)
+        if rules is not None:
+            rules(entry)
+        yield entry
+
+
+def extract_csv(
+    *, csv_file: Path | Source, extract: ExtractFn, csv_args: dict[str, any] = None
+) -> Iterator[Entry]:
+    """Yield an :py:class:`Entry` for each row of ``csv_file``, as returned by ``extract``.
+
+    This is the first stage of :py:func:`iter_entries`: no manual edits, flags or
+    cleaning are applied yet.
+    """
+    _csv_args = {} if csv_args is None else csv_args
+
+    with as_source(csv_file).open() as f_csv:
+        reader = csv.DictReader(f_csv, **_csv_args)
+        yield from _numbered(extract(row) for row in reader)
+
+
+def _numbered(entries: Iterable[Entry]) -> Iterator[Entry]:
+    """Set :py:obj:`Entry.row` of ``entries``, in order."""
+    for n, entry in enumerate(entries, start=1):
+        entry.row = n
+        yield entry
+
+
+def import_transactions(
+    *,
+    csv_file: Path | Source,
+    config: Config,
+    extract: ExtractFn,
+    clean: CleanFn = None,
+    csv_args: dict[str, any] = None,
+) -> list[data.Transaction]:
+    """
+    Import a CSV file and return the Beancount transactions, without writing a file.
+
+    The transactions are the same ones that :py:func:`import_csv` would write. Pass them
+    to :py:func:`load_transactions` to book and validate them, and to
+    :py:func:`write_transactions` to write them to disk afterwards. The parameters are
+    the same as for :py:func:`import_csv`.
+    """
+    entries = iter_entries(
+        csv_file=csv_file,
+        config=config,
+        extract=extract,
+        clean=clean,
+        csv_args=csv_args,
+    )
+    return [entry.as_transaction() for entry in entries]
+
+
+def load_transactions(
+    transactions: Iterable[data.Transaction],
+    *,
+    options_map: dict = None,
+    auto_accounts: bool = True,
+) -> tuple[list[data.Directive], list, dict]:
+    """
+    Book and validate transactions in memory, as :py:func:`beancount.loader.load_file`
+    would do after parsing them.
+
+    :param transactions: Transactions to load. For example from :py:func:`import_transactions`.
+    :param options_map: Beancount options to use. Defaults to the options of an empty file.
+    :param auto_accounts: Open all accounts that are used, with the ``auto_accounts``
+      plugin. Otherwise, every posting to an account without ``open`` directive is an
+      error.
+    :return: The entries, the errors, and the options map. The same as
+      :py:func:`beancount.loader.load_file`.
+    """
+    if options_map is None:
+        _, _, options_map = parser.parse_string("")
+    # The display context is updated with the numbers of the transactions below;
+    # copy it so the options map of the caller is left alone.
+    options_map = copy.copy(options_map)
+    options_map["dcontext"] = copy.deepcopy(options_map["dcontext"])
+
+    if auto_accounts:
+        options_map["plugin"] = [
+            ("beancount.plugins.auto_accounts", None),
+            *options_map["plugin"],
+        ]
+
+    entries = []
+    for lineno, txn in enumerate(transactions, start=1):
+        postings = []
+        for posting in txn.postings:
+            if posting.units is None:
+                posting = posting._replace(units=MISSING)
+            else:
+                options_map["dcontext"].update(
+                    posting.units.number, posting.units.currency
+                )
+            postings.append(posting)
+
+        meta = data.new_metadata("<roastery>", lineno) | txn.meta
+        entries.append(txn._replace(meta=meta, postings=postings))
+
+    entries.sort(key=data.entry_sortkey)
+    entries, errors = booking.book(entries, options_map)
+    entries, errors = loader.run_transformations(entries, errors, options_map, None)
+    errors.extend(validation.validate(entries, options_map))
+    return entries, errors, options_map
+
+
+def write_transactions(
+    transactions: Iterable[data.Transaction],
+    beancount_file: Path,
+    *,
+    start: tuple[int, int] | None = None,
+) -> list[tuple[int, int]]:
+    """Write transactions to ``beancount_file``, replacing its contents.
+
+    :param start: Line number and byte offset to write at, to append to the file.
+      Anything after the offset is removed. By default, the file is replaced.
+    :return: For each transaction, the line number and byte offset in the file at
+      which it starts, followed by the position at the end of the file.
+    """
+    positions = []
+    line, offset = (1, 0) if start is None else start
+    with beancount_file.open(mode="wb" if start is None else "r+b") as f_journal:
+        f_journal.seek(offset)
+        f_journal.truncate()
+        for txn in transactions:
+            text = (printer.format_entry(txn) + "\n").encode("utf-8")
+            f_journal.write(text)
+            positions.append((line, offset))
+            line += text.count(b"\n")
+            offset += len(text)
+    positions.append((line, offset))
+    return positions
 
 
 def import_csv(
     *,
-    csv_file: Path,
+    csv_file: Path | Source,
     config: Config,
     extract: ExtractFn,
     beancount_file: Path = None,
     clean: CleanFn = None,
     csv_args: dict[str, any] = None,
-) -> None:
+) -> tuple[int, int]:
     """
     Import a CSV file and write a beancount file.
 
@@ -270,50 +556,221 @@ def import_csv(
 
     The resulting Beancount file is created in the same directory as the CSV file, but with
     the extension changed to ``.beancount``. So: ``statements/foo.csv`` -> ``statements/foo.beancount``
-    You can specify a different path with the ``beancount_file`` parameter.
+    You can specify a different path with the ``beancount_file`` parameter. See
+    :py:mod:`roastery.sources` for the names of files generated from archives.
 
     The transaction is flagged with ``"!"`` if the digest of the entry occurs in the JSON file
     at :obj:`roastery.config.Config.flags_path`.
 
-    :param csv_file: Path of the CSV file to import.
+    If :obj:`roastery.config.Config.cache_entries` is set, the extracted entries are
+    read from and stored in the cache of :py:mod:`roastery.cache`.
+
+    If :obj:`roastery.config.Config.export_columns` is set, the entries are also stored
+    for the reports in :py:mod:`roastery.report`.
+
+    If :obj:`roastery.config.Config.sort_entries` is set, the transactions are written
+    in order of date instead of in the order of the CSV file. See
+    :py:mod:`roastery.sorting`.
+
+    If :obj:`roastery.config.Config.index_digests` is set, the location of every
+    transaction is recorded in the index of :py:mod:`roastery.locator`.
+
+    The date range of the statement is recorded in the :py:mod:`roastery.catalog`.
+    Statements that end before :obj:`roastery.config.Config.do_not_import_before`
+    are not read again.
+
+    :param csv_file: Path of the CSV file to import, or a :py:class:`roastery.sources.Source`
+      to read it from a compressed file or an archive.
     :param config: Configuration to use.
     :param csv_args: Arguments to forward to :py:class:`csv.DictReader`. This is used to
       parse weird CSV dialects. For example: ``dict(delimiter=";", quotechar="|")``.
     :param extract: How to extract an :class:`Entry` from a row of CSV data. See :py:class:`~ExtractFn`.
     :param clean: User-implemented cleaning function. See :py:class:`~CleanFn`.
     :param beancount_file: Path of the beancount file to write to.
+    :return: The line number and byte offset at the end of the beancount file.
     """
     beancount_file = (
-        csv_file.with_suffix(".beancount") if beancount_file is None else beancount_file
+        as_source(csv_file).beancount_file()
+        if beancount_file is None
+        else beancount_file
+    )
+    from roastery import catalog
+
+    info = catalog.lookup(config, csv_file, extract=extract)
+    entries = _iter_entries(
+        csv_file=csv_file,
+        config=config,
+        extract=extract,
+        clean=clean,
+        csv_args=csv_args,
+        info=info,
+    )
+    cutoff = config.do_not_import_before
+    if info is not None and cutoff is not None:
+        if info.max_date is None or info.max_date <= cutoff:
+            # Every row is before the cutoff: don't read the statement at all.
+            entries = []
+
+    return write_entries(
+        entries, config=config, beancount_file=beancount_file, statement=csv_file
     )
-    try:
-        manual_edits = json.loads(config.manual_edits_path.read_text())
-    except FileNotFoundError:
-        manual_edits = {}
 
-    try:
-        flags = json.loads(config.flags_path.read_text())
-    except FileNotFoundError:
-        flags = {}
 
-    _csv_args = {} if csv_args is None else csv_args
-    _clean = (lambda x: None) if clean is None else clean
+def write_entries(
+    entries: Iterable[Entry],
+    *,
+    config: Config,
+    beancount_file: Path,
+    statement: Path | Source | None = None,
+    start: tuple[int, int] | None = None,
+) -> tuple[int, int]:
+    """Write processed entries to ``beancount_file``, as the last step of an import.
+
+    This also exports the entries for :py:mod:`roastery.report` if
+    :obj:`roastery.config.Config.export_columns` is set, checks their running balance
+    with :py:mod:`roastery.balances` if :obj:`roastery.config.Config.check_balances`
+    or :obj:`roastery.config.Config.assert_balances` is set, sorts them if
+    :obj:`roastery.config.Config.sort_entries` is set, and records where they are in
+    the :py:mod:`roastery.locator` index if
+    :obj:`roastery.config.Config.index_digests` is set.
+
+    :param statement: The statement the entries were imported from, for the index.
+    :param start: Append to ``beancount_file`` at this position, instead of replacing
+      it. See :py:func:`write_transactions`. The column export does not support this,
+      and no balance assertions are written, so they don't end up between the
+      transactions of one statement.
+    :return: The line number and byte offset at the end of the file.
+    """
+    if config.sort_entries:
+        from roastery import sorting
 
-    with csv_file.open() as f_csv, beancount_file.open(
-        mode="w", encoding="utf-8"
-    ) as f_journal:
-        reader = csv.DictReader(f_csv, **_csv_args)
-        for row in reader:
-            entry = extract(row)
+        entries = sorting.sort_entries(
+            entries,
+            memory_limit=config.sort_memory_limit,
+            spill_dir=config.state_dir / "sort",
+        )
+
+    columns = None
+    if config.export_columns:
+        from roastery import report
+
+        columns = report.ColumnBuilder()
+
+    assert_balances = config.assert_balances and start is None
+    balances = None
+    if config.check_balances or assert_balances:
+        from roastery.balances import BalanceChecker
 
-            if entry.digest in flags:
-                entry.flag = "!"
+        balances = BalanceChecker()
 
-            if (config.do_not_import_before is not None) and (
-                entry.date <= config.do_not_import_before
-            ):
-                continue
+    # Digest and row of each entry, in the order they are written.
+    written = []
 
-            entry.apply_manual_edits(manual_edits)
-            _clean(entry)
-            printer.print_entry(entry.as_transaction(), file=f_journal)
+    def transactions() -> Iterator[data.Directive]:
+        for entry in entries:
+            txn = entry.as_transaction()
+            if columns is not None:
+                columns.add(entry)
+            if balances is not None:
+                balances.add(entry)
+            if config.index_digests:
+                written.append((entry.digest, entry.row))
+            yield txn
+
+        if assert_balances:
+            yield from balances.assertions()
+
+    positions = write_transactions(transactions(), beancount_file, start=start)
+
+    if columns is not None:
+        columns.save(
+            report.columns_path(config, beancount_file),
+            statement=None if statement is None else as_source(statement).path,
+        )
+
+    if config.check_balances:
+        balances.warn(
+            beancount_file.name if statement is None else as_source(statement).name
+        )
+
+    if config.index_digests:
+        from roastery import locator
+
+        with locator.DigestIndex(config) as index:
+            index.update(
+                beancount_file=beancount_file,
+                statement=statement,
+                records=(
+                    (digest, row, line, offset)
+                    for (digest, row), (line, offset) in zip(written, positions)
+                ),
+                replace=start is None,
+            )
+
+    return positions[-1]
+
+
+def import_camt053(
+    *,
+    xml_file: Path | Source,
+    config: Config,
+    extract: ExtractFn = None,
+    beancount_file: Path = None,
+    clean: CleanFn = None,
+) -> None:
+    """
+    Import an ISO 20022 CAMT.053 bank statement and write a beancount file.
+
+    This works the same as :py:func:`import_csv`. The XML file is parsed incrementally,
+    so memory use does not depend on the size of the file. The rows that are passed to
+    ``extract`` are described in :py:func:`roastery.formats.read_camt053`.
+
+    :param xml_file: Path of the CAMT.053 file to import.
+    :param extract: How to extract an :class:`Entry` from an entry in the statement.
+      Defaults to :py:func:`roastery.formats.extract_camt053`.
+
+    See :py:func:`import_csv` for the other parameters.
+    """
+    from roastery import formats
+
+    _extract = formats.extract_camt053 if extract is None else extract
+    extracted = _numbered(_extract(row) for row in formats.read_camt053(xml_file))
+    write_entries(
+        process_entries(extracted, config=config, clean=clean),
+        config=config,
+        beancount_file=beancount_file or as_source(xml_file).beancount_file(),
+        statement=xml_file,
+    )
+
+
+def import_ofx(
+    *,
+    ofx_file: Path | Source,
+    config: Config,
+    extract: ExtractFn = None,
+    beancount_file: Path = None,
+    clean: CleanFn = None,
+) -> None:
+    """
+    Import an OFX statement and write a beancount file.
+
+    Both the SGML based OFX 1 and the XML based OFX 2 are supported. The file is read
+    incrementally, so memory use does not depend on the size of the file. The rows that
+    are passed to ``extract`` are described in :py:func:`roastery.formats.read_ofx`.
+
+    :param ofx_file: Path of the OFX file to import.
+    :param extract: How to extract an :class:`Entry` from a transaction in the statement.
+      Defaults to :py:func:`roastery.formats.extract_ofx`.
+
+    See :py:func:`import_csv` for the other parameters.
+    """
+    from roastery import formats
+
+    _extract = formats.extract_ofx if extract is None else extract
+    extracted = _numbered(_extract(row) for row in formats.read_ofx(ofx_file))
+    write_entries(
+        process_entries(extracted, config=config, clean=clean),
+        config=config,
+        beancount_file=beancount_file or as_source(ofx_file).beancount_file(),
+        statement=ofx_file,
+    )
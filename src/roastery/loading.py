@@ -0,0 +1,203 @@
+"""
+Load the journal, parsing the included files in parallel.
+
+:py:func:`beancount.loader.load_file` parses the main journal and every file it
+includes, one after the other, on a single core. With years of generated
+statement files, parsing takes most of the time it takes to load the journal,
+while most of those files never change.
+
+:py:func:`load_journal` is a drop-in replacement that:
+
+- Parses the included files in worker processes, one file per task.
+- Caches the parse result of each file under ``.roastery/parsed/``, together
+  with the hash of its contents. Files that did not change are not parsed again.
+- Merges the results in include order, and then books, runs the plugins, and
+  validates the entries in the main process, exactly as the beancount loader
+  does.
+
+The :py:mod:`edit <roastery.edit>`, ``query``, ``serve``, and ``check`` commands
+load the journal this way.
+
+With ``history=True``, the years archived with :py:mod:`roastery.archive` are
+loaded as well, instead of the opening balances that summarise them.
+
+API
+---
+
+.. autofunction:: load_journal
+"""
+
+import glob
+import hashlib
+import os
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from beancount import loader
+from beancount.core import data
+from beancount.parser import booking, parser
+from beancount.ops import validation
+
+from roastery import atomic
+from roastery.config import Config
+
+__all__ = [
+    "load_journal",
+]
+
+# Version of the cache format. Bump this when changing what is stored.
+_CACHE_VERSION = 1
+
+_Parsed = tuple[list[data.Directive], list, dict]
+
+
+def _parse(filename: str) -> _Parsed:
+    return parser.parse_file(filename)
+
+
+def _content_hash(filename: str) -> str:
+    with open(filename, "rb") as f:
+        return hashlib.file_digest(f, "blake2b").hexdigest()
+
+
+def _read_cache(path: Path, key: str) -> _Parsed | None:
+    try:
+        with path.open("rb") as f:
+            # The key is stored first, so a stale file is detected without loading
+            # the rest of it.
+            if pickle.load(f) != key:
+                return None
+            return pickle.load(f)
+    except (FileNotFoundError, pickle.UnpicklingError, EOFError):
+        return None
+
+
+def _write_cache(path: Path, key: str, parsed: _Parsed) -> None:
+    with atomic.replacing(path, "wb") as f:
+        pickle.dump(key, f, protocol=pickle.HIGHEST_PROTOCOL)
+        pickle.dump(parsed, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def _expand_includes(options_map: dict, filename: str) -> tuple[list[str], list]:
+    """Absolute paths of the files included by ``filename``."""
+    cwd = os.path.dirname(filename)
+    filenames, errors = [], []
+    for pattern in options_map["include"]:
+        # Not sorted: the order of entries on the same day must match beancount's.
+        matched = glob.glob(os.path.join(cwd, pattern), recursive=True)
+        if not matched:
+            errors.append(
+                loader.LoadError(
+                    data.new_metadata("<load>", 0),
+                    f'File glob "{pattern}" does not match any files',
+                    None,
+                )
+            )
+        filenames.extend(os.path.normpath(m) for m in matched)
+    return filenames, errors
+
+
+def _parse_all(
+    config: Config, filenames: list[str], workers: int | None
+) -> list[_Parsed]:
+    """Parse ``filenames``, using the cache and worker processes."""
+    results: list[_Parsed | None] = []
+    misses = []
+    for filename in filenames:
+        key = f"{_CACHE_VERSION}:{_content_hash(filename)}"
+        path = config.state_file("parsed", Path(filename), ".pickle")
+        results.append(_read_cache(path, key))
+        if results[-1] is None:
+            misses.append((len(results) - 1, filename, path, key))
+
+    if len(misses) > 1 and workers != 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            parsed = list(pool.map(_parse, [filename for _, filename, _, _ in misses]))
+    else:
+        parsed = [_parse(filename) for _, filename, _, _ in misses]
+
+    for (i, _, path, key), result in zip(misses, parsed):
+        results[i] = result
+        _write_cache(path, key, result)
+    return results
+
+
+def load_journal(
+    config: Config, *, workers: int | None = None, history: bool = False
+) -> tuple[list[data.Directive], list, dict]:
+    """Load :py:obj:`roastery.config.Config.journal_path`.
+
+    :param workers: Number of worker processes. Defaults to the number of CPUs. With
+      ``1``, files are parsed in the current process.
+    :param history: Also load the archived years. See :py:mod:`roastery.archive`.
+    :return: The entries, the errors, and the options map. The same as
+      :py:func:`beancount.loader.load_file`.
+    """
+    main = os.path.abspath(config.journal_path)
+    entries, errors, options_map = parser.parse_file(main)
+    errors = list(errors)
+    entries = list(entries)
+
+    seen = {main}
+    pending, include_errors = _expand_includes(options_map, main)
+    errors.extend(include_errors)
+
+    opening = None
+    if history:
+        from roastery import archive
+
+        opening = os.path.abspath(archive.opening_path(config))
+        pending.extend(
+            os.path.abspath(archive.archive_dir(config) / f"{year}.beancount")
+            for year in archive.archived_years(config)
+        )
+
+    # Included files can include files themselves: parse them level by level.
+    while pending:
+        filenames = []
+        for filename in pending:
+            if filename in seen:
+                errors.append(
+                    loader.LoadError(
+                        data.new_metadata("<load>", 0),
+                        f'Duplicate filename parsed: "{filename}"',
+                        None,
+                    )
+                )
+            elif not os.path.exists(filename):
+                errors.append(
+                    loader.LoadError(
+                        data.new_metadata("<load>", 0),
+                        f'File "{filename}" does not exist',
+                        None,
+                    )
+                )
+            else:
+                seen.add(filename)
+                filenames.append(filename)
+
+        pending = []
+        for filename, parsed in zip(filenames, _parse_all(config, filenames, workers)):
+            src_entries, src_errors, src_options_map = parsed
+            entries.extend(src_entries)
+            errors.extend(src_errors)
+            loader.aggregate_options_map(options_map, src_options_map)
+            nested, include_errors = _expand_includes(src_options_map, filename)
+            pending.extend(nested)
+            errors.extend(include_errors)
+
+    if opening is not None:
+        # The archived years replace the opening balances that summarise them.
+        entries = [entry for entry in entries if entry.meta.get("filename") != opening]
+
+    options_map["include"] = sorted(seen)
+    entries.sort(key=data.entry_sortkey)
+
+    entries, balance_errors = booking.book(entries, options_map)
+    errors.extend(balance_errors)
+    entries, errors = loader.run_transformations(entries, errors, options_map, None)
+    errors.extend(validation.validate(entries, options_map, None, None))
+    options_map["input_hash"] = loader.compute_input_hash(options_map["include"])
+
+    return entries, errors, options_map
@@ -0,0 +1,185 @@
+"""
+Find where a transaction came from, and where it ended up, by its digest.
+
+Digests show up in Fava, in ``flags.json``, and in the manual edits. When
+:py:obj:`roastery.config.Config.index_digests` is set, every import records the
+following for each transaction, in an SQLite database at
+``.roastery/digests.sqlite``:
+
+- The statement it was imported from, and its position in that statement.
+- The generated beancount file, and the line and byte offset of the transaction
+  in that file.
+
+Looking up a digest is a single primary key lookup, and reading the transaction
+is a single seek, so both are fast regardless of the size of the archive. The CLI
+has two commands on top of this:
+
+.. code-block::
+
+   $ ./cli.py show 31e42bdc9c1b2d7467ed6099b99baca7
+   $ ./cli.py open 31e42bdc9c1b2d7467ed6099b99baca7
+
+``show`` prints the locations, the manual edit and flag of the transaction, and
+the transaction itself. ``open`` opens the generated beancount file at the
+transaction in ``$EDITOR``.
+
+Re-importing a statement replaces all of its records. A beancount file that was
+changed by something other than Roastery is detected when reading a transaction.
+
+API
+---
+
+.. autoclass:: DigestIndex
+   :members:
+.. autoclass:: Location
+   :members:
+.. autofunction:: index_path
+"""
+
+import dataclasses
+import sqlite3
+from pathlib import Path
+from typing import Iterable
+
+from roastery.config import Config
+from roastery.sources import Source, as_source
+
+__all__ = [
+    "DigestIndex",
+    "Location",
+    "index_path",
+]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS locations (
+    digest TEXT PRIMARY KEY,
+    statement TEXT,
+    row INTEGER,
+    beancount_file TEXT NOT NULL,
+    line INTEGER NOT NULL,
+    offset INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS locations_beancount_file ON locations (beancount_file);
+"""
+
+
+def index_path(config: Config) -> Path:
+    """Path of the digest index."""
+    return config.state_dir / "digests.sqlite"
+
+
+@dataclasses.dataclass(frozen=True)
+class Location:
+    """Where a transaction came from, and where it was written to."""
+
+    digest: str
+
+    statement: str | None
+    """Name of the statement, see :py:obj:`roastery.sources.Source.name`. ``None``
+    if the importer didn't pass it."""
+
+    row: int | None
+    """Position of the transaction in the statement. See
+    :py:obj:`roastery.importer.Entry.row`."""
+
+    beancount_file: Path
+
+    line: int
+    """Line in :py:attr:`beancount_file` at which the transaction starts."""
+
+    offset: int
+    """Byte offset in :py:attr:`beancount_file` at which the transaction starts."""
+
+    def read_transaction(self) -> str | None:
+        """Text of the transaction in the beancount file.
+
+        :return: ``None`` if the file no longer contains the transaction at this
+          location.
+        """
+        lines = []
+        try:
+            with self.beancount_file.open("rb") as f:
+                f.seek(self.offset)
+                for line in f:
+                    if not line.strip():
+                        break
+                    lines.append(line.decode("utf-8"))
+        except FileNotFoundError:
+            return None
+
+        text = "".join(lines)
+        return text if f'"{self.digest}"' in text else None
+
+
+class DigestIndex:
+    """The persistent index of transaction locations.
+
+    Use as a context manager, to commit and close the database afterwards.
+    """
+
+    def __init__(self, config: Config) -> None:
+        path = index_path(config)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(path)
+        self.db.executescript(_SCHEMA)
+
+    def __enter__(self) -> "DigestIndex":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Commit pending changes and close the database."""
+        self.db.commit()
+        self.db.close()
+
+    def update(
+        self,
+        *,
+        beancount_file: Path,
+        statement: Path | Source | None,
+        records: Iterable[tuple[str, int | None, int, int]],
+        replace: bool = True,
+    ) -> None:
+        """Replace the records of ``beancount_file``.
+
+        :param records: Digest, row in the statement, line, and byte offset of each
+          transaction in the file.
+        :param replace: Remove the existing records of ``beancount_file`` first. Set
+          this to ``False`` when transactions were appended to the file.
+        """
+        file = str(beancount_file.resolve())
+        name = None if statement is None else as_source(statement).name
+        with self.db:
+            if replace:
+                self.db.execute(
+                    "DELETE FROM locations WHERE beancount_file = ?", (file,)
+                )
+            self.db.executemany(
+                "INSERT OR REPLACE INTO locations VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    (digest, name, row, file, line, offset)
+                    for digest, row, line, offset in records
+                ),
+            )
+
+    def lookup(self, digest: str) -> Location | None:
+        """Location of the transaction with ``digest``, if it is in the index."""
+        row = self.db.execute(
+            "SELECT statement, row, beancount_file, line, offset "
+            + "FROM locations WHERE digest = ?",
+            (digest,),
+        ).fetchone()
+        if row is None:
+            return None
+
+        statement, n, beancount_file, line, offset = row
+        return Location(
+            digest=digest,
+            statement=statement,
+            row=n,
+            beancount_file=Path(beancount_file),
+            line=line,
+            offset=offset,
+        )
@@ -0,0 +1,111 @@
+"""
+Beancount plugin that applies manual edits and flags when the ledger is loaded.
+
+Normally, manual edits from :py:mod:`roastery.edit` and flags only end up in the
+ledger when the statement they belong to is imported again. With this plugin,
+they are applied every time the journal is loaded instead, so they show up in
+Fava as soon as it reloads:
+
+.. code-block::
+
+   ; journal/main.beancount
+   plugin "roastery.plugin" "../.roastery"
+
+The configuration string is the directory that contains ``manual-edits.json``
+and ``flags.json``, relative to the main journal. It defaults to
+``../.roastery``, which matches :py:func:`roastery.config.Config.with_defaults`.
+
+For every transaction with a ``digest`` in its metadata, the plugin applies the
+same changes as :py:meth:`roastery.importer.Entry.apply_manual_edits`:
+
+- The payee and narration are replaced by the edited values.
+- The account of the last posting, which holds the counter-account in generated
+  files, is replaced by the edited account.
+- The tags and links are replaced by those of the edit. An edit without tags
+  removes the tags of the transaction, including tags that ``clean`` added.
+- Flagged transactions get the ``!`` flag.
+
+Both files are read into dictionaries, and the entries are updated in a single
+pass, with one lookup per transaction. The plugin lists both files in the
+:py:data:`STORES_OPTION` option, so :py:mod:`roastery.server` and the Fava
+extension in :py:mod:`roastery.classify` reload the journal when they change. They
+are not added to ``include``, which is meant for beancount files only.
+
+Set :py:obj:`roastery.config.Config.overlay_edits` to stop writing manual edits and
+flags into the generated files. They then only contain the original and cleaned
+data, and a new edit never requires importing a statement again.
+"""
+
+import json
+from pathlib import Path
+from typing import Any
+
+from beancount.core import data
+
+__all__ = [
+    "overlay_edits",
+    "STORES_OPTION",
+]
+
+__plugins__ = [
+    "overlay_edits",
+]
+
+STORES_OPTION = "roastery_stores"
+"""Key in the options map with the paths of the files that the plugin read."""
+
+
+def _read_json(path: Path, default: Any) -> Any:
+    try:
+        return json.loads(path.read_text())
+    except (ValueError, FileNotFoundError):
+        return default
+
+
+def _overlay(
+    txn: data.Transaction, edit: dict | None, flagged: bool
+) -> data.Transaction:
+    changes = {}
+    if flagged:
+        changes["flag"] = "!"
+
+    if edit:
+        if (payee := edit.get("payee")) is not None:
+            changes["payee"] = payee
+        if (narration := edit.get("narration")) is not None:
+            changes["narration"] = narration
+        if (account := edit.get("account")) is not None and txn.postings:
+            *rest, last = txn.postings
+            changes["postings"] = [*rest, last._replace(account=account)]
+        changes["tags"] = frozenset(edit.get("tags", ()))
+        changes["links"] = frozenset(edit.get("links", ()))
+
+    return txn._replace(**changes)
+
+
+def overlay_edits(
+    entries: list[data.Directive], options_map: dict, config: str | None = None
+) -> tuple[list[data.Directive], list]:
+    """Apply the manual edits and flags to ``entries``. See the module documentation."""
+    state_dir = Path(options_map["filename"]).parent / (config or "../.roastery")
+    manual_edits_path = state_dir / "manual-edits.json"
+    flags_path = state_dir / "flags.json"
+
+    options_map[STORES_OPTION] = [
+        str(p.resolve()) for p in (manual_edits_path, flags_path)
+    ]
+
+    manual_edits = _read_json(manual_edits_path, {})
+    flags = set(_read_json(flags_path, []))
+    if not manual_edits and not flags:
+        return entries, []
+
+    result = []
+    for entry in entries:
+        if isinstance(entry, data.Transaction):
+            digest = entry.meta.get("digest")
+            edit = manual_edits.get(digest)
+            if edit is not None or digest in flags:
+                entry = _overlay(entry, edit, digest in flags)
+        result.append(entry)
+    return result, []
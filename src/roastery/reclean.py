@@ -0,0 +1,317 @@
+"""
+Re-run cleaning rules incrementally, and preview the effect of a rule change.
+
+Changing a single rule normally means re-running every import and then looking at
+``git diff`` of the generated files. :py:func:`reclean` does this faster, and shows
+the changes before anything is written:
+
+.. code-block:: python
+
+   from roastery.reclean import reclean
+
+   rules = [rule_payees, rule_groceries, rule_rent]
+   diff = reclean(csv_file=..., config=config, extract=extract_asn, rules=rules)
+   diff.print()
+
+   # Happy with the result? Write the beancount file.
+   reclean(csv_file=..., config=config, extract=extract_asn, rules=rules, write=True)
+
+For every entry, Roastery caches the input of the rules, and the state of the entry
+after each rule that changed it. The cache is stored under ``.roastery/reclean/``,
+and is keyed by the :py:func:`roastery.rules.rule_fingerprint` of every rule.
+
+On the next run, only the rules that changed are evaluated, starting from the
+cached state before that rule. The remaining rules only run for entries where a
+changed rule produced a different result. Entries with changed input, for example
+because of a new manual edit, are cleaned from scratch.
+
+Rules should only depend on the entry they are given. Rules can change the cleaned
+values, tags, links, flag, and metadata of the entry. The fingerprint covers the
+module that defines a rule, the helpers and globals it refers to, and an optional
+``version`` attribute. Bump ``version`` when a rule depends on anything else, such
+as a file it reads, to make sure it runs again.
+
+API
+---
+
+.. autofunction:: reclean
+.. autoclass:: CleanDiff
+   :members:
+.. autoclass:: FieldChange
+   :members:
+"""
+
+import dataclasses
+import hashlib
+import pickle
+from pathlib import Path
+from typing import Any
+
+from roastery import atomic, term
+from roastery.config import Config
+from roastery.importer import (
+    CleanFn,
+    Digest,
+    Entry,
+    ExtractFn,
+    iter_entries,
+    write_entries,
+)
+from roastery.rules import rule_fingerprint
+from roastery.sources import Source, as_source
+
+__all__ = [
+    "reclean",
+    "CleanDiff",
+    "FieldChange",
+]
+
+_FIELDS = ("account", "payee", "narration")
+
+# Version of the cache format. Bump this when changing what is stored.
+_CACHE_VERSION = 1
+
+_State = tuple
+"""State of an entry that rules can change. See :py:func:`_get_state`."""
+
+_Snapshots = list[tuple[int, _State]]
+"""State of an entry after each rule that changed it, by rule index. Index ``-1``
+holds the state before the first rule."""
+
+
+@dataclasses.dataclass(frozen=True)
+class FieldChange:
+    """A field of an entry that has a different value after re-cleaning."""
+
+    digest: Digest
+    field: str
+    """One of ``account``, ``payee``, or ``narration``."""
+    old: str | None
+    new: str | None
+
+
+@dataclasses.dataclass
+class CleanDiff:
+    """Result of :py:func:`reclean`."""
+
+    changes: list[FieldChange] = dataclasses.field(default_factory=list)
+    """Changed fields of entries that were cleaned before."""
+
+    added: list[Digest] = dataclasses.field(default_factory=list)
+    """Entries that were not cleaned before."""
+
+    removed: list[Digest] = dataclasses.field(default_factory=list)
+    """Entries that were cleaned before, but are no longer imported."""
+
+    evaluated: int = 0
+    """Number of entries that at least one rule was evaluated for."""
+
+    def print(self) -> None:
+        """Print the changes to the terminal."""
+        for change in self.changes:
+            term.log(
+                f"[bold]{change.digest}[/bold] {change.field}",
+                f"[red]- {change.old}[/red]",
+                f"[green]+ {change.new}[/green]",
+                style="bold blue",
+            )
+        term.info(
+            f"{len({c.digest for c in self.changes})} changed, {len(self.added)} added, "
+            + f"{len(self.removed)} removed. Rules ran for {self.evaluated} entries."
+        )
+
+
+def _get_state(entry: Entry) -> _State:
+    return (
+        *(getattr(entry, field).cleaned for field in _FIELDS),
+        frozenset(entry.tags),
+        frozenset(entry.links),
+        entry.flag,
+        tuple(entry.meta.items()),
+    )
+
+
+def _set_state(entry: Entry, state: _State) -> None:
+    *cleaned, tags, links, flag, meta = state
+    for field, val in zip(_FIELDS, cleaned):
+        getattr(entry, field).cleaned = val
+    entry.tags = set(tags)
+    entry.links = set(links)
+    entry.flag = flag
+    entry.meta = dict(meta)
+
+
+def _input_key(entry: Entry) -> str:
+    key = (
+        entry.date,
+        entry.amount,
+        entry.asset_account,
+        *(dataclasses.astuple(getattr(entry, field)) for field in _FIELDS),
+        sorted(entry.tags),
+        sorted(entry.links),
+        entry.flag,
+        sorted(entry.meta.items()),
+    )
+    return hashlib.md5(repr(key).encode("utf-8")).hexdigest()
+
+
+def _state_after(snapshots: _Snapshots, index: int) -> _State:
+    state = snapshots[0][1]
+    for i, snapshot in snapshots:
+        if i > index:
+            break
+        state = snapshot
+    return state
+
+
+def _values(
+    entry: Entry, state: _State, learned: CleanFn | None
+) -> tuple[str | None, ...]:
+    """The values of ``entry`` in ``state``, after the learned rules if given."""
+    _set_state(entry, state)
+    if learned is not None:
+        learned(entry)
+    return tuple(getattr(entry, field).value for field in _FIELDS)
+
+
+def _changed_rules(old: list[str], new: list[str]) -> list[bool]:
+    if len(old) == len(new):
+        return [a != b for a, b in zip(old, new)]
+
+    first = next((i for i, (a, b) in enumerate(zip(old, new)) if a != b), None)
+    first = min(len(old), len(new)) if first is None else first
+    return [i >= first for i in range(len(new))]
+
+
+def _clean(
+    entry: Entry,
+    rules: list[CleanFn],
+    changed: list[bool],
+    cached: _Snapshots | None,
+) -> tuple[_Snapshots, bool]:
+    """Run the rules that need to run, returning the new snapshots and whether any rule ran."""
+    state = _get_state(entry)
+    snapshots = [(-1, state)]
+    diverged = cached is None
+    ran = False
+
+    for i, rule in enumerate(rules):
+        if not diverged and not changed[i]:
+            # The rule didn't change and neither did its input, so we know its output.
+            after = _state_after(cached, i)
+        else:
+            _set_state(entry, state)
+            rule(entry)
+            after = _get_state(entry)
+            ran = True
+            if not diverged and after != _state_after(cached, i):
+                diverged = True
+
+        if after != state:
+            snapshots.append((i, after))
+            state = after
+
+    _set_state(entry, state)
+    return snapshots, ran
+
+
+def _load_cache(path: Path, fingerprints: list[str]) -> dict[str, Any]:
+    try:
+        with path.open("rb") as f:
+            cache = pickle.load(f)
+    except (FileNotFoundError, pickle.UnpicklingError, EOFError):
+        return {"version": _CACHE_VERSION, "rules": fingerprints, "entries": {}}
+
+    if cache.get("version") != _CACHE_VERSION:
+        return {"version": _CACHE_VERSION, "rules": fingerprints, "entries": {}}
+    return cache
+
+
+def reclean(
+    *,
+    csv_file: Path | Source,
+    config: Config,
+    extract: ExtractFn,
+    rules: list[CleanFn],
+    beancount_file: Path = None,
+    csv_args: dict[str, any] = None,
+    write: bool = False,
+) -> CleanDiff:
+    """
+    Clean the entries of ``csv_file`` with ``rules``, only evaluating what changed.
+
+    This behaves as :py:func:`roastery.importer.import_csv` with a ``clean`` function
+    that calls each of the ``rules`` in order.
+
+    With :py:obj:`roastery.config.Config.apply_rules`, the stored rules of
+    :py:mod:`roastery.synthesis` run after ``rules``, as they do in an import.
+
+    :param rules: Cleaning rules, which are run in order.
+    :param write: Write the beancount file and update the cache. Without this,
+      neither is changed. Reading the statement still records it in the
+      :py:mod:`roastery.catalog`, and in the entry cache if
+      :py:obj:`roastery.config.Config.cache_entries` is set.
+    :return: The changes compared to the previous run with ``write=True``.
+
+    See :py:func:`roastery.importer.import_csv` for the other parameters.
+    """
+    beancount_file = (
+        as_source(csv_file).beancount_file()
+        if beancount_file is None
+        else beancount_file
+    )
+    cache_path = config.state_file("reclean", beancount_file, ".pickle")
+    fingerprints = [rule_fingerprint(rule) for rule in rules]
+    cache = _load_cache(cache_path, fingerprints)
+    changed = _changed_rules(cache["rules"], fingerprints)
+
+    learned = None
+    if config.apply_rules:
+        from roastery import synthesis
+
+        learned = synthesis.load_rules(config)
+
+    diff = CleanDiff()
+    new_cache = {"version": _CACHE_VERSION, "rules": fingerprints, "entries": {}}
+    entries = []
+
+    # The learned rules run after the cleaning rules, below.
+    import_config = dataclasses.replace(config, apply_rules=False)
+    for entry in iter_entries(
+        csv_file=csv_file, config=import_config, extract=extract, csv_args=csv_args
+    ):
+        key = _input_key(entry)
+        prev_key, prev_snapshots = cache["entries"].get(entry.digest, (None, None))
+        cached = prev_snapshots if prev_key == key else None
+
+        if cached is not None and not any(changed):
+            snapshots, ran = cached, False
+            _set_state(entry, snapshots[-1][1])
+        else:
+            snapshots, ran = _clean(entry, rules, changed, cached)
+
+        diff.evaluated += ran
+        new_cache["entries"][entry.digest] = (key, snapshots)
+        entries.append(entry)
+
+        if prev_snapshots is None:
+            _values(entry, snapshots[-1][1], learned)
+            diff.added.append(entry.digest)
+            continue
+
+        old_values = _values(entry, prev_snapshots[-1][1], learned)
+        new_values = _values(entry, snapshots[-1][1], learned)
+        for field, old, new in zip(_FIELDS, old_values, new_values):
+            if old != new:
+                diff.changes.append(FieldChange(entry.digest, field, old, new))
+
+    diff.removed = [d for d in cache["entries"] if d not in new_cache["entries"]]
+
+    if write:
+        write_entries(
+            entries, config=config, beancount_file=beancount_file, statement=csv_file
+        )
+        with atomic.replacing(cache_path, "wb") as f:
+            pickle.dump(new_cache, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    return diff
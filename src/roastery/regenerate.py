@@ -0,0 +1,106 @@
+"""
+Regenerate only the beancount files that an edit session affected.
+
+Every manual edit and flag is recorded in ``.roastery/changed.json``. After an
+edit session, :py:func:`regenerate` looks up the statement of each changed
+digest in the :py:mod:`roastery.locator` index, and imports only those
+statements again. Classifying twenty transactions then rewrites a couple of
+files instead of every generated file.
+
+.. code-block:: python
+
+   from roastery.registry import default_registry
+   from roastery.regenerate import regenerate
+
+   regenerate(config, default_registry(config), clean=clean)
+
+Statements are imported with the format that the
+:py:class:`~roastery.registry.FormatRegistry` detects for them, so this requires
+:py:obj:`roastery.config.Config.index_digests`, and a registry that knows the
+formats of your statements. Pass the registry to
+:py:func:`roastery.cli.make_cli` to regenerate automatically when an ``edit``
+session ends, and to enable the ``regenerate`` command.
+
+Digests that cannot be regenerated stay in ``changed.json`` and are reported.
+
+With the :py:mod:`roastery.plugin`, edits and flags are applied when the journal
+is loaded, so nothing needs to be regenerated.
+
+API
+---
+
+.. autofunction:: regenerate
+"""
+
+from collections import defaultdict
+from pathlib import Path
+
+from roastery import edit, term
+from roastery.config import Config
+from roastery.importer import CleanFn, import_csv
+from roastery.locator import DigestIndex, index_path
+from roastery.registry import FormatRegistry
+from roastery.sources import source_from_name
+
+__all__ = [
+    "regenerate",
+]
+
+
+def regenerate(
+    config: Config, registry: FormatRegistry, *, clean: CleanFn = None
+) -> list[Path]:
+    """Import the statements that contain changed transactions again.
+
+    :param registry: Used to detect the format of the statements.
+    :param clean: See :py:func:`roastery.importer.import_csv`.
+    :return: The beancount files that were regenerated.
+    """
+    changed = edit.read_changed(config)
+    if not changed:
+        return []
+    if config.overlay_edits:
+        # The plugin applies edits at load time: the generated files are up to date.
+        edit.write_changed(config, [])
+        return []
+    if not index_path(config).exists():
+        term.error("Cannot regenerate without a digest index")
+        term.hint("Set `Config.index_digests` and import your statements again")
+        return []
+
+    statements = defaultdict(set)
+    remaining = set()
+    with DigestIndex(config) as index:
+        for digest in changed:
+            location = index.lookup(digest)
+            if location is None or location.statement is None:
+                remaining.add(digest)
+            else:
+                key = (location.statement, location.beancount_file)
+                statements[key].add(digest)
+
+    regenerated = []
+    for (name, beancount_file), digests in sorted(statements.items()):
+        source = source_from_name(name)
+        fmt = registry.detect(source) if source.path.exists() else None
+        if fmt is None:
+            term.warn(f"Cannot regenerate {beancount_file}: unknown statement {name}")
+            remaining |= digests
+            continue
+
+        import_csv(
+            csv_file=source,
+            config=config,
+            extract=fmt.extract,
+            clean=clean,
+            csv_args=fmt.reader_args,
+            beancount_file=beancount_file,
+        )
+        regenerated.append(beancount_file)
+
+    if remaining:
+        term.warn(
+            f"{len(remaining)} changed transaction(s) are not in the digest index"
+        )
+    edit.write_changed(config, remaining)
+    return regenerated
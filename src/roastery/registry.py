@@ -0,0 +1,311 @@
+"""
+Detect the format of a statement from its header, and import it accordingly.
+
+Every bank has its own CSV dialect, columns, and ``extract`` function. A
+:py:class:`FormatRegistry` holds a :py:class:`CsvFormat` for each of them, so
+statements can be imported without saying which format each file is in:
+
+.. code-block:: python
+
+   from roastery.registry import CsvFormat, default_registry
+
+   registry = default_registry(config)
+   registry.register(
+       CsvFormat(
+           name="mybank",
+           extract=extract_mybank,
+           columns=("Date", "Description", "Amount", "Balance"),
+           csv_args=dict(delimiter=";"),
+       )
+   )
+   registry.import_statements(config.statements_dir, clean=clean)
+
+Only the first :py:data:`SNIFF_BYTES` of a statement are read to detect its format:
+
+1. The first line is split with the dialect of every registered format. The hash
+   of the resulting header is looked up in a table of the headers of all formats.
+   This finds the format of almost every statement with one lookup per dialect.
+2. If no header matches exactly, for example because the bank added a column,
+   every format gets a score for how well it matches the first line. The format
+   with the highest score wins, if it scores at least :py:data:`MIN_SCORE`.
+
+Formats without a header row set ``has_header=False``. They can only be detected
+by scoring, which checks that the number of columns matches, and that the
+``extract`` function of the format accepts the first row.
+
+The decision is stored in ``.roastery/formats.jsonl``, keyed by the hash of the
+sniffed bytes and of the definitions of the registered formats, so it is made only
+once per file. Since the decision only depends on those, the whole file never needs
+to be read or hashed. Changing the columns, the CSV arguments, or the ``extract``
+function of a format makes a new decision, even if the name stays the same. New
+decisions are appended to the file, which is never rewritten.
+
+API
+---
+
+.. autofunction:: default_registry
+.. autoclass:: FormatRegistry
+   :members:
+.. autoclass:: CsvFormat
+   :members:
+"""
+
+import csv
+import dataclasses
+import datetime
+import hashlib
+import io
+import json
+from pathlib import Path
+from typing import Any
+
+from roastery import catalog, term
+from roastery.rules import rule_fingerprint, rule_name
+from roastery.config import Config
+from roastery.importer import CleanFn, ExtractFn, import_csv
+from roastery.sources import Source, as_source, iter_sources
+
+__all__ = [
+    "CsvFormat",
+    "FormatRegistry",
+    "default_registry",
+]
+
+SNIFF_BYTES = 4096
+"""Number of bytes read from the start of a statement to detect its format."""
+
+MIN_SCORE = 0.6
+"""Minimum score of a format that was not detected by its exact header."""
+
+
+@dataclasses.dataclass(frozen=True)
+class CsvFormat:
+    """A CSV statement format."""
+
+    name: str
+    """Unique name of the format."""
+
+    extract: ExtractFn
+
+    columns: tuple[str, ...]
+    """The column names, in order. For formats with a header, this is the header
+    that identifies the format."""
+
+    csv_args: dict[str, Any] = dataclasses.field(default_factory=dict, hash=False)
+    """Arguments for :py:class:`csv.DictReader`, such as the ``delimiter``. For formats
+    without a header, ``fieldnames`` is set to :py:attr:`columns` automatically."""
+
+    has_header: bool = True
+    """Whether the first row of a statement is the header."""
+
+    @property
+    def dialect(self) -> tuple[str, str]:
+        """The delimiter and quote character."""
+        return self.csv_args.get("delimiter", ","), self.csv_args.get("quotechar", '"')
+
+    @property
+    def reader_args(self) -> dict[str, Any]:
+        """The arguments to pass to :py:func:`roastery.importer.import_csv`."""
+        if self.has_header:
+            return self.csv_args
+        return {"fieldnames": list(self.columns)} | self.csv_args
+
+
+def _first_row(sample: str, dialect: tuple[str, str]) -> tuple[str, ...]:
+    delimiter, quotechar = dialect
+    reader = csv.reader(io.StringIO(sample), delimiter=delimiter, quotechar=quotechar)
+    try:
+        return tuple(cell.strip() for cell in next(reader))
+    except (StopIteration, csv.Error):
+        return ()
+
+
+def _header_hash(dialect: tuple[str, str], header: tuple[str, ...]) -> str:
+    return hashlib.md5(repr((dialect, header)).encode("utf-8")).hexdigest()
+
+
+def _definition_hash(fmt: CsvFormat) -> str:
+    definition = (
+        fmt.name,
+        fmt.columns,
+        sorted(fmt.csv_args.items()),
+        fmt.has_header,
+        rule_name(fmt.extract),
+        rule_fingerprint(fmt.extract),
+    )
+    return hashlib.md5(repr(definition).encode("utf-8")).hexdigest()
+
+
+def _score(fmt: CsvFormat, row: tuple[str, ...]) -> float:
+    if not row:
+        return 0.0
+    if not fmt.has_header:
+        # A headerless file has no names to compare. A matching width is only a
+        # hint, below MIN_SCORE: the first row must also extract without errors.
+        if len(row) != len(fmt.columns):
+            return 0.0
+        try:
+            fmt.extract(dict(zip(fmt.columns, row)))
+        except Exception:
+            return 0.5
+        return 1.0
+
+    expected = set(fmt.columns)
+    return len(expected & set(row)) / len(expected | set(row))
+
+
+class FormatRegistry:
+    """The known statement formats.
+
+    :param config: Used for the location of the cache of decisions.
+    :param formats: Formats to :py:meth:`register` right away.
+    """
+
+    def __init__(self, config: Config, formats: list[CsvFormat] = ()) -> None:
+        self.config = config
+        self.formats: dict[str, CsvFormat] = {}
+        self._by_header: dict[str, CsvFormat] = {}
+        self._definitions: dict[str, str] = {}
+        self._decisions: dict[str, str | None] | None = None
+        for fmt in formats:
+            self.register(fmt)
+
+    @property
+    def cache_path(self) -> Path:
+        """File that stores the detected format per sniffed sample, one JSON object
+        per line."""
+        return self.config.state_dir / "formats.jsonl"
+
+    def register(self, fmt: CsvFormat) -> None:
+        """Add a format. A format with the same name is replaced."""
+        self.formats[fmt.name] = fmt
+        self._definitions[fmt.name] = _definition_hash(fmt)
+        self._by_header = {
+            _header_hash(f.dialect, f.columns): f
+            for f in self.formats.values()
+            if f.has_header
+        }
+
+    def _sniff(self, source: Source) -> str:
+        with source.open_binary() as f:
+            sample = f.read(SNIFF_BYTES)
+        return sample.decode("utf-8-sig", errors="replace")
+
+    def _decide(self, sample: str) -> CsvFormat | None:
+        rows = {}
+        for dialect in {fmt.dialect for fmt in self.formats.values()}:
+            rows[dialect] = row = _first_row(sample, dialect)
+            if fmt := self._by_header.get(_header_hash(dialect, row)):
+                return fmt
+
+        scores = [
+            (_score(fmt, rows[fmt.dialect]), fmt) for fmt in self.formats.values()
+        ]
+        best_score, best = max(scores, key=lambda s: s[0], default=(0.0, None))
+        return best if best_score >= MIN_SCORE else None
+
+    def _read_decisions(self) -> dict[str, str | None]:
+        decisions = {}
+        try:
+            lines = self.cache_path.read_text().splitlines()
+        except FileNotFoundError:
+            return decisions
+        for line in lines:
+            # A line can be cut off if a write was interrupted.
+            try:
+                decision = json.loads(line)
+                decisions[decision["key"]] = decision["format"]
+            except (ValueError, KeyError, TypeError):
+                continue
+        return decisions
+
+    def detect(self, csv_file: Path | Source) -> CsvFormat | None:
+        """The format of ``csv_file``, or ``None`` if no format matches."""
+        sample = self._sniff(as_source(csv_file))
+        definitions = [self._definitions[name] for name in sorted(self.formats)]
+        key = hashlib.blake2b(
+            "\0".join([sample, *definitions]).encode("utf-8")
+        ).hexdigest()
+
+        if self._decisions is None:
+            self._decisions = self._read_decisions()
+
+        if key in self._decisions and (
+            (name := self._decisions[key]) is None or name in self.formats
+        ):
+            return None if name is None else self.formats[name]
+
+        fmt = self._decide(sample)
+        self._decisions[key] = name = None if fmt is None else fmt.name
+        self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+        with self.cache_path.open("a") as f:
+            f.write(json.dumps({"key": key, "format": name}) + "\n")
+        return fmt
+
+    def import_statements(
+        self,
+        path: Path,
+        *,
+        clean: CleanFn = None,
+        pattern: str = "*.csv",
+        start: datetime.date | None = None,
+        end: datetime.date | None = None,
+    ) -> dict[Source, CsvFormat | None]:
+        """Import every statement in ``path`` with the format that was detected.
+
+        Statements that don't match any format are skipped with a warning.
+
+        :param path: See :py:func:`roastery.sources.iter_sources`.
+        :param clean: See :py:func:`roastery.importer.import_csv`.
+        :param pattern: See :py:func:`roastery.sources.iter_sources`.
+        :param start: Skip statements that the :py:mod:`roastery.catalog` knows end
+          before this date.
+        :param end: Skip statements that the :py:mod:`roastery.catalog` knows start
+          after this date.
+        :return: The detected format of each statement that was not skipped.
+        """
+        detected = {}
+        for source in iter_sources(path, pattern=pattern):
+            fmt = self.detect(source)
+            if fmt is not None and (start is not None or end is not None):
+                info = catalog.lookup(self.config, source, extract=fmt.extract)
+                if info is not None and not catalog.overlaps(info, start, end):
+                    continue
+
+            detected[source] = fmt
+            if fmt is None:
+                term.warn(f"Skipping {source.name}: unknown statement format")
+                continue
+
+            import_csv(
+                csv_file=source,
+                config=self.config,
+                extract=fmt.extract,
+                clean=clean,
+                csv_args=fmt.reader_args,
+            )
+        return detected
+
+
+def default_registry(config: Config) -> FormatRegistry:
+    """A registry with the formats in :py:mod:`roastery.formats`."""
+    from roastery import formats
+
+    return FormatRegistry(
+        config,
+        [
+            CsvFormat(
+                name="demo",
+                extract=formats.extract_demo,
+                columns=tuple(formats.DemoCsvRow.__annotations__),
+                csv_args=dict(delimiter=";"),
+            ),
+            CsvFormat(
+                name="asn",
+                extract=formats.extract_asn,
+                columns=tuple(formats.AsnCsvRow.__annotations__),
+                csv_args=dict(delimiter=",", quotechar="'"),
+                has_header=False,
+            ),
+        ],
+    )
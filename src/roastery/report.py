@@ -0,0 +1,312 @@
+"""
+Columnar export of imported entries, and fast reports on top of it.
+
+When :py:obj:`roastery.config.Config.export_columns` is set,
+:py:func:`roastery.importer.import_csv` also stores the imported entries as NumPy
+arrays under ``.roastery/columns/``, one file per generated beancount file. Each
+import only replaces the file of the statement it imported. The file of a statement
+that was deleted is removed the next time the columns are read.
+
+Reports read these arrays instead of loading the journal with beancount. Grouping
+is done with vectorised NumPy operations, so reports over many years of data
+are fast.
+
+This module requires NumPy. Install it with ``pip install roastery[report]``.
+
+Columns
+-------
+
+``date``
+  Booking date, as ``datetime64[D]``.
+``amount``
+  Amount of the asset posting, in units of ``10**-4``, as ``int64``. Sums are
+  exact, as with :py:mod:`roastery.balances`.
+``digest``
+  :py:obj:`roastery.importer.Entry.digest`, as fixed-width bytes.
+``account``, ``asset_account``, ``payee``, ``currency``
+  Dictionary encoded. The column holds ``int32`` codes into an array of unique
+  strings, stored next to it as ``<name>_values``.
+
+API
+---
+
+.. autofunction:: columns_path
+.. autofunction:: read_columns
+.. autofunction:: monthly_totals
+.. autofunction:: top_payees
+.. autofunction:: print_report
+.. autoclass:: Columns
+   :members:
+.. autoclass:: ColumnBuilder
+   :members:
+"""
+
+from __future__ import annotations
+
+import dataclasses
+import datetime
+from decimal import Decimal
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+import numpy as np
+from rich import print as rprint
+from rich.table import Table
+
+from roastery import atomic
+from roastery.balances import scaled, unscaled
+from roastery.config import Config
+
+if TYPE_CHECKING:
+    from roastery.importer import Entry
+
+__all__ = [
+    "Columns",
+    "ColumnBuilder",
+    "columns_path",
+    "read_columns",
+    "monthly_totals",
+    "top_payees",
+    "print_report",
+]
+
+_ENCODED = ("account", "asset_account", "payee", "currency")
+
+
+def _columns_dir(config: Config) -> Path:
+    return config.state_dir / "columns"
+
+
+def columns_path(config: Config, beancount_file: Path) -> Path:
+    """File to store the columns of the entries in ``beancount_file``."""
+    return config.state_file("columns", beancount_file, ".npz")
+
+
+@dataclasses.dataclass
+class Columns:
+    """Entries as columns. See the module documentation for the layout."""
+
+    date: np.ndarray
+    amount: np.ndarray
+    digest: np.ndarray
+    codes: dict[str, np.ndarray]
+    values: dict[str, np.ndarray]
+
+    def __len__(self) -> int:
+        return len(self.date)
+
+    def decode(self, name: str) -> np.ndarray:
+        """The strings of dictionary encoded column ``name``."""
+        return self.values[name][self.codes[name]]
+
+    def where(self, mask: np.ndarray) -> Columns:
+        """Only the rows where ``mask`` is ``True``."""
+        return Columns(
+            date=self.date[mask],
+            amount=self.amount[mask],
+            digest=self.digest[mask],
+            codes={name: codes[mask] for name, codes in self.codes.items()},
+            values=self.values,
+        )
+
+
+class ColumnBuilder:
+    """Collects entries during an import and writes them as columns."""
+
+    def __init__(self) -> None:
+        self._date: list[datetime.date] = []
+        self._amount: list[int] = []
+        self._digest: list[str] = []
+        self._codes: dict[str, list[int]] = {name: [] for name in _ENCODED}
+        self._values: dict[str, dict[str, int]] = {name: {} for name in _ENCODED}
+
+    def _encode(self, name: str, val: str | None) -> None:
+        values = self._values[name]
+        self._codes[name].append(values.setdefault(val or "", len(values)))
+
+    def add(self, entry: Entry) -> None:
+        """Add an entry. Call this after :py:meth:`roastery.importer.Entry.as_transaction`,
+        which fills in the default account."""
+        self._date.append(entry.date)
+        self._amount.append(scaled(entry.amount.number))
+        self._digest.append(entry.digest)
+        self._encode("account", entry.account.value)
+        self._encode("asset_account", entry.asset_account)
+        self._encode("payee", entry.payee.value)
+        self._encode("currency", entry.amount.currency)
+
+    def build(self) -> Columns:
+        """The columns of all entries added so far."""
+        return Columns(
+            date=np.array(self._date, dtype="datetime64[D]"),
+            amount=np.array(self._amount, dtype=np.int64),
+            digest=np.array(self._digest, dtype="S32"),
+            codes={
+                name: np.array(codes, dtype=np.int32)
+                for name, codes in self._codes.items()
+            },
+            values={
+                name: np.array(list(values), dtype=str)
+                for name, values in self._values.items()
+            },
+        )
+
+    def save(self, path: Path, *, statement: Path | None = None) -> None:
+        """Write the columns to ``path``, replacing the previous version.
+
+        :param statement: The file the entries were imported from. Once it is
+          deleted, :py:func:`read_columns` removes ``path``.
+        """
+        columns = self.build()
+        with atomic.replacing(path, "wb") as f:
+            np.savez(
+                f,
+                date=columns.date,
+                amount=columns.amount,
+                digest=columns.digest,
+                statement=np.array(
+                    "" if statement is None else str(statement.resolve())
+                ),
+                **columns.codes,
+                **{f"{name}_values": values for name, values in columns.values.items()},
+            )
+
+
+def _empty() -> Columns:
+    return ColumnBuilder().build()
+
+
+def read_columns(config: Config) -> Columns:
+    """Read and concatenate the columns of all imported statements.
+
+    The dictionaries of the separate files are merged, and their codes remapped.
+    Files of statements that no longer exist are removed.
+    """
+    parts = []
+    for path in sorted(_columns_dir(config).glob("*.npz")):
+        with np.load(path, allow_pickle=False) as f:
+            part = {name: f[name] for name in f.files}
+        statement = str(part.get("statement", ""))
+        if statement and not Path(statement).exists():
+            path.unlink(missing_ok=True)
+            continue
+        parts.append(part)
+
+    if not parts:
+        return _empty()
+
+    codes, values = {}, {}
+    for name in _ENCODED:
+        merged, inverse = np.unique(
+            np.concatenate([part[f"{name}_values"] for part in parts]),
+            return_inverse=True,
+        )
+        remapped, offset = [], 0
+        for part in parts:
+            size = len(part[f"{name}_values"])
+            remapped.append(inverse[offset : offset + size][part[name]])
+            offset += size
+        codes[name] = np.concatenate(remapped).astype(np.int32)
+        values[name] = merged
+
+    return Columns(
+        date=np.concatenate([part["date"] for part in parts]),
+        amount=np.concatenate([part["amount"] for part in parts]),
+        digest=np.concatenate([part["digest"] for part in parts]),
+        codes=codes,
+        values=values,
+    )
+
+
+def _sum_by(
+    keys: np.ndarray, amount: np.ndarray
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """The unique ``keys``, and the total ``amount`` and number of rows of each."""
+    unique, inverse = np.unique(keys, return_inverse=True)
+    inverse = inverse.ravel()
+    totals = np.zeros(len(unique), dtype=np.int64)
+    np.add.at(totals, inverse, amount)
+    return unique, totals, np.bincount(inverse, minlength=len(unique))
+
+
+def monthly_totals(columns: Columns) -> list[tuple[str, str, str, Decimal]]:
+    """Sum of the amounts per account, per month, per currency.
+
+    :return: Rows of ``(account, month, currency, total)``, sorted by account and month.
+      Expenses have a negative total, as they lower the balance of the asset account.
+    """
+    if len(columns) == 0:
+        return []
+
+    months = columns.date.astype("datetime64[M]")
+    keys = np.rec.fromarrays(
+        [columns.codes["account"], months, columns.codes["currency"]]
+    )
+    unique, totals, _ = _sum_by(keys, columns.amount)
+
+    rows = zip(
+        columns.values["account"][unique.f0],
+        unique.f1.astype(str),
+        columns.values["currency"][unique.f2],
+        totals,
+    )
+    return sorted(
+        (str(account), month, str(currency), unscaled(total))
+        for account, month, currency, total in rows
+    )
+
+
+def top_payees(columns: Columns, *, n: int = 10) -> list[tuple[str, str, int, Decimal]]:
+    """Payees with the most spending, i.e. the lowest sum of negative amounts, per
+    currency. Amounts in different currencies are not added up.
+
+    :param n: Number of payees per currency.
+    :return: Rows of ``(payee, currency, number of entries, total)``, sorted by
+      currency, and then by total from high to low. Totals are positive.
+    """
+    spending = columns.where(columns.amount < 0)
+    if len(spending) == 0:
+        return []
+
+    keys = np.rec.fromarrays([spending.codes["currency"], spending.codes["payee"]])
+    unique, totals, counts = _sum_by(keys, -spending.amount)
+
+    rows = []
+    for currency in np.unique(unique.f0):
+        (indices,) = np.nonzero(unique.f0 == currency)
+        top = indices[np.argsort(-totals[indices], kind="stable")[:n]]
+        rows.extend(
+            (
+                str(columns.values["payee"][unique.f1[i]]),
+                str(columns.values["currency"][currency]),
+                int(counts[i]),
+                unscaled(totals[i]),
+            )
+            for i in top
+        )
+    return rows
+
+
+def print_report(
+    config: Config,
+    *,
+    start: datetime.date | None = None,
+    end: datetime.date | None = None,
+    top: int = 10,
+) -> None:
+    """Print the monthly totals and top payees between ``start`` and ``end``."""
+    columns = read_columns(config)
+    if start is not None:
+        columns = columns.where(columns.date >= np.datetime64(start, "D"))
+    if end is not None:
+        columns = columns.where(columns.date <= np.datetime64(end, "D"))
+
+    totals = Table("Account", "Month", "Total", title="Monthly totals")
+    for account, month, currency, total in monthly_totals(columns):
+        totals.add_row(account, month, f"{total:.2f} {currency}")
+    rprint(totals)
+
+    payees = Table("Payee", "Entries", "Total", title="Top payees")
+    for payee, currency, count, total in top_payees(columns, n=top):
+        payees.add_row(payee, str(count), f"{total:.2f} {currency}")
+    rprint(payees)
@@ -0,0 +1,286 @@
+"""
+Tools for working with collections of cleaning rules.
+
+A :py:obj:`roastery.importer.CleanFn` is often built out of many small rules,
+each of which is a :py:obj:`~roastery.importer.CleanFn` itself. The
+:py:class:`RuleProfiler` runs such a list of rules in order and records what each
+rule did, and how long it took:
+
+.. code-block:: python
+
+   from roastery.rules import RuleProfiler
+
+   with RuleProfiler([rule_payees, rule_groceries, rule_rent]) as clean:
+       import_csv(csv_file=..., config=config, extract=extract_asn, clean=clean)
+       import_csv(csv_file=..., config=config, extract=extract_demo, clean=clean)
+
+   # On exit, the profiler prints the slowest rules, and rules that never matched.
+
+Rules can be functions or objects with a ``__call__`` method. A rule *matches* an
+entry when it changes one of the cleaned values, the tags, the links, or the flag
+of the entry.
+
+API
+---
+
+.. autofunction:: rule_name
+.. autofunction:: rule_fingerprint
+.. autofunction:: module_hash
+.. autoclass:: RuleProfiler
+   :members:
+.. autoclass:: RuleStats
+   :members:
+"""
+
+import dataclasses
+import functools
+import hashlib
+import inspect
+import marshal
+import os
+import re
+import sysconfig
+import time
+import types
+from typing import TYPE_CHECKING, Any, Iterator
+
+from rich import print as rprint
+from rich.table import Table
+
+from roastery import term
+
+if TYPE_CHECKING:
+    from roastery.importer import CleanFn, Digest, Entry
+
+__all__ = [
+    "rule_name",
+    "rule_fingerprint",
+    "module_hash",
+    "RuleProfiler",
+    "RuleStats",
+]
+
+PROVENANCE_FIELDS = ("account", "payee", "narration")
+"""Fields of :py:class:`roastery.importer.Entry` for which the profiler records which
+rule set them."""
+
+
+def rule_name(rule: "CleanFn") -> str:
+    """Human readable name of a rule: the qualified name of the function or class."""
+    name = getattr(rule, "__qualname__", None) or type(rule).__qualname__
+    module = getattr(rule, "__module__", None) or type(rule).__module__
+    return name if module in (None, "__main__") else f"{module}.{name}"
+
+
+def _is_library(path: str) -> bool:
+    """Whether ``path`` belongs to the standard library or an installed package."""
+    paths = sysconfig.get_paths()
+    prefixes = {paths[key] for key in ("stdlib", "platstdlib", "purelib", "platlib")}
+    return any(os.path.abspath(path).startswith(prefix) for prefix in prefixes)
+
+
+@functools.lru_cache(maxsize=256)
+def _file_hash(path: str, mtime_ns: int, size: int) -> str:
+    with open(path, "rb") as f:
+        return hashlib.file_digest(f, "md5").hexdigest()
+
+
+def module_hash(obj: Any, *, libraries: bool = False) -> str | None:
+    """Hash of the source file of the module that defines ``obj``.
+
+    :param libraries: Hash modules of the standard library and of installed packages
+      too. By default, ``None`` is returned for those.
+    :return: The hash, or ``None`` if the module has no source file.
+    """
+    module = obj if inspect.ismodule(obj) else inspect.getmodule(obj)
+    path = getattr(module, "__file__", None)
+    if path is None or (not libraries and _is_library(path)):
+        return None
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return _file_hash(path, stat.st_mtime_ns, stat.st_size)
+
+
+def _codes(target: Any) -> Iterator[tuple[types.CodeType, dict]]:
+    """The code objects of a function, or of the methods of a class, with their
+    globals. Nested functions and comprehensions are included."""
+    funcs = [target]
+    if inspect.isclass(target):
+        funcs = [
+            func
+            for klass in target.__mro__
+            if klass is not object
+            for func in vars(klass).values()
+            if inspect.isfunction(func)
+        ]
+    for func in funcs:
+        func = inspect.unwrap(getattr(func, "__func__", func))
+        pending = [getattr(func, "__code__", None)]
+        while pending:
+            if (code := pending.pop()) is None:
+                continue
+            yield code, func.__globals__
+            pending.extend(c for c in code.co_consts if isinstance(c, types.CodeType))
+
+
+def _globals_state(target: Any) -> list:
+    """What the globals that ``target`` refers to look like.
+
+    Functions, classes, and modules are represented by the hash of the module that
+    defines them, so changing a helper function changes the fingerprint. Other
+    values are represented by their ``repr``.
+    """
+    state = []
+    for code, globals_ in _codes(target):
+        for name in code.co_names:
+            if name not in globals_:
+                continue
+            val = globals_[name]
+            if inspect.ismodule(val) or inspect.isclass(val) or inspect.isroutine(val):
+                state.append((name, module_hash(val)))
+            else:
+                state.append((name, val))
+    return sorted(set(map(repr, state)))
+
+
+def rule_fingerprint(rule: "CleanFn") -> str:
+    """Hash that changes when the implementation of ``rule`` changes.
+
+    The hash covers:
+
+    - The source code of the function, or of the class for rule objects. If the
+      source is not available, the compiled code is used instead.
+    - The values a function closes over and the attributes of rule objects, so
+      rules created by a factory function are told apart.
+    - The source of the module that defines the rule, and of the modules that define
+      the functions and classes it refers to, so a change to a helper function
+      changes the hash. The standard library and installed packages are left out.
+    - The values of the other globals the rule refers to.
+    - The ``version`` attribute of the rule, if any. Bump it to force a new hash when
+      a rule depends on something that the hash does not cover, such as a file.
+    """
+    is_function = inspect.isfunction(rule) or inspect.ismethod(rule)
+    target = rule if is_function else type(rule)
+    try:
+        code = inspect.getsource(target).encode("utf-8")
+    except (OSError, TypeError):
+        func = getattr(target, "__call__", target)
+        code = marshal.dumps(getattr(func, "__code__", None) or repr(func))
+
+    if is_function:
+        state = [cell.cell_contents for cell in rule.__closure__ or ()]
+        state.append(rule.__defaults__)
+    else:
+        state = sorted(getattr(rule, "__dict__", {}).items())
+    state.append(getattr(rule, "version", None))
+    state.append(module_hash(target))
+    state.append(_globals_state(target))
+
+    # Memory addresses in reprs change on every run.
+    state_repr = re.sub(r" at 0x[0-9a-f]+", "", repr(state))
+    return hashlib.md5(code + state_repr.encode("utf-8")).hexdigest()
+
+
+@dataclasses.dataclass
+class RuleStats:
+    """What a single rule did during an import."""
+
+    name: str
+    """See :py:func:`rule_name`."""
+
+    calls: int = 0
+    """Number of entries the rule was called with."""
+
+    seconds: float = 0.0
+    """Cumulative time spent in the rule."""
+
+    matches: int = 0
+    """Number of entries the rule changed."""
+
+
+def _snapshot(entry: "Entry") -> tuple:
+    return (
+        *(getattr(entry, field).cleaned for field in PROVENANCE_FIELDS),
+        frozenset(entry.tags),
+        frozenset(entry.links),
+        entry.flag,
+    )
+
+
+class RuleProfiler:
+    """A :py:obj:`~roastery.importer.CleanFn` that runs ``rules`` in order and profiles them.
+
+    :param rules: Rules to run, in order.
+    :param provenance_meta: Also store the name of the rule that last set the account,
+      payee, or narration in the metadata of the transaction. The keys are
+      ``account_rule``, ``payee_rule``, and ``narration_rule``.
+    """
+
+    def __init__(
+        self, rules: list["CleanFn"], *, provenance_meta: bool = False
+    ) -> None:
+        self.rules = list(rules)
+        self.provenance_meta = provenance_meta
+        self.stats: list[RuleStats] = [RuleStats(name=rule_name(r)) for r in self.rules]
+        """Statistics per rule, in the same order as ``rules``."""
+        self.provenance: dict["Digest", dict[str, str]] = {}
+        """For each digest: the name of the rule that last set each of the
+        :py:data:`PROVENANCE_FIELDS`."""
+
+    def __call__(self, entry: "Entry") -> None:
+        before = _snapshot(entry)
+
+        for rule, stats in zip(self.rules, self.stats):
+            start = time.perf_counter()
+            rule(entry)
+            stats.seconds += time.perf_counter() - start
+            stats.calls += 1
+
+            after = _snapshot(entry)
+            if after == before:
+                continue
+
+            stats.matches += 1
+            for field, old, new in zip(PROVENANCE_FIELDS, before, after):
+                if old != new:
+                    self.provenance.setdefault(entry.digest, {})[field] = stats.name
+                    if self.provenance_meta:
+                        entry.meta[f"{field}_rule"] = stats.name
+            before = after
+
+    def __enter__(self) -> "RuleProfiler":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.report()
+
+    def hottest(self, n: int = 10) -> list[RuleStats]:
+        """The ``n`` rules with the highest cumulative time."""
+        return sorted(self.stats, key=lambda s: s.seconds, reverse=True)[:n]
+
+    def never_matched(self) -> list[RuleStats]:
+        """Rules that were called, but never changed an entry."""
+        return [s for s in self.stats if s.calls > 0 and s.matches == 0]
+
+    def report(self, n: int = 10) -> None:
+        """Print the :py:meth:`hottest` rules and the rules that :py:meth:`never_matched`."""
+        table = Table("Rule", "Calls", "Matches", "Total (ms)", "Per call (µs)")
+        table.title = "Hottest rules"
+        for s in self.hottest(n):
+            per_call = s.seconds / s.calls * 1e6 if s.calls else 0.0
+            table.add_row(
+                s.name,
+                str(s.calls),
+                str(s.matches),
+                f"{s.seconds * 1e3:.1f}",
+                f"{per_call:.1f}",
+            )
+        rprint(table)
+
+        if never := self.never_matched():
+            term.warn(
+                f"{len(never)} rule(s) never matched:",
+                *(f"[bold]{s.name}[/bold]" for s in never),
+            )
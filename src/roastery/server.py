@@ -0,0 +1,366 @@
+"""
+A resident server that keeps your journal loaded in memory.
+
+Loading a journal with beancount means parsing, booking, and validating the
+entire ledger. Commands such as ``edit`` do this on every invocation. The
+server does this once and then keeps the entries, the list of accounts, and the
+queue of unprocessed entries in memory. Commands from the CLI ask the server
+instead of loading the journal themselves.
+
+Start the server with the ``serve`` command of :py:func:`roastery.cli.make_cli`.
+It listens on the Unix socket at :py:obj:`roastery.config.Config.socket_path`.
+The ``edit``, ``flag`` and ``query`` commands use the server automatically
+when it is running.
+
+The server checks the modification times of all loaded files before each
+request. The journal is only reloaded when one of the beancount files changed.
+Reloading goes through :py:func:`roastery.loading.load_journal`, so only the files
+that changed are parsed again; the others come from its per-file cache. Booking,
+plugins, and validation still run over the whole journal. Changes to the skip list,
+the flags, and the manual edits are picked up without reloading the journal.
+
+API
+---
+
+.. autofunction:: serve
+.. autofunction:: connect
+.. autodata:: PING_TIMEOUT
+.. autoclass:: JournalState
+   :members:
+.. autoclass:: Client
+   :members:
+.. autoclass:: SocketClient
+.. autoclass:: LocalClient
+"""
+
+import abc
+import datetime
+import json
+import socket
+import socketserver
+from pathlib import Path
+from typing import Any, NamedTuple
+
+from beancount.core import data
+from beancount.core.number import D
+from beancount.core.position import Position
+from beancount.query.query import run_query
+
+from roastery import atomic, edit, loading, plugin, term
+from roastery.config import Config
+from roastery.edit import ManualEdits, Unprocessed
+
+__all__ = [
+    "serve",
+    "connect",
+    "JournalState",
+    "Client",
+    "SocketClient",
+    "LocalClient",
+]
+
+
+PING_TIMEOUT = 2.0
+"""Seconds :py:func:`connect` waits for a server to answer, before it assumes the
+socket is stale."""
+
+
+class _Item(NamedTuple):
+    """Concrete :py:class:`roastery.edit.Unprocessed` that can be sent over the socket."""
+
+    date: datetime.date
+    position: Position
+    payee: str
+    narration: str
+    digest: str
+    type: str
+    template: str | None = None
+
+
+def _encode_item(item: Unprocessed) -> dict:
+    return {
+        "date": item.date.isoformat(),
+        "number": str(item.position.units.number),
+        "currency": item.position.units.currency,
+        "payee": item.payee,
+        "narration": item.narration,
+        "digest": item.digest,
+        "type": item.type,
+        "template": item.template,
+    }
+
+
+def _decode_item(val: dict) -> _Item:
+    return _Item(
+        date=datetime.date.fromisoformat(val["date"]),
+        position=Position(data.Amount(D(val["number"]), val["currency"]), None),
+        payee=val["payee"],
+        narration=val["narration"],
+        digest=val["digest"],
+        type=val["type"],
+        template=val.get("template"),
+    )
+
+
+def _encode_value(val: Any) -> Any:
+    if val is None or isinstance(val, (str, int, float, bool)):
+        return val
+    if isinstance(val, datetime.date):
+        return val.isoformat()
+    return str(val)
+
+
+def _read_json(path: Path, default: Any) -> Any:
+    try:
+        return json.loads(path.read_text())
+    except (ValueError, FileNotFoundError):
+        return default
+
+
+def _mtime(path: Path) -> float | None:
+    try:
+        return path.stat().st_mtime
+    except FileNotFoundError:
+        return None
+
+
+class JournalState:
+    """The loaded journal and everything derived from it.
+
+    :param config: The configuration to use to find files on disk.
+    """
+
+    def __init__(self, config: Config) -> None:
+        self.config = config
+        self.entries: list[data.Directive] = []
+        self.errors: list = []
+        self.options: dict = {}
+        self.accounts: list[str] = []
+        self.skip: set[str] = set()
+        self.flags: set[str] = set()
+        self.manual_edits: dict[str, ManualEdits] = {}
+        self._queue: list[Unprocessed] = []
+        self._journal_mtimes: dict[str, float | None] = {}
+        self._store_mtimes: dict[Path, float | None] = {}
+
+    def refresh(self) -> bool:
+        """Reload whatever changed on disk since the last refresh.
+
+        The journal is reloaded with :py:func:`roastery.loading.load_journal`, which
+        only parses the files whose contents changed and reuses its cache for the
+        rest.
+
+        :return: ``True`` if the journal itself was reloaded.
+        """
+        for path, mtime in self._store_mtimes.items():
+            if _mtime(path) != mtime:
+                self._load_stores()
+                break
+
+        if not self._journal_mtimes or any(
+            _mtime(Path(filename)) != mtime
+            for filename, mtime in self._journal_mtimes.items()
+        ):
+            self._load_journal()
+            return True
+
+        return False
+
+    def _load_journal(self) -> None:
+        self.entries, self.errors, self.options = loading.load_journal(self.config)
+        filenames = self.options.get("include") or [str(self.config.journal_path)]
+        # With the plugin, the entries depend on the manual edits and flags too.
+        filenames = [*filenames, *self.options.get(plugin.STORES_OPTION, [])]
+        self._journal_mtimes = {f: _mtime(Path(f)) for f in filenames}
+        self.accounts = edit.get_accounts(self.entries)
+        self._queue = list(edit.get_unprocessed(self.entries, self.options))
+        self._load_stores()
+
+    def _load_stores(self) -> None:
+        self.skip = edit.read_skip(self.config)
+        self.flags = set(_read_json(self.config.flags_path, []))
+        self.manual_edits = _read_json(self.config.manual_edits_path, {})
+        self._store_mtimes = {
+            path: _mtime(path)
+            for path in (
+                self.config.skip_path,
+                self.config.flags_path,
+                self.config.manual_edits_path,
+            )
+        }
+
+    def unprocessed(self) -> list[Unprocessed]:
+        """Unprocessed entries that have not been skipped or edited yet."""
+        return [
+            item
+            for item in self._queue
+            if item.digest not in self.skip and item.digest not in self.manual_edits
+        ]
+
+    def save(self, to_save: dict[str, ManualEdits], to_skip: set[str]) -> None:
+        """Store the results of an edit session and drop them from the queue."""
+        edit.save(self.config, to_save, self.skip | to_skip)
+        self._load_stores()
+
+    def flag(self, digest: str) -> None:
+        """Flag an entry for later review."""
+        self.flags.add(digest)
+        atomic.write_json(self.config.flags_path, sorted(self.flags))
+        edit.mark_changed(self.config, [digest])
+        self._load_stores()
+
+    def query(self, query: str) -> tuple[list[str], list[list]]:
+        """Run a BQL query against the loaded entries.
+
+        :return: The column names and the rows of the result.
+        """
+        res_types, res_rows = run_query(self.entries, self.options, query)
+        columns = [name for name, _ in res_types]
+        return columns, [[_encode_value(val) for val in row] for row in res_rows]
+
+    def handle(self, request: dict) -> dict:
+        """Answer a single request, as sent by a :py:class:`Client`."""
+        command = request.get("command")
+        args = request.get("args", {})
+        # A ping only checks that the server is up, so it must not wait for a reload.
+        if command != "ping":
+            self.refresh()
+
+        match command:
+            case "ping":
+                return {"ok": True}
+            case "accounts":
+                return {"ok": True, "accounts": self.accounts}
+            case "unprocessed":
+                items = [_encode_item(item) for item in self.unprocessed()]
+                return {"ok": True, "unprocessed": items}
+            case "save":
+                self.save(args["edits"], set(args["skip"]))
+                return {"ok": True}
+            case "flag":
+                self.flag(args["digest"])
+                return {"ok": True}
+            case "query":
+                columns, rows = self.query(args["query"])
+                return {"ok": True, "columns": columns, "rows": rows}
+            case _:
+                return {"ok": False, "error": f"Unknown command: {command}"}
+
+
+class Client(abc.ABC):
+    """Talks to a :py:class:`JournalState`. Used by the CLI commands."""
+
+    @abc.abstractmethod
+    def request(self, command: str, **args: Any) -> dict:
+        """Send a single request and return the response."""
+
+    def _checked(self, command: str, **args: Any) -> dict:
+        res = self.request(command, **args)
+        if not res.get("ok"):
+            raise RuntimeError(res.get("error", "Server error"))
+        return res
+
+    def accounts(self) -> list[str]:
+        """See :py:func:`roastery.edit.get_accounts`."""
+        return self._checked("accounts")["accounts"]
+
+    def unprocessed(self) -> list[Unprocessed]:
+        """See :py:meth:`JournalState.unprocessed`."""
+        return [
+            _decode_item(val) for val in self._checked("unprocessed")["unprocessed"]
+        ]
+
+    def save(self, to_save: dict[str, ManualEdits], to_skip: set[str]) -> None:
+        """See :py:meth:`JournalState.save`."""
+        self._checked("save", edits=to_save, skip=sorted(to_skip))
+
+    def flag(self, digest: str) -> None:
+        """See :py:meth:`JournalState.flag`."""
+        self._checked("flag", digest=digest)
+
+    def query(self, query: str) -> tuple[list[str], list[list]]:
+        """See :py:meth:`JournalState.query`."""
+        res = self._checked("query", query=query)
+        return res["columns"], res["rows"]
+
+
+class SocketClient(Client):
+    """Client for a server listening on a Unix socket.
+
+    :param timeout: Seconds to wait for the server, or ``None`` to wait as long as
+      it takes.
+    """
+
+    def __init__(self, socket_path: Path, *, timeout: float | None = None) -> None:
+        self.socket_path = socket_path
+        self.timeout = timeout
+
+    def request(self, command: str, **args: Any) -> dict:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(self.timeout)
+            sock.connect(str(self.socket_path))
+            with sock.makefile("rwb") as f:
+                f.write(json.dumps({"command": command, "args": args}).encode() + b"\n")
+                f.flush()
+                return json.loads(f.readline())
+
+
+class LocalClient(Client):
+    """Client that answers requests in-process, without a socket.
+
+    Requests and responses still go through JSON, so this behaves the same as a
+    :py:class:`SocketClient`. This is mainly useful for testing.
+    """
+
+    def __init__(self, state: JournalState) -> None:
+        self.state = state
+
+    def request(self, command: str, **args: Any) -> dict:
+        req = json.loads(json.dumps({"command": command, "args": args}))
+        return json.loads(json.dumps(self.state.handle(req)))
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self) -> None:
+        for line in self.rfile:
+            try:
+                res = self.server.state.handle(json.loads(line))
+            except Exception as e:
+                res = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+            self.wfile.write(json.dumps(res).encode() + b"\n")
+            self.wfile.flush()
+
+
+def connect(config: Config) -> Client | None:
+    """Connect to a running server, if there is one.
+
+    :return: A :py:class:`SocketClient`, or ``None`` if no server answers on
+      :py:obj:`roastery.config.Config.socket_path` within :py:data:`PING_TIMEOUT`.
+    """
+    if not config.socket_path.exists():
+        return None
+
+    try:
+        SocketClient(config.socket_path, timeout=PING_TIMEOUT).request("ping")
+    except (OSError, ValueError):
+        return None
+    return SocketClient(config.socket_path)
+
+
+def serve(config: Config) -> None:
+    """Load the journal and answer requests on the socket until interrupted."""
+    state = JournalState(config)
+    state.refresh()
+
+    config.socket_path.parent.mkdir(parents=True, exist_ok=True)
+    config.socket_path.unlink(missing_ok=True)
+
+    with socketserver.UnixStreamServer(str(config.socket_path), _Handler) as server:
+        server.state = state
+        term.info(f"Listening on [bold]{config.socket_path}[/bold]")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            config.socket_path.unlink(missing_ok=True)
@@ -0,0 +1,112 @@
+"""
+Sort entries by date with bounded memory.
+
+Many banks export statements newest first, so the generated beancount files end up
+in reverse chronological order. When the export window shifts, every line of the
+file moves, which makes for noisy diffs. When
+:py:obj:`roastery.config.Config.sort_entries` is set, the importers write
+transactions sorted by date, and then by digest, so the output is stable.
+
+Statements that do not fit in memory are sorted with an external merge sort:
+entries are pickled and collected until they exceed
+:py:obj:`roastery.config.Config.sort_memory_limit`, sorted, and written to a
+spill file under ``.roastery/sort/``. Every entry is pickled only once: the
+bytes that measure its size are the bytes that are spilled. The spill files are then merged while the
+beancount file is written, and removed afterwards.
+
+API
+---
+
+.. autofunction:: sort_entries
+.. autofunction:: sort_key
+"""
+
+import datetime
+import heapq
+import operator
+import pickle
+import shutil
+import tempfile
+from pathlib import Path
+from typing import TYPE_CHECKING, BinaryIO, Iterable, Iterator
+
+if TYPE_CHECKING:
+    from roastery.importer import Entry
+
+__all__ = [
+    "sort_entries",
+    "sort_key",
+]
+
+
+def sort_key(entry: "Entry") -> tuple[datetime.date, str]:
+    """Order of entries in sorted output: by date, then by digest."""
+    return entry.date, entry.digest
+
+
+# Pickled entries, with their sort key.
+_Pickled = tuple[tuple[datetime.date, str], bytes]
+
+
+def _spill(buffer: list[_Pickled], f: BinaryIO) -> None:
+    buffer.sort(key=operator.itemgetter(0))
+    for _, pickled in buffer:
+        f.write(pickled)
+
+
+def _read_run(path: Path) -> Iterator["Entry"]:
+    with path.open("rb") as f:
+        unpickler = pickle.Unpickler(f)
+        while True:
+            try:
+                yield unpickler.load()
+            except EOFError:
+                return
+
+
+def sort_entries(
+    entries: Iterable["Entry"],
+    *,
+    memory_limit: int,
+    spill_dir: Path | None = None,
+) -> Iterator["Entry"]:
+    """Yield ``entries`` ordered by :py:func:`sort_key`.
+
+    :param memory_limit: Approximate number of bytes of entries to hold in memory,
+      measured by their pickled size. Beyond that, sorted runs are spilled to disk.
+    :param spill_dir: Directory to create spill files in. It is only created when
+      needed. Defaults to the system's temporary directory.
+    """
+    buffer: list[_Pickled] = []
+    size = 0
+    runs = []
+    tmp = None
+
+    try:
+        for entry in entries:
+            pickled = pickle.dumps(entry, protocol=pickle.HIGHEST_PROTOCOL)
+            buffer.append((sort_key(entry), pickled))
+            size += len(pickled)
+            if size < memory_limit:
+                continue
+
+            if tmp is None:
+                if spill_dir is not None:
+                    spill_dir.mkdir(parents=True, exist_ok=True)
+                tmp = Path(tempfile.mkdtemp(dir=spill_dir, prefix="roastery-sort-"))
+
+            run = tmp / f"run-{len(runs)}.pickle"
+            with run.open("wb") as f:
+                _spill(buffer, f)
+            runs.append(run)
+            buffer = []
+            size = 0
+
+        buffer.sort(key=operator.itemgetter(0))
+        in_memory = (pickle.loads(pickled) for _, pickled in buffer)
+        yield from heapq.merge(
+            *(_read_run(run) for run in runs), in_memory, key=sort_key
+        )
+    finally:
+        if tmp is not None:
+            shutil.rmtree(tmp, ignore_errors=True)
@@ -0,0 +1,205 @@
+"""
+Read statements straight out of compressed files and archives.
+
+Years of statements take up a lot of space, so you may want to keep them
+compressed. The importers accept a :py:class:`Source` everywhere they accept the
+path of a statement. Sources are read as a stream: nothing is extracted to disk.
+
+.. code-block:: python
+
+   from roastery.sources import iter_sources
+
+   # statements/2023.zip contains jan.csv, feb.csv, ...
+   for source in iter_sources(config.statements_dir, pattern="*.csv"):
+       import_csv(csv_file=source, config=config, extract=extract_asn)
+
+Supported formats:
+
+- Plain files.
+- ``.gz``, ``.bz2``, and ``.xz`` compressed files.
+- ``.zst`` compressed files. This requires Python 3.14, or the ``zstandard``
+  package.
+- ``.zip`` archives. Every member that matches the pattern is a separate source.
+  Members can be compressed themselves.
+
+The generated beancount file is written next to the file on disk. Compression
+suffixes are dropped: ``foo.csv.gz`` becomes ``foo.beancount``. For archive
+members, the name of the archive and the path of the member are joined with
+``-``: member ``2023/jan.csv`` of ``bank.zip`` becomes ``bank-2023-jan.beancount``.
+
+API
+---
+
+.. autofunction:: iter_sources
+.. autofunction:: as_source
+.. autofunction:: source_from_name
+.. autoclass:: Source
+   :members:
+"""
+
+import bz2
+import contextlib
+import dataclasses
+import fnmatch
+import gzip
+import hashlib
+import io
+import lzma
+import zipfile
+from pathlib import Path, PurePosixPath
+from typing import BinaryIO, Iterator, TextIO
+
+__all__ = [
+    "Source",
+    "iter_sources",
+    "as_source",
+    "source_from_name",
+]
+
+_COMPRESSION_SUFFIXES = {".gz", ".bz2", ".xz", ".zst"}
+
+
+def _open_zstd(f: BinaryIO) -> BinaryIO:
+    try:
+        from compression import zstd
+
+        return zstd.ZstdFile(f)
+    except ImportError:
+        pass
+
+    try:
+        import zstandard
+    except ImportError:
+        raise ImportError(
+            "Reading .zst files requires Python 3.14 or the `zstandard` package"
+        ) from None
+    return zstandard.ZstdDecompressor().stream_reader(f)
+
+
+def _decompress(f: BinaryIO, name: str) -> BinaryIO:
+    match PurePosixPath(name).suffix:
+        case ".gz":
+            return gzip.GzipFile(fileobj=f)
+        case ".bz2":
+            return bz2.BZ2File(f)
+        case ".xz":
+            return lzma.LZMAFile(f)
+        case ".zst":
+            return _open_zstd(f)
+        case _:
+            return f
+
+
+def _strip_compression(name: str) -> PurePosixPath:
+    path = PurePosixPath(name)
+    while path.suffix in _COMPRESSION_SUFFIXES:
+        path = path.with_suffix("")
+    return path
+
+
+@dataclasses.dataclass(frozen=True)
+class Source:
+    """A statement: a file on disk, or a member of an archive."""
+
+    path: Path
+    """The file on disk."""
+
+    member: str | None = None
+    """Name of the member in the archive at :py:attr:`path`, if any."""
+
+    @property
+    def name(self) -> str:
+        """Name of the statement, for example ``bank.zip:2023/jan.csv``."""
+        return str(self.path) if self.member is None else f"{self.path}:{self.member}"
+
+    @property
+    def stem(self) -> str:
+        """Name of the statement without directories, compression, and file extension."""
+        if self.member is None:
+            return _strip_compression(self.path.name).stem
+
+        member = _strip_compression(self.member).with_suffix("")
+        return "-".join([self.path.stem, *member.parts])
+
+    def beancount_file(self) -> Path:
+        """Default path of the beancount file to generate from this statement."""
+        return self.path.with_name(f"{self.stem}.beancount")
+
+    @contextlib.contextmanager
+    def open_binary(self) -> Iterator[BinaryIO]:
+        """Open the decompressed statement for reading bytes."""
+        with contextlib.ExitStack() as stack:
+            if self.member is None:
+                f = stack.enter_context(self.path.open("rb"))
+                name = self.path.name
+            else:
+                archive = stack.enter_context(zipfile.ZipFile(self.path))
+                f = stack.enter_context(archive.open(self.member))
+                name = self.member
+            yield stack.enter_context(_decompress(f, name))
+
+    @contextlib.contextmanager
+    def open(self, encoding: str | None = None) -> Iterator[TextIO]:
+        """Open the decompressed statement for reading text."""
+        if self.member is None and not self.is_compressed:
+            with self.path.open(encoding=encoding) as f:
+                yield f
+            return
+
+        with self.open_binary() as f:
+            yield io.TextIOWrapper(f, encoding=encoding)
+
+    @property
+    def is_compressed(self) -> bool:
+        """Whether the statement is compressed, not counting the archive it is in."""
+        name = self.path.name if self.member is None else self.member
+        return PurePosixPath(name).suffix in _COMPRESSION_SUFFIXES
+
+    def content_hash(self) -> str:
+        """Hash of the decompressed contents of the statement."""
+        with self.open_binary() as f:
+            return hashlib.file_digest(f, "blake2b").hexdigest()
+
+
+def source_from_name(name: str) -> Source:
+    """The :py:class:`Source` with :py:attr:`Source.name` ``name``."""
+    # Paths can contain colons too, so try every split until one is an archive.
+    for i, char in enumerate(name):
+        if char == ":" and zipfile.is_zipfile(path := Path(name[:i])):
+            return Source(path=path, member=name[i + 1 :])
+    return Source(path=Path(name))
+
+
+def as_source(path: Path | Source) -> Source:
+    """Turn a path into a :py:class:`Source`. Sources are returned as is."""
+    return path if isinstance(path, Source) else Source(path=Path(path))
+
+
+def _matches(name: str, pattern: str) -> bool:
+    return fnmatch.fnmatch(str(_strip_compression(PurePosixPath(name).name)), pattern)
+
+
+def iter_sources(path: Path, *, pattern: str = "*.csv") -> Iterator[Source]:
+    """Find all statements in ``path``, in sorted order.
+
+    :param path: A single file, an archive, or a directory to search recursively.
+    :param pattern: Glob pattern that the name of a statement must match, once the
+      compression suffix has been removed. So ``*.csv`` matches ``foo.csv.gz``.
+    """
+    if path.is_dir():
+        for child in sorted(path.rglob("*")):
+            if child.is_file():
+                yield from iter_sources(child, pattern=pattern)
+        return
+
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as archive:
+            members = sorted(
+                info.filename
+                for info in archive.infolist()
+                if not info.is_dir() and _matches(info.filename, pattern)
+            )
+        for member in members:
+            yield Source(path=path, member=member)
+    elif _matches(path.name, pattern):
+        yield Source(path=path)
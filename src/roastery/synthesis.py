@@ -0,0 +1,416 @@
+"""
+Turn repeated manual edits into rules, and prune the edits they make redundant.
+
+Most manual edits make the same decision over and over: every transaction of
+``Albert Heijn`` goes to ``Expenses:Groceries``. Each of them is a separate entry in
+:py:obj:`roastery.config.Config.manual_edits_path`, which every import and edit
+session loads. :py:func:`synthesize` finds such groups of edits, and proposes a rule
+for each:
+
+.. code-block::
+
+   $ ./cli.py synthesize --min-support 3 --min-confidence 0.95
+   $ ./cli.py synthesize --write
+
+It imports every statement in :py:obj:`roastery.config.Config.statements_dir`
+without writing anything, with your ``clean`` function and without
+:py:obj:`~roastery.config.Config.do_not_import_before`, so older statements are
+included too. Only entries that ``clean`` leaves without an account are used.
+Then:
+
+1. Edits are grouped by the original payee, ignoring case. A group becomes a rule
+   when it has at least ``min_support`` edits, and at least ``min_confidence`` of
+   them chose the same account.
+2. The remaining edits are grouped by the template of the original narration,
+   see :py:func:`roastery.templates.template_of`, in the same way.
+3. Each rule is verified against *all* imported entries it matches, not just the
+   edits in its group. It is rejected if less than ``min_confidence`` of the
+   matching entries that were edited or skipped agree with it; a skipped entry
+   never agrees, as the rule would classify it. Matching entries without an edit
+   are counted: the rule will classify those as well.
+
+If the edits in a group also renamed the payee in the same way, the rule sets the
+payee too.
+
+Rules that were stored before are verified again, in the same way, except that
+the matching entries without an edit count as agreeing: the stored rule is what
+classifies them. The edits behind a stored rule were removed when it was stored, so
+it could not be mined again. A stored rule is only dropped when enough edits or
+skips that were made since contradict it.
+
+With ``--write``, the stored and the new rules are stored in
+``.roastery/rules.json``, and every edit that the rules reproduce exactly is
+removed from the manual edits. Edits that
+change the narration, or set tags or links, are kept. Pruning requires
+:py:obj:`roastery.config.Config.apply_rules`, which makes the import apply the
+stored rules to every entry that ``clean`` leaves without an account.
+
+API
+---
+
+.. autofunction:: synthesize
+.. autofunction:: write_rules
+.. autofunction:: load_rules
+.. autofunction:: rules_path
+.. autoclass:: Rule
+   :members:
+.. autoclass:: Synthesis
+   :members:
+.. autoclass:: LearnedRules
+   :members:
+"""
+
+import collections
+import dataclasses
+import json
+from pathlib import Path
+
+from rich import print as rprint
+from rich.table import Table
+
+from roastery import atomic, edit, term
+from roastery.config import Config
+from roastery.edit import ManualEdits
+from roastery.importer import CleanFn, Digest, Entry, iter_entries
+from roastery.sources import iter_sources
+from roastery.templates import template_of
+
+__all__ = [
+    "synthesize",
+    "write_rules",
+    "load_rules",
+    "rules_path",
+    "Rule",
+    "Synthesis",
+    "LearnedRules",
+]
+
+# Version of the file format. Bump this when changing what is stored.
+_FORMAT_VERSION = 1
+
+FIELDS = ("payee", "narration")
+"""What rules match on, in the order they are tried."""
+
+
+@dataclasses.dataclass(frozen=True)
+class Rule:
+    """Assign ``account`` to entries of which ``field`` has key ``key``."""
+
+    field: str
+    """One of :py:data:`FIELDS`."""
+
+    key: str
+    """The original payee, case folded, or the template of the original narration."""
+
+    account: str
+
+    payee: str | None = None
+    """Payee to set as well, if any."""
+
+    support: int = 0
+    """Number of edits in the group the rule was mined from."""
+
+    confidence: float = 1.0
+    """Fraction of the matching entries that were edited or skipped, that agree with
+    the rule. For a stored rule, matching entries without an edit agree."""
+
+    matches: int = 0
+    """Number of imported entries the rule matches."""
+
+    unedited: int = 0
+    """Matching entries without an edit, that the rule would classify."""
+
+
+@dataclasses.dataclass
+class Synthesis:
+    """Result of :py:func:`synthesize`."""
+
+    rules: list[Rule] = dataclasses.field(default_factory=list)
+    """Rules that passed verification: the stored rules that were kept, and the new
+    rules."""
+
+    rejected: list[tuple[Rule, str]] = dataclasses.field(default_factory=list)
+    """Rules that were mined or stored, but failed verification, with the reason."""
+
+    redundant: set[Digest] = dataclasses.field(default_factory=set)
+    """Digests of the edits that :py:attr:`rules` reproduce exactly."""
+
+    edits: int = 0
+    """Number of manual edits with an account."""
+
+    def print(self) -> None:
+        """Print the rules to the terminal."""
+        table = Table(
+            "Field", "Key", "Account", "Payee", "Support", "Confidence", "New"
+        )
+        table.title = "Synthesised rules"
+        for rule in self.rules:
+            table.add_row(
+                rule.field,
+                rule.key,
+                rule.account,
+                rule.payee or "",
+                str(rule.support),
+                f"{rule.confidence:.0%}",
+                str(rule.unedited),
+            )
+        rprint(table)
+
+        for rule, reason in self.rejected:
+            term.warn(f"Rejected {rule.field} [bold]{rule.key}[/bold]: {reason}")
+        term.info(
+            f"{len(self.rules)} rule(s) reproduce {len(self.redundant)} of "
+            + f"{self.edits} manual edits"
+        )
+
+
+def rules_path(config: Config) -> Path:
+    """File with the rules stored by :py:func:`write_rules`."""
+    return config.state_dir / "rules.json"
+
+
+def _key(field: str, entry: Entry) -> str:
+    if field == "payee":
+        return (entry.payee.original or "").strip().casefold()
+    return template_of(entry.narration.original or "")
+
+
+class LearnedRules:
+    """A :py:obj:`~roastery.importer.CleanFn` that applies synthesised rules.
+
+    Rules are looked up in a dictionary per field, so evaluating them costs the same
+    for ten rules as for ten thousand. Entries that already have an account are
+    left alone.
+    """
+
+    def __init__(self, rules: list[Rule]) -> None:
+        self.rules = rules
+        self._lookup: dict[str, dict[str, Rule]] = {field: {} for field in FIELDS}
+        for rule in rules:
+            self._lookup[rule.field].setdefault(rule.key, rule)
+
+    def match(self, entry: Entry) -> Rule | None:
+        """The first rule that matches ``entry``, ignoring its current account."""
+        for field in FIELDS:
+            if (rule := self._lookup[field].get(_key(field, entry))) is not None:
+                return rule
+        return None
+
+    def __call__(self, entry: Entry) -> None:
+        if entry.account.cleaned is not None:
+            return
+        if (rule := self.match(entry)) is None:
+            return
+        entry.account.cleaned = rule.account
+        if rule.payee is not None and entry.payee.cleaned is None:
+            entry.payee.cleaned = rule.payee
+
+
+def write_rules(config: Config, rules: list[Rule]) -> None:
+    """Store ``rules`` in :py:func:`rules_path`, replacing the previous rules."""
+    atomic.write_json(
+        rules_path(config),
+        {
+            "version": _FORMAT_VERSION,
+            "rules": [dataclasses.asdict(rule) for rule in rules],
+        },
+    )
+
+
+def load_rules(config: Config) -> LearnedRules | None:
+    """The stored rules, or ``None`` if there are none."""
+    try:
+        stored = json.loads(rules_path(config).read_text())
+    except (FileNotFoundError, ValueError):
+        return None
+    if stored.get("version") != _FORMAT_VERSION:
+        return None
+    return LearnedRules([Rule(**rule) for rule in stored["rules"]])
+
+
+def _imported_entries(config: Config, registry, clean: CleanFn | None) -> list[Entry]:
+    # Look at every statement, as it would be imported without the learned rules.
+    config = dataclasses.replace(
+        config, do_not_import_before=None, apply_rules=False, overlay_edits=True
+    )
+    entries = []
+    for source in iter_sources(config.statements_dir):
+        fmt = registry.detect(source)
+        if fmt is None:
+            continue
+        entries.extend(
+            entry
+            for entry in iter_entries(
+                csv_file=source,
+                config=config,
+                extract=fmt.extract,
+                clean=clean,
+                csv_args=fmt.reader_args,
+            )
+            if entry.account.cleaned is None
+        )
+    return entries
+
+
+def _mine(
+    field: str,
+    edited: list[tuple[Entry, ManualEdits]],
+    *,
+    min_support: int,
+    min_confidence: float,
+) -> list[Rule]:
+    groups: dict[str, list[ManualEdits]] = collections.defaultdict(list)
+    for entry, manual in edited:
+        if key := _key(field, entry):
+            groups[key].append(manual)
+
+    rules = []
+    for key, edits in sorted(groups.items()):
+        if len(edits) < min_support:
+            continue
+        [(account, n)] = collections.Counter(e["account"] for e in edits).most_common(1)
+        if n / len(edits) < min_confidence:
+            continue
+
+        payees = collections.Counter(
+            e.get("payee") for e in edits if e["account"] == account
+        )
+        [(payee, n_payee)] = payees.most_common(1)
+        rules.append(
+            Rule(
+                field=field,
+                key=key,
+                account=account,
+                payee=payee if payee and n_payee / n >= min_confidence else None,
+                support=len(edits),
+            )
+        )
+    return rules
+
+
+def _verify(
+    rule: Rule,
+    entries: list[Entry],
+    edits: dict[Digest, ManualEdits],
+    skipped: set[Digest],
+    min_confidence: float,
+    *,
+    stored: bool = False,
+) -> tuple[Rule, str | None]:
+    agree = disagree = unedited = 0
+    for entry in entries:
+        manual = edits.get(entry.digest)
+        if manual is not None and manual.get("account"):
+            if manual["account"] == rule.account:
+                agree += 1
+            else:
+                disagree += 1
+        elif entry.digest in skipped:
+            # The user chose to leave it unclassified, the rule would not.
+            disagree += 1
+        else:
+            unedited += 1
+    if stored:
+        # The rule already classifies the entries without an edit.
+        agree, unedited = agree + unedited, 0
+
+    confidence = agree / (agree + disagree) if agree + disagree else 0.0
+    rule = dataclasses.replace(
+        rule, confidence=confidence, matches=len(entries), unedited=unedited
+    )
+    if confidence < min_confidence:
+        return rule, f"only {agree} of {agree + disagree} matching entries agree"
+    return rule, None
+
+
+def _reproduces(rule: Rule, entry: Entry, manual: ManualEdits) -> bool:
+    """Whether importing ``entry`` with ``rule`` gives the same result as ``manual``."""
+    if manual.get("account") != rule.account:
+        return False
+    if manual.get("tags") or manual.get("links"):
+        return False
+    if rule.payee is None or entry.payee.cleaned is not None:
+        payee = entry.payee.value
+    else:
+        payee = rule.payee
+    return manual.get("payee") in (None, "", payee) and manual.get("narration") in (
+        None,
+        "",
+        entry.narration.value,
+    )
+
+
+def synthesize(
+    config: Config,
+    registry,
+    *,
+    clean: CleanFn = None,
+    min_support: int = 3,
+    min_confidence: float = 0.95,
+) -> Synthesis:
+    """Mine the manual edits for rules, and verify them against every statement.
+
+    The rules stored by :py:func:`write_rules` are verified again, and the ones
+    that pass are part of the result. Nothing is written. See the module
+    documentation.
+
+    :param registry: A :py:class:`roastery.registry.FormatRegistry`, to read the
+      statements with.
+    :param clean: See :py:func:`roastery.importer.import_csv`.
+    :param min_support: Minimum number of edits in a group.
+    :param min_confidence: Minimum fraction of the edits in a group, and of the
+      matching edits in all statements, that chose the same account.
+    """
+    edits = edit.read_manual_edits(config)
+    skipped = edit.read_skip(config)
+    entries = _imported_entries(config, registry, clean)
+
+    edited = [
+        (entry, edits[entry.digest])
+        for entry in entries
+        if edits.get(entry.digest, {}).get("account")
+    ]
+    result = Synthesis(edits=sum(1 for e in edits.values() if e.get("account")))
+
+    stored = load_rules(config)
+    if stored is not None:
+        by_rule: dict[Rule, list[Entry]] = collections.defaultdict(list)
+        for entry in entries:
+            if (rule := stored.match(entry)) is not None:
+                by_rule[rule].append(entry)
+        for rule in stored.rules:
+            rule, reason = _verify(
+                rule, by_rule[rule], edits, skipped, min_confidence, stored=True
+            )
+            if reason is None:
+                result.rules.append(rule)
+            else:
+                result.rejected.append((rule, reason))
+
+    for field in FIELDS:
+        # Entries that a rule for an earlier field matches are not this field's.
+        covered = LearnedRules(result.rules)
+        matching: dict[str, list[Entry]] = collections.defaultdict(list)
+        for entry in entries:
+            if covered.match(entry) is None:
+                matching[_key(field, entry)].append(entry)
+        edited = [(entry, m) for entry, m in edited if covered.match(entry) is None]
+
+        for rule in _mine(
+            field, edited, min_support=min_support, min_confidence=min_confidence
+        ):
+            rule, reason = _verify(
+                rule, matching[rule.key], edits, skipped, min_confidence
+            )
+            if reason is None:
+                result.rules.append(rule)
+            else:
+                result.rejected.append((rule, reason))
+
+    learned = LearnedRules(result.rules)
+    for entry in entries:
+        manual = edits.get(entry.digest)
+        rule = learned.match(entry)
+        if manual is not None and rule is not None and _reproduces(rule, entry, manual):
+            result.redundant.add(entry.digest)
+    return result
@@ -0,0 +1,334 @@
+"""
+Record where the time of an ``edit`` session goes.
+
+An edit session alternates between Roastery doing work, and Roastery waiting for
+you. With :py:obj:`roastery.config.Config.record_timings` set, ``./cli.py edit``
+times both, and appends them to ``.roastery/sessions.jsonl`` when the session
+ends. Nothing leaves your machine.
+
+*Phases* are work the tool does: loading the journal, finding the unclassified
+transactions, starting ``fzf`` and passing it the accounts (``fzf_start``), and
+the final write of the manual edits. *Prompts* are the time between showing a
+prompt and getting the answer: every ``fzf`` selection with
+:py:func:`roastery.term.select_fuzzy_search`, and every :py:func:`roastery.term.ask`.
+Everything between the end of one prompt and the start of the next is tool
+latency: what you wait for after answering.
+
+Summarise the recorded sessions with:
+
+.. code-block::
+
+   $ ./cli.py stats
+
+This prints, over all sessions, the startup cost (from the start of the session
+until the first prompt), the median and 95th percentile of the tool latency
+between prompts, the time per phase, and the number of transactions classified
+per minute.
+
+File format
+-----------
+
+One JSON object per line. Every object has the ``session``, the start time of the
+session in ISO 8601 format, and an ``event``:
+
+``phase``, ``prompt``
+  With the ``name``, the start of the event in seconds since the start of the
+  session (``at``), and its ``duration`` in seconds. Phases that run on a
+  background thread, such as intermediate writes, have ``"background": true``.
+``end``
+  With the ``duration`` of the session, and the ``counts`` of answers per kind:
+  ``classified`` and ``skipped``.
+
+API
+---
+
+.. autofunction:: session
+.. autofunction:: phase
+.. autofunction:: prompt
+.. autofunction:: count
+.. autofunction:: read_events
+.. autofunction:: summarize
+.. autofunction:: print_stats
+.. autofunction:: sessions_path
+.. autoclass:: Session
+   :members:
+.. autoclass:: Stats
+   :members:
+"""
+
+import collections
+import contextlib
+import dataclasses
+import datetime
+import json
+import math
+import threading
+import time
+import typing
+from pathlib import Path
+
+from rich import print as rprint
+from rich.table import Table
+
+from roastery import term
+from roastery.config import Config
+
+__all__ = [
+    "session",
+    "phase",
+    "prompt",
+    "count",
+    "read_events",
+    "summarize",
+    "print_stats",
+    "sessions_path",
+    "Session",
+    "Stats",
+]
+
+_active: "Session | None" = None
+"""The session that :py:func:`phase`, :py:func:`prompt`, and :py:func:`count`
+record into."""
+
+
+def sessions_path(config: Config) -> Path:
+    """File that the sessions are appended to."""
+    return config.state_dir / "sessions.jsonl"
+
+
+class Session:
+    """Timings of one session, kept in memory until it ends.
+
+    Use :py:func:`session` instead of creating one directly.
+    """
+
+    def __init__(self, config: Config, *, command: str = "edit") -> None:
+        self.path = sessions_path(config)
+        self.command = command
+        self.counts: collections.Counter[str] = collections.Counter()
+        self._events: list[dict[str, typing.Any]] = []
+        self._lock = threading.Lock()
+        self._thread = threading.get_ident()
+        now = datetime.datetime.now().astimezone()
+        self._id = now.isoformat(timespec="milliseconds")
+        self._start = time.perf_counter()
+
+    @contextlib.contextmanager
+    def _time(self, event: str, name: str) -> typing.Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            record = {
+                "event": event,
+                "name": name,
+                "at": round(start - self._start, 6),
+                "duration": round(end - start, 6),
+            }
+            if threading.get_ident() != self._thread:
+                record["background"] = True
+            with self._lock:
+                self._events.append(record)
+
+    def phase(self, name: str) -> typing.ContextManager[None]:
+        """Time work the tool does."""
+        return self._time("phase", name)
+
+    def prompt(self, name: str) -> typing.ContextManager[None]:
+        """Time waiting for an answer of the user."""
+        return self._time("prompt", name)
+
+    def count(self, name: str) -> None:
+        """Count an answer of kind ``name``."""
+        with self._lock:
+            self.counts[name] += 1
+
+    def __enter__(self) -> "Session":
+        global _active
+        _active = self
+        return self
+
+    def __exit__(self, *exc) -> None:
+        global _active
+        _active = None
+        self.write()
+
+    def write(self) -> None:
+        """Append the events of the session to :py:func:`sessions_path`."""
+        end = {
+            "event": "end",
+            "command": self.command,
+            "duration": round(time.perf_counter() - self._start, 6),
+            "counts": dict(self.counts),
+        }
+        with self._lock:
+            events = [*self._events, end]
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self.path.open("a") as f:
+            for event in events:
+                f.write(json.dumps({"session": self._id, **event}) + "\n")
+
+
+def session(
+    config: Config, *, command: str = "edit"
+) -> typing.ContextManager[Session | None]:
+    """Record a session, if :py:obj:`~roastery.config.Config.record_timings` is
+    set. Does nothing otherwise."""
+    if not config.record_timings:
+        return contextlib.nullcontext()
+    return Session(config, command=command)
+
+
+def phase(name: str) -> typing.ContextManager[None]:
+    """Time work the tool does in the active session, if any."""
+    return contextlib.nullcontext() if _active is None else _active.phase(name)
+
+
+def prompt(name: str) -> typing.ContextManager[None]:
+    """Time waiting for the user in the active session, if any."""
+    return contextlib.nullcontext() if _active is None else _active.prompt(name)
+
+
+def count(name: str) -> None:
+    """Count an answer of kind ``name`` in the active session, if any."""
+    if _active is not None:
+        _active.count(name)
+
+
+def read_events(config: Config) -> dict[str, list[dict[str, typing.Any]]]:
+    """The recorded events, grouped by session. Lines that cannot be parsed are
+    skipped, so a session that was cut off halfway does not break the others."""
+    sessions = collections.defaultdict(list)
+    try:
+        lines = sessions_path(config).read_text().splitlines()
+    except FileNotFoundError:
+        return {}
+    for line in lines:
+        try:
+            event = json.loads(line)
+        except ValueError:
+            continue
+        if isinstance(event, dict) and "session" in event:
+            sessions[event["session"]].append(event)
+    return dict(sessions)
+
+
+def _percentile(values: list[float], q: float) -> float:
+    """Nearest-rank percentile of ``values``, which must be sorted."""
+    if not values:
+        return 0.0
+    rank = min(max(math.ceil(q * len(values)), 1), len(values))
+    return values[rank - 1]
+
+
+@dataclasses.dataclass
+class Stats:
+    """Summary of the recorded sessions. Times are in seconds."""
+
+    sessions: int = 0
+    """Number of sessions."""
+
+    startup: list[float] = dataclasses.field(default_factory=list)
+    """Per session: time until the first prompt."""
+
+    latency: list[float] = dataclasses.field(default_factory=list)
+    """Tool latency between consecutive prompts, sorted."""
+
+    phases: dict[str, list[float]] = dataclasses.field(default_factory=dict)
+    """Durations of the phases on the main thread, per name."""
+
+    tool: float = 0.0
+    """Time not spent waiting for the user, over all sessions."""
+
+    wait: float = 0.0
+    """Time spent waiting for the user, over all sessions."""
+
+    counts: collections.Counter[str] = dataclasses.field(
+        default_factory=collections.Counter
+    )
+    """Answers per kind, over all sessions."""
+
+    @property
+    def items_per_minute(self) -> float:
+        """Transactions classified per minute of session time."""
+        minutes = (self.tool + self.wait) / 60
+        return self.counts["classified"] / minutes if minutes else 0.0
+
+    def latency_percentile(self, q: float) -> float:
+        """The ``q``-th quantile of :py:attr:`latency`, between 0 and 1."""
+        return _percentile(self.latency, q)
+
+
+def summarize(config: Config) -> Stats:
+    """Summarise the sessions returned by :py:func:`read_events`."""
+    stats = Stats()
+    for events in read_events(config).values():
+        ends = [e for e in events if e["event"] == "end"]
+        prompts = sorted(
+            (e for e in events if e["event"] == "prompt"), key=lambda e: e["at"]
+        )
+        stats.sessions += 1
+
+        if prompts:
+            stats.startup.append(prompts[0]["at"])
+        for prev, cur in zip(prompts, prompts[1:]):
+            stats.latency.append(max(cur["at"] - prev["at"] - prev["duration"], 0.0))
+
+        for e in events:
+            if e["event"] == "phase" and not e.get("background"):
+                stats.phases.setdefault(e["name"], []).append(e["duration"])
+
+        # A session without an end was cut off: it lasted until its last prompt.
+        if ends:
+            total = ends[-1]["duration"]
+            stats.counts.update(ends[-1].get("counts", {}))
+        elif prompts:
+            total = prompts[-1]["at"] + prompts[-1]["duration"]
+        else:
+            total = 0.0
+        wait = sum(e["duration"] for e in prompts)
+        stats.wait += wait
+        stats.tool += max(total - wait, 0.0)
+
+    stats.latency.sort()
+    return stats
+
+
+def print_stats(config: Config) -> None:
+    """Print the summary of :py:func:`summarize` to the terminal."""
+    stats = summarize(config)
+    if not stats.sessions:
+        term.warn(
+            "No sessions recorded yet",
+            "Set `record_timings=True` in the config to record edit sessions",
+        )
+        return
+
+    phases = Table("Phase", "Count", "Total (s)", "p50 (ms)", "p95 (ms)")
+    phases.title = "Phases"
+    for name, durations in sorted(stats.phases.items()):
+        durations = sorted(durations)
+        phases.add_row(
+            name,
+            str(len(durations)),
+            f"{sum(durations):.2f}",
+            f"{_percentile(durations, 0.5) * 1e3:.1f}",
+            f"{_percentile(durations, 0.95) * 1e3:.1f}",
+        )
+    rprint(phases)
+
+    startup = sorted(stats.startup)
+    total = stats.tool + stats.wait
+    term.info(
+        f"Sessions:         {stats.sessions}",
+        f"Startup:          p50 {_percentile(startup, 0.5):.2f} s, "
+        + f"max {startup[-1] if startup else 0.0:.2f} s",
+        f"Between prompts:  p50 {stats.latency_percentile(0.5) * 1e3:.0f} ms, "
+        + f"p95 {stats.latency_percentile(0.95) * 1e3:.0f} ms",
+        f"Tool / waiting:   {stats.tool:.1f} s / {stats.wait:.1f} s "
+        + f"({stats.tool / total if total else 0.0:.0%} tool)",
+        f"Classified:       {stats.counts['classified']} "
+        + f"({stats.items_per_minute:.1f} per minute), "
+        + f"skipped {stats.counts['skipped']}",
+    )
@@ -0,0 +1,255 @@
+"""
+Group payees and narrations that only differ in IDs and numbers.
+
+Banks put card numbers, transaction IDs, dates, and amounts in their narrations.
+``Card No: 1923; Transaction ID: 128938958283801`` is a different string for every
+card payment, so exact-match rules, caches, and the clusters of the edit queue
+treat each of them as unique.
+
+:py:class:`TemplateStage` is a :py:obj:`~roastery.importer.CleanFn` that gives every
+entry a *template* of its original payee and narration. The template is the text
+with volatile tokens masked by :py:func:`template_of`:
+
+.. code-block:: python
+
+   >>> template_of("Card No: 1923; Transaction ID: 128938958283801")
+   'card no: #; transaction id: #'
+
+Templates that are nearly the same, such as ``betaalautomaat <time> pasnr. #`` and
+``betaalautomaat <date> <time> pasnr. #``, are then clustered, and every entry gets
+the template that represents its cluster. Clustering uses MinHash signatures and
+locality-sensitive hashing, see :py:class:`TemplateIndex`, so each template is only
+compared with a handful of candidates instead of with every other template.
+
+Run the stage before your own rules, which can then match on
+:py:obj:`roastery.importer.Entry.narration_template` and
+:py:obj:`roastery.importer.Entry.payee_template`:
+
+.. code-block:: python
+
+   from roastery.rules import RuleProfiler
+   from roastery.templates import TemplateStage
+
+   def rule_card(entry: Entry) -> None:
+       if entry.narration_template == "card no: #; transaction id: #":
+           entry.narration.cleaned = "Card payment"
+
+   with TemplateStage(config) as templates:
+       clean = RuleProfiler([templates, rule_card])
+       import_csv(csv_file=..., config=config, extract=extract_demo, clean=clean)
+
+The clusters are stored in ``.roastery/templates.json`` when the stage exits, so
+a template keeps the same representative across imports. With ``meta=True``, the
+templates are also stored in the metadata of the transactions, as
+``payee_template`` and ``narration_template``. The edit queue then has them too;
+``./cli.py export --sort template`` groups similar transactions together.
+
+API
+---
+
+.. autofunction:: template_of
+.. autoclass:: TemplateStage
+   :members:
+.. autoclass:: TemplateIndex
+   :members:
+"""
+
+import hashlib
+import json
+import random
+import re
+from pathlib import Path
+
+from roastery import atomic
+from roastery.config import Config
+from roastery.importer import Entry
+
+__all__ = [
+    "template_of",
+    "TemplateStage",
+    "TemplateIndex",
+]
+
+# Version of the file format. Bump this when changing what is stored.
+_FORMAT_VERSION = 1
+
+_MASKS = [
+    (re.compile(r"\b[A-Z]{2}\d{2}[A-Z0-9]{11,30}\b"), "<iban>"),
+    (re.compile(r"\b\d{1,4}[-/.]\d{1,2}[-/.]\d{1,4}\b"), "<date>"),
+    (re.compile(r"\b\d{1,2}:\d{2}(?::\d{2})?\b"), "<time>"),
+    # Any other token with a digit in it: amounts, IDs, reference numbers.
+    (re.compile(r"\b\w*\d[\w.,:/-]*"), "#"),
+    (re.compile(r"#(?:\s+#)+"), "#"),
+    (re.compile(r"\s+"), " "),
+]
+
+_NUM_PERM = 32
+_BANDS = 8
+_ROWS = _NUM_PERM // _BANDS
+_PRIME = (1 << 61) - 1
+
+_rng = random.Random(0)
+_PERMUTATIONS = [
+    (_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(_NUM_PERM)
+]
+"""Hash functions ``(a * x + b) % _PRIME`` of the MinHash signature. Seeded, so
+signatures are the same on every run."""
+
+
+def template_of(text: str) -> str:
+    """``text`` with IBANs, dates, times, and tokens containing digits masked,
+    whitespace collapsed, and case folded."""
+    for pattern, replacement in _MASKS:
+        text = pattern.sub(replacement, text)
+    return text.strip().casefold()
+
+
+def _signature(template: str) -> tuple[int, ...]:
+    padded = f" {template} "
+    shingles = {padded[i : i + 3] for i in range(max(len(padded) - 2, 1))}
+    hashes = [
+        int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest())
+        for s in shingles
+    ]
+    return tuple(min((a * h + b) % _PRIME for h in hashes) for a, b in _PERMUTATIONS)
+
+
+def _similarity(a: tuple[int, ...], b: tuple[int, ...]) -> float:
+    """Estimated Jaccard similarity of the shingles of two templates."""
+    return sum(x == y for x, y in zip(a, b)) / _NUM_PERM
+
+
+class TemplateIndex:
+    """Clusters of near-duplicate templates.
+
+    Only the representative of each cluster is indexed. Its MinHash signature is
+    split into bands, and each band is a key into a dictionary of buckets. A new
+    template is only compared with the representatives that share at least one
+    bucket with it. It joins the most similar one, if their estimated similarity is
+    at least ``threshold``, and becomes the representative of a new cluster
+    otherwise.
+
+    :param threshold: Minimum estimated Jaccard similarity of the character
+      trigrams of two templates in the same cluster.
+    """
+
+    def __init__(self, *, threshold: float = 0.8) -> None:
+        self.threshold = threshold
+        self._canonical: dict[str, str] = {}
+        self._signatures: dict[str, tuple[int, ...]] = {}
+        self._buckets: dict[tuple[int, tuple[int, ...]], list[str]] = {}
+
+    def __len__(self) -> int:
+        """Number of clusters."""
+        return len(self._signatures)
+
+    def _bands(self, signature: tuple[int, ...]) -> list[tuple[int, tuple[int, ...]]]:
+        return [
+            (band, signature[band * _ROWS : (band + 1) * _ROWS])
+            for band in range(_BANDS)
+        ]
+
+    def canonical(self, template: str) -> str:
+        """The representative of the cluster of ``template``, adding it if needed."""
+        if (canonical := self._canonical.get(template)) is not None:
+            return canonical
+
+        signature = _signature(template)
+        keys = self._bands(signature)
+        best, best_similarity = template, self.threshold
+        for key in keys:
+            for candidate in self._buckets.get(key, ()):
+                similarity = _similarity(signature, self._signatures[candidate])
+                if similarity >= best_similarity:
+                    best, best_similarity = candidate, similarity
+
+        if best == template:
+            self._signatures[template] = signature
+            for key in keys:
+                self._buckets.setdefault(key, []).append(template)
+
+        self._canonical[template] = best
+        return best
+
+    def save(self, path: Path) -> None:
+        """Write the clusters to ``path``, replacing the previous version."""
+        atomic.write_json(
+            path,
+            {
+                "version": _FORMAT_VERSION,
+                "threshold": self.threshold,
+                "templates": self._canonical,
+            },
+        )
+
+    @classmethod
+    def load(cls, path: Path, *, threshold: float = 0.8) -> "TemplateIndex":
+        """Read the clusters written by :py:meth:`save`. Returns an empty index if
+        the file does not exist, or was written with a different ``threshold``."""
+        index = cls(threshold=threshold)
+        try:
+            stored = json.loads(path.read_text())
+        except (FileNotFoundError, ValueError):
+            return index
+
+        key = (stored.get("version"), stored.get("threshold"))
+        if key != (_FORMAT_VERSION, threshold):
+            return index
+
+        templates = stored["templates"]
+        for canonical in sorted(set(templates.values())):
+            index._canonical[canonical] = canonical
+            index._signatures[canonical] = signature = _signature(canonical)
+            for key in index._bands(signature):
+                index._buckets.setdefault(key, []).append(canonical)
+        index._canonical.update(templates)
+        return index
+
+
+class TemplateStage:
+    """A :py:obj:`~roastery.importer.CleanFn` that sets the templates of an entry.
+
+    Use it as a context manager to store the clusters when you are done.
+
+    :param config: Load and store the clusters in the state directory of ``config``.
+      Without it, the clusters are only kept in memory.
+    :param meta: Also store the templates in the metadata of the entry.
+    :param threshold: See :py:class:`TemplateIndex`.
+    """
+
+    def __init__(
+        self,
+        config: Config | None = None,
+        *,
+        meta: bool = False,
+        threshold: float = 0.8,
+    ) -> None:
+        self.path = None if config is None else config.state_dir / "templates.json"
+        self.meta = meta
+        self.index = (
+            TemplateIndex(threshold=threshold)
+            if self.path is None
+            else TemplateIndex.load(self.path, threshold=threshold)
+        )
+
+    def _template(self, text: str | None) -> str | None:
+        return None if text is None else self.index.canonical(template_of(text))
+
+    def __call__(self, entry: Entry) -> None:
+        entry.payee_template = self._template(entry.payee.original)
+        entry.narration_template = self._template(entry.narration.original)
+        if self.meta:
+            for key in ("payee_template", "narration_template"):
+                if (val := getattr(entry, key)) is not None:
+                    entry.meta[key] = val
+
+    def __enter__(self) -> "TemplateStage":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.save()
+
+    def save(self) -> None:
+        """Store the clusters, if the stage was created with a ``config``."""
+        if self.path is not None:
+            self.index.save(self.path)
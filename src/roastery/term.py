@@ -18,7 +18,9 @@ User input
 .. autofunction:: roastery.term.select_fuzzy_search
 """
 
+import contextlib
 import subprocess
+from typing import ContextManager
 
 from prompt_toolkit import prompt
 from prompt_toolkit.enums import EditingMode
@@ -126,6 +128,8 @@ def select_fuzzy_search(
     prompt: str,
     *,
     options: list[str],
+    starting: ContextManager | None = None,
+    waiting: ContextManager | None = None,
 ) -> str:
     """Prompt the user to choose from a set of `options` using fuzzy search.
 
@@ -133,16 +137,25 @@ def select_fuzzy_search(
 
     :param prompt: Search prompt to set in `fzf`.
     :param options: List of options that the user can choose from.
+    :param starting: Context to start `fzf` and pass it the options in, for
+      example to time it.
+    :param waiting: Context to wait for the selection of the user in.
 
     :raises KeyboardInterrupt: If the user did not confirm the selection.
     """
     fzf_input = "\n".join(options)
     fzf_cmd = ["fzf", "--height", "~30%", f"--prompt=| {prompt} > "]
 
-    fzf_proc = subprocess.run(
-        fzf_cmd, input=fzf_input, text=True, stdout=subprocess.PIPE
-    )
-    fzf_choice = fzf_proc.stdout.strip()
+    with starting or contextlib.nullcontext():
+        fzf_proc = subprocess.Popen(
+            fzf_cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True
+        )
+        # fzf exits without reading all options if the user aborts right away.
+        with contextlib.suppress(BrokenPipeError), fzf_proc.stdin as stdin:
+            stdin.write(fzf_input)
+
+    with waiting or contextlib.nullcontext(), fzf_proc:
+        fzf_choice = fzf_proc.stdout.read().strip()
 
     if fzf_choice == "":
         error("User aborted selection")
@@ -0,0 +1,158 @@
+"""
+Match transfers between your own accounts.
+
+A transfer from your checking account to your credit card shows up in the
+statements of both accounts. Without help, both sides end up in
+``Expenses:Unknown`` and ``Income:Unknown``, and have to be classified by hand.
+:py:func:`match_transfers` finds these pairs across the entries of multiple
+statements:
+
+.. code-block:: python
+
+   import itertools
+   from roastery.importer import iter_entries, write_entries
+   from roastery.transfers import match_transfers
+
+   statements = {
+       Path("statements/asn.beancount"): list(iter_entries(csv_file=..., config=config, extract=extract_asn)),
+       Path("statements/cc.beancount"): list(iter_entries(csv_file=..., config=config, extract=extract_cc)),
+   }
+   match_transfers(itertools.chain(*statements.values()))
+   for beancount_file, entries in statements.items():
+       write_entries(entries, config=config, beancount_file=beancount_file)
+
+Two entries are a transfer when:
+
+- They have a different :py:obj:`~roastery.importer.Entry.asset_account`.
+- One is outgoing, the other incoming, for the same absolute amount.
+- Their dates are at most ``max_days`` apart.
+- Neither has an account yet, from a manual edit or the ``clean`` function.
+
+When an entry has multiple candidates, the one closest in date is chosen.
+
+Both entries of a pair get the same link, for example ``^transfer-3f2a9c0d1b7e``,
+so Fava shows them together. Their account is set to a clearing account,
+``Assets:Transfers`` by default. Each side is still a separate transaction in its
+own beancount file, so using the other asset account directly would count the
+transfer twice. The balance of the clearing account is zero once both sides are
+imported; a non-zero balance points at a transfer that only one side of was
+imported.
+
+Incoming entries are indexed by currency, amount, date, and asset account, and
+are removed from the index once they are matched. Finding the match of an entry
+takes one lookup per day in the window, so matching takes ``O(n log n)`` time for
+``n`` entries, for the sorting, instead of comparing all pairs. This holds even if
+many transfers have the same amount.
+
+Roastery doesn't call :py:func:`match_transfers` by itself: the ``import`` command
+imports every statement on its own, and transfers need the entries of several
+statements at once. Call it from your ``cli.py`` as in the example above, for
+example in a command of your own next to the ones of
+:py:func:`roastery.cli.make_cli`.
+
+API
+---
+
+.. autofunction:: match_transfers
+.. autoclass:: Transfer
+   :members:
+"""
+
+import datetime
+import hashlib
+import typing
+from collections import defaultdict, deque
+from typing import Iterable
+
+from roastery.importer import Entry
+
+__all__ = [
+    "match_transfers",
+    "Transfer",
+]
+
+
+class Transfer(typing.NamedTuple):
+    """A pair of entries that was matched by :py:func:`match_transfers`."""
+
+    outgoing: Entry
+    """The entry with the negative amount."""
+
+    incoming: Entry
+    """The entry with the positive amount."""
+
+    link: str
+    """Link that was added to both entries."""
+
+
+def _unclassified(entry: Entry) -> bool:
+    return entry.account.edited is None and entry.account.cleaned is None
+
+
+def match_transfers(
+    entries: Iterable[Entry],
+    *,
+    max_days: int = 3,
+    account: str = "Assets:Transfers",
+) -> list[Transfer]:
+    """Find transfers between asset accounts in ``entries``, and classify them.
+
+    The entries of matched pairs are updated in place: a shared link is added, and
+    the cleaned account is set to ``account``.
+
+    :param entries: Entries of all statements to match transfers between, before
+      they are written.
+    :param max_days: Maximum number of days between both sides of a transfer.
+    :param account: Clearing account to use as the account of both sides.
+    :return: The matched pairs, in order of the date of the outgoing entry.
+    """
+    outgoing = []
+    # Per amount and date, per asset account: the incoming entries by digest.
+    incoming = defaultdict(lambda: defaultdict(list))
+    for entry in entries:
+        if not _unclassified(entry) or entry.amount.number == 0:
+            continue
+        if entry.amount.number < 0:
+            outgoing.append(entry)
+        else:
+            key = (entry.amount.number, entry.amount.currency, entry.date)
+            incoming[key][entry.asset_account].append(entry)
+
+    index = {
+        key: {
+            asset_account: deque(sorted(candidates, key=lambda e: e.digest))
+            for asset_account, candidates in by_account.items()
+        }
+        for key, by_account in incoming.items()
+    }
+
+    # The closest day first, and the earlier day of two that are as close.
+    offsets = sorted(range(-max_days, max_days + 1), key=lambda d: (abs(d), d))
+    transfers = []
+
+    for entry in sorted(outgoing, key=lambda e: (e.date, e.digest)):
+        best = None
+        for offset in offsets:
+            date = entry.date + datetime.timedelta(days=offset)
+            by_account = index.get((-entry.amount.number, entry.amount.currency, date))
+            if by_account is None:
+                continue
+            heads = [
+                (candidates[0].digest, asset_account)
+                for asset_account, candidates in by_account.items()
+                if candidates and asset_account != entry.asset_account
+            ]
+            if heads:
+                best = by_account[min(heads)[1]].popleft()
+                break
+        if best is None:
+            continue
+
+        key = hashlib.md5(f"{entry.digest}:{best.digest}".encode("utf-8")).hexdigest()
+        link = f"transfer-{key[:12]}"
+        for side in (entry, best):
+            side.links.add(link)
+            side.account.cleaned = account
+        transfers.append(Transfer(outgoing=entry, incoming=best, link=link))
+
+    return transfers
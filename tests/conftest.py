@@ -3,9 +3,50 @@ from typing import Iterator
 
 import pytest
 
-from roastery import Config
+from roastery import Config, formats, import_csv
 
 
 @pytest.fixture()
 def config(tmp_path: Path) -> Iterator[Config]:
     yield Config.with_defaults(project_root=tmp_path)
+
+
+@pytest.fixture
+def demo_csv(config: Config) -> Iterator[Path]:
+    config.statements_dir.mkdir(exist_ok=True)
+    csv_file = config.statements_dir / "test.csv"
+
+    csv_file.write_text("""\
+"date";"payee";"description";"amount";"type";"balance_after"
+"2024-05-28";"Employer";"Salary May";"3500.00";"TSFR";"4743.12"
+"2024-05-29";"Supermarket Inc.";"Card No: 1923; Transaction ID: 128938958283801";"-42.32";"CARD";"4700.80"
+"2024-05-30";"Housing Inc.";"Rent June";"-1000.00";"SEPA";"3700.80"
+""")
+
+    yield csv_file
+
+
+@pytest.fixture
+def journal(config: Config, demo_csv: Path) -> Iterator[Path]:
+    """A main journal that includes the imported demo CSV."""
+    import_csv(
+        config=config,
+        csv_file=demo_csv,
+        extract=formats.extract_demo,
+        csv_args=dict(delimiter=";"),
+    )
+    config.journal_path.parent.mkdir(exist_ok=True)
+    config.journal_path.write_text("""\
+option "operating_currency" "EUR"
+
+2024-01-01 open Assets:Bank
+2024-01-01 open Income:Salary
+2024-01-01 open Income:Unknown
+2024-01-01 open Expenses:Groceries
+2024-01-01 open Expenses:Unknown
+2024-01-01 open Equity:Opening-Balances
+
+include "../statements/test.beancount"
+""")
+
+    yield config.journal_path
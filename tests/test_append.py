@@ -0,0 +1,108 @@
+from pathlib import Path
+
+import pytest
+from beancount import loader
+
+from roastery import Config, catalog, formats, import_csv
+from roastery.append import import_csv_append
+
+ROWS = [
+    '"2024-05-31";"Bakery";"Bread";"-3.10";"CARD";"3697.70"\n',
+    '"2024-06-01";"Employer";"Bonus";"100.00";"TSFR";"3797.70"\n',
+]
+
+
+def append(config: Config, demo_csv: Path) -> bool:
+    return import_csv_append(
+        config=config,
+        csv_file=demo_csv,
+        extract=formats.extract_demo,
+        csv_args=dict(delimiter=";"),
+    )
+
+
+def payees(demo_csv: Path) -> list[str]:
+    entries, errors, _ = loader.load_file(demo_csv.with_suffix(".beancount"))
+    return [e.payee for e in entries]
+
+
+def test_append(config: Config, demo_csv: Path) -> None:
+    assert not append(config, demo_csv)
+    full = demo_csv.with_suffix(".beancount").read_text()
+
+    with demo_csv.open("a") as f:
+        f.writelines(ROWS)
+    assert append(config, demo_csv)
+    assert payees(demo_csv) == [
+        "Employer",
+        "Supermarket Inc.",
+        "Housing Inc.",
+        "Bakery",
+        "Employer",
+    ]
+
+    # Nothing new.
+    assert append(config, demo_csv)
+    assert len(payees(demo_csv)) == 5
+
+    # The same as a full import.
+    appended = demo_csv.with_suffix(".beancount").read_text()
+    import_csv(
+        config=config,
+        csv_file=demo_csv,
+        extract=formats.extract_demo,
+        csv_args=dict(delimiter=";"),
+    )
+    assert demo_csv.with_suffix(".beancount").read_text() == appended
+    assert appended.startswith(full)
+
+
+@pytest.mark.parametrize(
+    "change",
+    [
+        lambda text: text.replace("Rent June", "Rent July"),
+        lambda text: text.replace("Salary May", "Salary June"),
+        lambda text: text.replace('"balance_after"', '"balance_after";"note"'),
+    ],
+)
+def test_changed_prefix(config: Config, demo_csv: Path, change) -> None:
+    append(config, demo_csv)
+    demo_csv.write_text(change(demo_csv.read_text()) + ROWS[0])
+
+    assert not append(config, demo_csv)
+    assert len(payees(demo_csv)) == 4
+
+
+def test_changed_beancount_file(config: Config, demo_csv: Path) -> None:
+    append(config, demo_csv)
+    with demo_csv.with_suffix(".beancount").open("a") as f:
+        f.write("; Comment\n")
+    with demo_csv.open("a") as f:
+        f.write(ROWS[0])
+
+    assert not append(config, demo_csv)
+    assert len(payees(demo_csv)) == 4
+
+
+def test_no_assertions_between_chunks(tmp_path: Path, demo_csv: Path) -> None:
+    config = Config.with_defaults(project_root=tmp_path, assert_balances=True)
+    append(config, demo_csv)
+    with demo_csv.open("a") as f:
+        f.writelines(ROWS)
+    assert append(config, demo_csv)
+
+    # The assertion of the first import stays, the appended rows come after it.
+    text = demo_csv.with_suffix(".beancount").read_text()
+    assert text.count(" balance ") == 1
+    assert text.index(" balance ") < text.index('"Bakery"')
+
+
+def test_full_import_is_cataloged(config: Config, demo_csv: Path) -> None:
+    assert not append(config, demo_csv)
+    info = catalog.lookup(config, demo_csv, extract=formats.extract_demo)
+    assert info.rows == 3
+
+    with demo_csv.open("a") as f:
+        f.writelines(ROWS)
+    assert append(config, demo_csv)
+    assert len(payees(demo_csv)) == 5
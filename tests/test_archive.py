@@ -0,0 +1,110 @@
+import datetime
+from decimal import Decimal
+from pathlib import Path
+
+import pytest
+from beancount.core import data
+from typer.testing import CliRunner
+
+from roastery import Config, archive, formats, import_csv, loading, make_cli
+from roastery.importer import Entry
+
+
+def _classify(entry: Entry) -> None:
+    entry.account.cleaned = "Income:Salary" if entry.is_income else "Expenses:Groceries"
+
+
+@pytest.fixture
+def classified(config: Config, journal: Path, demo_csv: Path) -> Path:
+    """The demo journal, without any unknown accounts."""
+    import_csv(
+        config=config,
+        csv_file=demo_csv,
+        extract=formats.extract_demo,
+        clean=_classify,
+        csv_args=dict(delimiter=";"),
+    )
+    return journal
+
+
+def _balance(entries: list[data.Directive], account: str) -> Decimal:
+    return sum(
+        posting.units.number
+        for entry in data.filter_txns(entries)
+        for posting in entry.postings
+        if posting.account == account
+    )
+
+
+def test_refuses_unknown_accounts(config: Config, journal: Path) -> None:
+    before = journal.read_text()
+    with pytest.raises(archive.ArchiveError) as exc_info:
+        archive.archive_year(config, 2024)
+
+    assert len(exc_info.value.problems) == 3
+    assert "Expenses:Unknown" in exc_info.value.problems[1]
+    assert journal.read_text() == before
+    assert archive.archived_years(config) == []
+
+
+def test_refuses_current_year(config: Config, classified: Path) -> None:
+    with pytest.raises(archive.ArchiveError):
+        archive.archive_year(config, datetime.date.today().year)
+
+
+def test_archive(config: Config, classified: Path, demo_csv: Path) -> None:
+    [target] = archive.archive_year(config, 2024)
+
+    assert target == archive.archive_dir(config) / "2024" / "test.beancount"
+    assert not demo_csv.with_suffix(".beancount").exists()
+    assert archive.archived_years(config) == [2024]
+    assert 'include "../statements/test.beancount"' not in classified.read_text()
+    assert 'include "archive/opening.beancount"' in classified.read_text()
+
+    entries, errors, _ = loading.load_journal(config)
+    assert errors == []
+    assert not any("digest" in entry.meta for entry in entries)
+    assert _balance(entries, "Assets:Bank") == Decimal("2457.68")
+    assert _balance(entries, "Equity:Earnings:Previous") == Decimal("-2457.68")
+
+    entries, errors, _ = loading.load_journal(config, history=True)
+    assert errors == []
+    assert len([entry for entry in entries if "digest" in entry.meta]) == 3
+    assert _balance(entries, "Assets:Bank") == Decimal("2457.68")
+    assert _balance(entries, "Equity:Opening-Balances") == 0
+
+    with pytest.raises(archive.ArchiveError):
+        archive.archive_year(config, 2024)
+
+
+def test_failed_write_is_undone(
+    config: Config, classified: Path, demo_csv: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    before = classified.read_text()
+    replace = Path.replace
+
+    def failing_replace(self: Path, target: Path) -> Path:
+        if Path(target) == config.journal_path:
+            raise OSError("disk full")
+        return replace(self, target)
+
+    monkeypatch.setattr(Path, "replace", failing_replace)
+    with pytest.raises(OSError):
+        archive.archive_year(config, 2024)
+
+    assert demo_csv.with_suffix(".beancount").exists()
+    assert classified.read_text() == before
+    assert archive.archived_years(config) == []
+    assert not archive.opening_path(config).exists()
+    assert not list(archive.archive_dir(config).rglob("*.beancount"))
+    assert not list(archive.archive_dir(config).rglob(".*.tmp"))
+
+
+def test_cli(config: Config, classified: Path) -> None:
+    cli = make_cli(config)
+    result = CliRunner().invoke(cli, ["archive", "2024"])
+    assert result.exit_code == 0, result.output
+    assert "do_not_import_before" in result.output
+
+    result = CliRunner().invoke(cli, ["check", "--history"])
+    assert result.exit_code == 0, result.output
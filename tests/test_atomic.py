@@ -0,0 +1,26 @@
+import json
+from pathlib import Path
+
+import pytest
+
+from roastery import atomic
+
+
+def test_write_json(tmp_path: Path) -> None:
+    path = tmp_path / "state" / "edits.json"
+    atomic.write_json(path, {"a": 1})
+    assert json.loads(path.read_text()) == {"a": 1}
+    assert path.read_text().endswith("}\n")
+
+
+def test_failed_write_keeps_old_contents(tmp_path: Path) -> None:
+    path = tmp_path / "edits.json"
+    atomic.write_text(path, "old\n")
+
+    with pytest.raises(RuntimeError):
+        with atomic.replacing(path) as f:
+            f.write("half")
+            raise RuntimeError
+
+    assert path.read_text() == "old\n"
+    assert not atomic.temporary_path(path).exists()
@@ -0,0 +1,86 @@
+from decimal import Decimal
+from pathlib import Path
+
+import pytest
+
+from roastery import Config, formats, import_csv
+from roastery.importer import iter_entries
+
+pytest.importorskip("numpy")
+balances = pytest.importorskip("roastery.balances")
+
+HEADER = '"date";"payee";"description";"amount";"type";"balance_after"\n'
+
+ROWS = [
+    '"2024-05-28";"Employer";"Salary May";"3500.00";"TSFR";"4743.12"\n',
+    '"2024-05-29";"Supermarket Inc.";"Groceries";"-42.32";"CARD";"4700.80"\n',
+    '"2024-05-30";"Housing Inc.";"Rent June";"-1000.00";"SEPA";"3700.80"\n',
+    '"2024-05-31";"Bakery";"Bread";"-3.20";"CARD";"3697.60"\n',
+]
+
+
+def _checker(config: Config, rows: list[str]) -> "balances.BalanceChecker":
+    csv_file = config.statements_dir / "balances.csv"
+    csv_file.parent.mkdir(exist_ok=True)
+    csv_file.write_text(HEADER + "".join(rows))
+
+    checker = balances.BalanceChecker()
+    for entry in iter_entries(
+        csv_file=csv_file,
+        config=config,
+        extract=formats.extract_demo,
+        csv_args=dict(delimiter=";"),
+    ):
+        checker.add(entry)
+    return checker
+
+
+def test_continuous_statement(config: Config) -> None:
+    assert _checker(config, ROWS).check() == []
+
+
+def test_descending_statement(config: Config) -> None:
+    assert _checker(config, ROWS[::-1]).check() == []
+
+
+def test_gap(config: Config) -> None:
+    [brk] = _checker(config, [ROWS[0], ROWS[2], ROWS[3]]).check()
+    assert brk.kind == "gap"
+    assert brk.row == 2
+    assert brk.missing == Decimal("-42.32")
+    assert brk.asset_account == "Assets:Bank"
+
+
+def test_overlap(config: Config) -> None:
+    [brk] = _checker(config, [*ROWS[:3], *ROWS[1:]]).check()
+    assert brk.kind == "overlap"
+    assert brk.row == 4
+    assert brk.missing == Decimal("1042.32")
+
+
+def test_assertions(config: Config) -> None:
+    [assertion] = _checker(config, ROWS[::-1]).assertions()
+    assert str(assertion.date) == "2024-06-01"
+    assert assertion.account == "Assets:Bank"
+    assert str(assertion.amount) == "3697.60 EUR"
+
+
+def test_import_warns_and_asserts(
+    tmp_path: Path, demo_csv: Path, capsys: pytest.CaptureFixture
+) -> None:
+    config = Config.with_defaults(
+        project_root=tmp_path, check_balances=True, assert_balances=True
+    )
+    lines = demo_csv.read_text().splitlines(keepends=True)
+    demo_csv.write_text("".join([lines[0], lines[1], lines[3]]))
+
+    import_csv(
+        csv_file=demo_csv,
+        config=config,
+        extract=formats.extract_demo,
+        csv_args=dict(delimiter=";"),
+    )
+
+    assert "gap of -42.32 EUR before row 2" in capsys.readouterr().out
+    last = demo_csv.with_suffix(".beancount").read_text().split("\n\n")[-2]
+    assert last.split() == ["2024-05-31", "balance", "Assets:Bank", "3700.80", "EUR"]
@@ -0,0 +1,131 @@
+import csv
+import datetime
+import io
+import json
+from pathlib import Path
+
+import pytest
+
+from roastery import Config, bulk
+from roastery.server import JournalState, LocalClient
+
+
+def export(config: Config, **kwargs) -> list[dict[str, str]]:
+    f = io.StringIO()
+    bulk.export_queue(config, f, **kwargs)
+    f.seek(0)
+    return list(csv.DictReader(f, delimiter="\t"))
+
+
+def apply(config: Config, rows: list[dict[str, str]], **kwargs) -> tuple[int, int]:
+    f = io.StringIO()
+    writer = csv.DictWriter(f, fieldnames=bulk.COLUMNS, delimiter="\t")
+    writer.writeheader()
+    writer.writerows(rows)
+    f.seek(0)
+    return bulk.apply_queue(config, f, **kwargs)
+
+
+def test_export(config: Config, journal: Path) -> None:
+    rows = export(config)
+    assert [r["payee"] for r in rows] == [
+        "Employer",
+        "Supermarket Inc.",
+        "Housing Inc.",
+    ]
+    assert rows[0]["amount"] == "3500.00"
+    assert rows[1]["amount"] == "-42.32"
+    assert rows[0]["account"] == ""
+
+
+def test_export_filters(config: Config, journal: Path) -> None:
+    rows = export(config, start=datetime.date(2024, 5, 29), payee="INC", sort="amount")
+    assert [r["payee"] for r in rows] == ["Supermarket Inc.", "Housing Inc."]
+
+
+def test_export_suggestions(config: Config, journal: Path) -> None:
+    config.manual_edits_path.parent.mkdir(exist_ok=True)
+    config.manual_edits_path.write_text(
+        json.dumps(
+            {"old": {"account": "Expenses:Groceries", "payee": "Supermarket Inc."}}
+        )
+    )
+    rows = export(config)
+    assert [r["suggested_account"] for r in rows] == ["", "Expenses:Groceries", ""]
+
+
+def test_apply(config: Config, journal: Path) -> None:
+    rows = export(config)
+    rows[0]["account"] = "Income:Salary"
+    rows[1]["account"] = "Skip"
+    rows[2]["payee"] = "Landlord"
+
+    assert apply(config, rows) == (1, 1)
+    edits = json.loads(config.manual_edits_path.read_text())
+    assert edits == {
+        rows[0]["digest"]: {
+            "account": "Income:Salary",
+            "payee": "Employer",
+            "narration": "Salary May",
+        }
+    }
+    assert json.loads(config.skip_path.read_text()) == [rows[1]["digest"]]
+
+    # Classified transactions are no longer exported.
+    assert [r["payee"] for r in export(config)] == ["Housing Inc."]
+
+
+def test_apply_is_idempotent(config: Config, journal: Path) -> None:
+    rows = export(config)
+    rows[0]["account"] = "Income:Salary"
+    rows[1]["account"] = "Skip"
+    assert apply(config, rows) == (1, 1)
+
+    # An interrupted apply stored the manual edits, but not the skip list.
+    config.skip_path.unlink()
+    assert apply(config, rows) == (1, 1)
+    assert json.loads(config.skip_path.read_text()) == [rows[1]["digest"]]
+
+    rows[0]["account"] = "Expenses:Groceries"
+    with pytest.raises(bulk.QueueError):
+        apply(config, rows)
+
+
+def test_apply_empty_cells(config: Config, journal: Path) -> None:
+    rows = export(config)
+    rows[1]["account"] = "Expenses:Groceries"
+    rows[1]["payee"] = rows[1]["narration"] = ""
+
+    assert apply(config, rows) == (1, 0)
+    edits = json.loads(config.manual_edits_path.read_text())
+    assert edits == {rows[1]["digest"]: {"account": "Expenses:Groceries"}}
+
+
+def test_apply_invalid(config: Config, journal: Path) -> None:
+    rows = export(config)
+    rows[0]["account"] = "Income:Salray"
+    rows[1]["account"] = "Skip"
+    rows[2]["digest"] = "0" * 32
+    rows[2]["account"] = "Expenses:Groceries"
+
+    with pytest.raises(bulk.QueueError) as e:
+        apply(config, rows)
+
+    assert e.value.problems == [
+        "Line 2: unknown account Income:Salray",
+        f"Line 4: unknown or already classified digest {'0' * 32}",
+    ]
+    assert not config.manual_edits_path.exists()
+    assert not config.skip_path.exists()
+
+
+def test_apply_with_client(config: Config, journal: Path) -> None:
+    client = LocalClient(JournalState(config))
+    rows = export(config, client=client)
+    rows[2]["account"] = "Expenses:Groceries"
+
+    assert apply(config, rows, client=client) == (1, 0)
+    assert [item.payee for item in client.unprocessed()] == [
+        "Employer",
+        "Supermarket Inc.",
+    ]
@@ -0,0 +1,92 @@
+import importlib
+from pathlib import Path
+
+import pytest
+
+from roastery import Config, formats
+from roastery.cache import cache_path
+from roastery.importer import iter_entries
+
+
+def test_cache_roundtrip(config: Config, demo_csv: Path) -> None:
+    config.cache_entries = True
+    path = _cache_path(config, demo_csv)
+
+    first = _entries(config, demo_csv, formats.extract_demo)
+    assert path.exists()
+
+    calls = []
+
+    def extract_demo(row):
+        calls.append(row)
+        return formats.extract_demo(row)
+
+    # A different extract function has a different cache file.
+    _entries(config, demo_csv, extract_demo)
+    assert len(calls) == 3
+
+    calls.clear()
+    second = _entries(config, demo_csv, extract_demo)
+    assert calls == []
+    assert first == second
+
+
+def test_cache_invalidated_by_content(config: Config, demo_csv: Path) -> None:
+    config.cache_entries = True
+    before = _cache_path(config, demo_csv)
+    _entries(config, demo_csv, formats.extract_demo)
+
+    demo_csv.write_text(demo_csv.read_text().replace("Employer", "Boss"))
+    assert _cache_path(config, demo_csv) != before
+    assert _entries(config, demo_csv, formats.extract_demo)[0].payee.value == "Boss"
+
+
+def test_cache_invalidated_by_module(
+    config: Config, demo_csv: Path, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.syspath_prepend(str(tmp_path))
+    module = tmp_path / "my_formats.py"
+    module.write_text(
+        "from roastery import formats\n\n"
+        + "def extract(row):\n"
+        + "    return formats.extract_demo(row)\n"
+    )
+    my_formats = importlib.import_module("my_formats")
+    before = cache_path(config=config, csv_file=demo_csv, extract=my_formats.extract)
+
+    module.write_text(module.read_text() + "\n\nHELPER = 1\n")
+    after = cache_path(config=config, csv_file=demo_csv, extract=my_formats.extract)
+    assert after != before
+
+
+def test_cache_not_written_when_not_consumed(config: Config, demo_csv: Path) -> None:
+    config.cache_entries = True
+    entries = iter_entries(
+        config=config,
+        csv_file=demo_csv,
+        extract=formats.extract_demo,
+        csv_args=dict(delimiter=";"),
+    )
+    next(entries)
+    entries.close()
+    assert not _cache_path(config, demo_csv).exists()
+
+
+def _cache_path(config: Config, csv_file: Path) -> Path:
+    return cache_path(
+        config=config,
+        csv_file=csv_file,
+        extract=formats.extract_demo,
+        csv_args=dict(delimiter=";"),
+    )
+
+
+def _entries(config: Config, csv_file: Path, extract) -> list:
+    return list(
+        iter_entries(
+            config=config,
+            csv_file=csv_file,
+            extract=extract,
+            csv_args=dict(delimiter=";"),
+        )
+    )
@@ -0,0 +1,156 @@
+import dataclasses
+import datetime
+import os
+from pathlib import Path
+
+import pytest
+from typer.testing import CliRunner
+
+from roastery import Config, catalog, formats, import_csv, importer, make_cli
+from roastery.registry import default_registry
+from roastery.sources import Source
+
+
+def import_demo(config: Config, csv_file: Path) -> None:
+    import_csv(
+        config=config,
+        csv_file=csv_file,
+        extract=formats.extract_demo,
+        csv_args=dict(delimiter=";"),
+    )
+
+
+def test_recorded(config: Config, demo_csv: Path) -> None:
+    assert catalog.lookup(config, demo_csv) is None
+    import_demo(config, demo_csv)
+
+    info = catalog.lookup(config, demo_csv)
+    assert info.rows == 3
+    assert (info.min_date, info.max_date) == (
+        datetime.date(2024, 5, 28),
+        datetime.date(2024, 5, 30),
+    )
+    assert info.order == "ascending"
+    assert info.format == "roastery.formats.extract_demo"
+
+    demo_csv.write_text(demo_csv.read_text() + '"2024-05-01";"A";"B";"1.00";"X";"1"\n')
+    assert catalog.lookup(config, demo_csv) is None
+    import_demo(config, demo_csv)
+    assert catalog.lookup(config, demo_csv).order is None
+
+
+def test_same_size_and_mtime(config: Config, demo_csv: Path) -> None:
+    import_demo(config, demo_csv)
+    stat = demo_csv.stat()
+
+    # Rewritten within the timestamp resolution: only the hash tells.
+    demo_csv.write_text(demo_csv.read_text().replace("2024-05-30", "2024-06-30"))
+    os.utime(demo_csv, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert catalog.lookup(config, demo_csv) is None
+
+
+def test_old_files_are_not_hashed(
+    config: Config, demo_csv: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    hour_ago = demo_csv.stat().st_mtime_ns - 3600 * 10**9
+    os.utime(demo_csv, ns=(hour_ago, hour_ago))
+    monkeypatch.setattr(
+        Source, "content_hash", lambda self: pytest.fail("statement was hashed")
+    )
+
+    import_demo(config, demo_csv)
+    assert catalog.lookup(config, demo_csv).content_hash is None
+
+
+def test_looked_up_once(
+    config: Config, demo_csv: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    calls = []
+    lookup = catalog.lookup
+    monkeypatch.setattr(
+        catalog,
+        "lookup",
+        lambda *args, **kwargs: calls.append(1) or lookup(*args, **kwargs),
+    )
+    import_demo(config, demo_csv)
+    import_demo(config, demo_csv)
+    assert len(calls) == 2
+
+
+def test_skip_before_cutoff(
+    config: Config, demo_csv: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    import_demo(config, demo_csv)
+    config.do_not_import_before = datetime.date(2024, 6, 1)
+    monkeypatch.setattr(
+        importer, "extract_csv", lambda **kwargs: pytest.fail("statement was read")
+    )
+
+    import_csv(
+        config=config,
+        csv_file=demo_csv,
+        extract=formats.extract_demo,
+        csv_args=dict(delimiter=";"),
+    )
+    assert demo_csv.with_suffix(".beancount").read_text() == ""
+
+
+def test_ignored_for_other_extract(config: Config, demo_csv: Path) -> None:
+    import_demo(config, demo_csv)
+    config.do_not_import_before = datetime.date(2024, 6, 1)
+
+    def extract(row):
+        # A fix of the date parsing moves every booking into June.
+        return dataclasses.replace(
+            formats.extract_demo(row), date=datetime.date(2024, 6, 2)
+        )
+
+    assert catalog.lookup(config, demo_csv, extract=formats.extract_demo)
+    assert catalog.lookup(config, demo_csv, extract=extract) is None
+    import_csv(
+        config=config, csv_file=demo_csv, extract=extract, csv_args=dict(delimiter=";")
+    )
+    assert demo_csv.with_suffix(".beancount").read_text().count("2024-06-02") == 3
+    assert catalog.lookup(config, demo_csv, extract=extract).max_date == (
+        datetime.date(2024, 6, 2)
+    )
+
+
+def test_stop_early_when_descending(config: Config, demo_csv: Path) -> None:
+    lines = demo_csv.read_text().splitlines()
+    demo_csv.write_text("\n".join([lines[0], *reversed(lines[1:])]) + "\n")
+    rows = []
+
+    def extract(row):
+        rows.append(row)
+        return formats.extract_demo(row)
+
+    import_csv(
+        config=config, csv_file=demo_csv, extract=extract, csv_args=dict(delimiter=";")
+    )
+    assert catalog.lookup(config, demo_csv).order == "descending"
+
+    rows.clear()
+    config.do_not_import_before = datetime.date(2024, 5, 29)
+    import_csv(
+        config=config, csv_file=demo_csv, extract=extract, csv_args=dict(delimiter=";")
+    )
+    # The row of the 29th is read to find out that reading can stop.
+    assert [r["date"] for r in rows] == ["2024-05-30", "2024-05-29"]
+
+
+def test_import_window(config: Config, demo_csv: Path) -> None:
+    older = demo_csv.with_name("older.csv")
+    older.write_text(demo_csv.read_text().replace("2024-05", "2023-05"))
+    registry = default_registry(config)
+    cli = make_cli(config, registry=registry)
+
+    res = CliRunner().invoke(cli, ["import"])
+    assert res.exit_code == 0
+    mtime = older.with_suffix(".beancount").stat().st_mtime_ns
+
+    detected = registry.import_statements(
+        config.statements_dir, start=datetime.date(2024, 1, 1)
+    )
+    assert [source.path.name for source in detected] == ["test.csv"]
+    assert older.with_suffix(".beancount").stat().st_mtime_ns == mtime
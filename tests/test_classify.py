@@ -0,0 +1,167 @@
+import json
+from pathlib import Path
+
+import pytest
+from fava.application import create_app
+
+from roastery import Config, edit
+
+
+def make_client(journal: Path):
+    with journal.open("a") as f:
+        f.write(
+            '\n2024-01-01 custom "fava-extension" "roastery.classify" '
+            + "\"{'project_root': '..'}\"\n"
+        )
+    app = create_app([str(journal)], load=True)
+    app.testing = True
+    client = app.test_client()
+    slug = next(iter(app.config["LEDGERS"]))
+    client.base = f"/{slug}/extension/RoasteryClassify"
+    return client
+
+
+@pytest.fixture
+def client(config: Config, journal: Path):
+    return make_client(journal)
+
+
+def test_queue_pages(client) -> None:
+    response = client.get(f"{client.base}/queue?per_page=2&sort=amount")
+    assert response.status_code == 200
+    data = response.json
+    assert data["total"] == 3
+    # The amount of the Unknown posting, which is the opposite of the bank posting.
+    assert [row["payee"] for row in data["rows"]] == ["Employer", "Supermarket Inc."]
+
+    data = client.get(f"{client.base}/queue?per_page=2&page=2&sort=amount").json
+    assert [row["payee"] for row in data["rows"]] == ["Housing Inc."]
+
+
+def test_queue_groups(client) -> None:
+    data = client.get(f"{client.base}/queue?group=payee").json
+    assert data["total"] == 3
+    assert {group["key"] for group in data["groups"]} == {
+        "employer",
+        "supermarket inc.",
+        "housing inc.",
+    }
+
+    data = client.get(f"{client.base}/queue?payee=employer").json
+    assert [row["payee"] for row in data["rows"]] == ["Employer"]
+
+
+def test_assign(client, config: Config) -> None:
+    rows = client.get(f"{client.base}/queue?sort=payee").json["rows"]
+    digests = [rows[1]["digest"], rows[2]["digest"]]
+
+    response = client.post(
+        f"{client.base}/assign",
+        data=json.dumps({"account": "Expenses:Groceries", "digests": digests}),
+        content_type="application/json",
+    )
+    assert response.json == {"assigned": 2, "remaining": 1}
+    edits = edit.read_manual_edits(config)
+    assert {edits[d]["account"] for d in digests} == {"Expenses:Groceries"}
+
+    response = client.post(
+        f"{client.base}/assign",
+        data=json.dumps({"account": "Skip", "payees": ["employer"]}),
+        content_type="application/json",
+    )
+    assert response.json == {"assigned": 1, "remaining": 0}
+    assert rows[0]["digest"] in edit.read_skip(config)
+    assert client.get(f"{client.base}/queue").json["total"] == 0
+
+
+def test_assign_without_payee(config: Config, journal: Path) -> None:
+    with journal.open("a") as f:
+        f.write(
+            '\n2024-06-02 * "Cash"\n  digest: "cash"\n'
+            + "  Assets:Bank  -50.00 EUR\n  Expenses:Unknown\n"
+        )
+    client = make_client(journal)
+
+    response = client.post(
+        f"{client.base}/assign",
+        data=json.dumps({"account": "Expenses:Groceries", "digests": ["cash"]}),
+        content_type="application/json",
+    )
+    assert response.json["assigned"] == 1
+    # No empty payee is stored for a transaction that had none.
+    assert edit.read_manual_edits(config)["cash"] == {
+        "account": "Expenses:Groceries",
+        "narration": "Cash",
+    }
+
+
+def test_assign_refuses_unknown_account(client, config: Config) -> None:
+    rows = client.get(f"{client.base}/queue").json["rows"]
+    response = client.post(
+        f"{client.base}/assign",
+        data=json.dumps({"account": "Expenses:Nope", "digests": [rows[0]["digest"]]}),
+        content_type="application/json",
+    )
+    assert response.status_code == 400
+    assert edit.read_manual_edits(config) == {}
+    assert client.get(f"{client.base}/queue").json["total"] == 3
+
+
+def test_assign_refuses_unknown_payee(client, config: Config) -> None:
+    response = client.post(
+        f"{client.base}/assign",
+        data=json.dumps({"account": "Skip", "payees": ["employer", "nobody"]}),
+        content_type="application/json",
+    )
+    assert response.status_code == 400
+    assert response.json["problems"] == ["Unknown or already classified payee nobody"]
+    assert edit.read_skip(config) == set()
+
+
+def test_assign_is_idempotent(client, config: Config) -> None:
+    rows = client.get(f"{client.base}/queue?sort=payee").json["rows"]
+    digests = [rows[1]["digest"], rows[2]["digest"]]
+
+    def assign(account: str):
+        return client.post(
+            f"{client.base}/assign",
+            data=json.dumps({"account": account, "digests": digests}),
+            content_type="application/json",
+        )
+
+    assert assign("Expenses:Groceries").json["assigned"] == 2
+    before = edit.read_manual_edits(config)
+    assert assign("Expenses:Groceries").json == {"assigned": 2, "remaining": 1}
+    assert edit.read_manual_edits(config) == before
+
+    # A different answer than the stored one is still refused.
+    response = assign("Skip")
+    assert response.status_code == 400
+    assert len(response.json["problems"]) == 2
+
+
+def test_page_renders(client) -> None:
+    response = client.get(f"{client.base}/")
+    assert response.status_code == 200
+    assert b"roastery-classify" in response.data
+    assert (
+        client.get(
+            client.base.replace("/extension/", "/extension_js_module/") + ".js"
+        ).status_code
+        == 200
+    )
+
+
+def test_watches_plugin_stores(config: Config, journal: Path) -> None:
+    config.manual_edits_path.parent.mkdir(exist_ok=True)
+    config.manual_edits_path.write_text("{}")
+    journal.write_text(
+        'plugin "roastery.plugin"\n'
+        + journal.read_text()
+        + '\n2024-01-01 custom "fava-extension" "roastery.classify"\n'
+    )
+    app = create_app([str(journal)], load=True)
+    [ledger] = app.config["LEDGERS"].values()
+    files, _ = ledger.paths_to_watch()
+    assert config.manual_edits_path.resolve() not in files
+    assert config.manual_edits_path.resolve() in ledger.watcher._files
@@ -11,7 +11,24 @@ runner = CliRunner()
 
 
 def test_cli_initialisation(cli: Typer) -> None:
-    assert {c.name for c in cli.registered_commands} == {"fava", "flag", "edit"}
+    assert {c.name for c in cli.registered_commands} == {
+        "apply",
+        "archive",
+        "check",
+        "fava",
+        "flag",
+        "edit",
+        "export",
+        "import",
+        "open",
+        "query",
+        "regenerate",
+        "report",
+        "serve",
+        "show",
+        "stats",
+        "synthesize",
+    }
 
 
 def test_flag_cmd_invalid_hash(cli: Typer) -> None:
@@ -46,6 +46,7 @@ def test_defaults() -> None:
     assert c.journal_path == d / "journal/main.beancount"
     assert c.manual_edits_path == d / ".roastery/manual-edits.json"
     assert c.skip_path == d / ".roastery/skip.json"
+    assert c.state_dir == d / ".roastery"
     assert c.do_not_import_before is None
     assert c.default_account_name_suffix == "Unknown"
 
@@ -0,0 +1,66 @@
+import json
+from pathlib import Path
+
+import pytest
+
+from roastery import Config, edit, term
+from roastery.server import JournalState, LocalClient
+
+
+def test_edit_session(config: Config, journal: Path, answers: list) -> None:
+    answers.extend(["Income:Salary", "Skip", KeyboardInterrupt])
+    edit.main(config)
+
+    edits = json.loads(config.manual_edits_path.read_text())
+    assert list(edits.values()) == [
+        {"account": "Income:Salary", "payee": "Employer", "narration": "Salary May"}
+    ]
+    assert len(json.loads(config.skip_path.read_text())) == 1
+
+
+def test_edit_session_suggestions(
+    config: Config, journal: Path, answers: list, prompts: list
+) -> None:
+    config.manual_edits_path.parent.mkdir(exist_ok=True)
+    config.manual_edits_path.write_text(
+        json.dumps({"old": {"account": "Expenses:Groceries", "payee": "Housing Inc."}})
+    )
+    answers.extend(["Skip", "Skip", "Skip"])
+    edit.main(config)
+
+    # The third item is from "Housing Inc.", which was classified before.
+    assert prompts[2][0] == "Expenses:Groceries"
+    assert len(json.loads(config.skip_path.read_text())) == 3
+
+
+def test_edit_session_with_client(config: Config, journal: Path, answers: list) -> None:
+    state = JournalState(config)
+    client = LocalClient(state)
+    answers.extend(["Skip", KeyboardInterrupt])
+    edit.main(config, client=client)
+
+    assert len(client.unprocessed()) == 2
+    assert len(json.loads(config.skip_path.read_text())) == 1
+
+
+@pytest.fixture
+def prompts() -> list:
+    return []
+
+
+@pytest.fixture
+def answers(monkeypatch: pytest.MonkeyPatch, prompts: list) -> list:
+    """Answers to give to the account prompt, in order. Other prompts keep the default."""
+    answers = []
+
+    def select_fuzzy_search(prompt: str, *, options: list[str], **kwargs) -> str:
+        prompts.append(options)
+        answer = answers.pop(0)
+        if answer is KeyboardInterrupt:
+            raise KeyboardInterrupt
+        return answer
+
+    monkeypatch.setattr(term, "select_fuzzy_search", select_fuzzy_search)
+    monkeypatch.setattr(term, "ask", lambda question, *, default=None: default)
+    monkeypatch.setattr(term, "log", lambda *contents, **kwargs: None)
+    return answers
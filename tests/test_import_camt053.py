@@ -0,0 +1,77 @@
+from pathlib import Path
+
+import pytest
+from beancount import loader
+
+from roastery import Config, formats
+from roastery.importer import import_camt053
+
+
+def test_read_camt053(camt_file: Path) -> None:
+    first, second = formats.read_camt053(camt_file)
+    assert first["iban"] == "NL91ABNA0417164300"
+    assert first["amount"] == "-42.32"
+    assert first["counterparty"] == "Supermarket Inc."
+    assert first["counterparty_iban"] == "NL02RABO0123456789"
+    assert first["description"] == "Groceries week 22"
+    assert first["reference"] == "REF-0001"
+    assert second["amount"] == "3500.00"
+    assert second["counterparty"] == "Employer"
+    assert second["booking_date"] == "2024-05-30"
+
+
+def test_import_camt053(config: Config, camt_file: Path) -> None:
+    config.flags_path.parent.mkdir(exist_ok=True)
+    digest = formats.extract_camt053(next(formats.read_camt053(camt_file))).digest
+    config.flags_path.write_text(f'["{digest}"]')
+
+    import_camt053(xml_file=camt_file, config=config)
+
+    entries, errors, options = loader.load_file(camt_file.with_suffix(".beancount"))
+    assert [e.payee for e in entries] == ["Supermarket Inc.", "Employer"]
+    assert [e.flag for e in entries] == ["!", "*"]
+    assert entries[0].meta["reference"] == "REF-0001"
+
+
+@pytest.fixture
+def camt_file(config: Config) -> Path:
+    config.statements_dir.mkdir(exist_ok=True)
+    path = config.statements_dir / "statement.xml"
+    path.write_text("""\
+<?xml version="1.0" encoding="UTF-8"?>
+<Document xmlns="urn:iso:std:iso:20022:tech:xsd:camt.053.001.02">
+  <BkToCstmrStmt>
+    <Stmt>
+      <Id>STMT-1</Id>
+      <Acct><Id><IBAN>NL91ABNA0417164300</IBAN></Id><Ccy>EUR</Ccy></Acct>
+      <Ntry>
+        <Amt Ccy="EUR">42.32</Amt>
+        <CdtDbtInd>DBIT</CdtDbtInd>
+        <Sts>BOOK</Sts>
+        <BookgDt><Dt>2024-05-29</Dt></BookgDt>
+        <ValDt><Dt>2024-05-29</Dt></ValDt>
+        <AcctSvcrRef>REF-0001</AcctSvcrRef>
+        <NtryDtls><TxDtls>
+          <RltdPties>
+            <Cdtr><Nm>Supermarket Inc.</Nm></Cdtr>
+            <CdtrAcct><Id><IBAN>NL02RABO0123456789</IBAN></Id></CdtrAcct>
+          </RltdPties>
+          <RmtInf><Ustrd>Groceries week 22</Ustrd></RmtInf>
+        </TxDtls></NtryDtls>
+      </Ntry>
+      <Ntry>
+        <Amt Ccy="EUR">3500.00</Amt>
+        <CdtDbtInd>CRDT</CdtDbtInd>
+        <Sts>BOOK</Sts>
+        <BookgDt><DtTm>2024-05-30T09:00:00</DtTm></BookgDt>
+        <AcctSvcrRef>REF-0002</AcctSvcrRef>
+        <NtryDtls><TxDtls>
+          <RltdPties><Dbtr><Nm>Employer</Nm></Dbtr></RltdPties>
+        </TxDtls></NtryDtls>
+        <AddtlNtryInf>Salary May</AddtlNtryInf>
+      </Ntry>
+    </Stmt>
+  </BkToCstmrStmt>
+</Document>
+""")
+    return path
@@ -1,12 +1,14 @@
 import datetime
 from pathlib import Path
-from typing import Iterator
 
-import pytest
 from beancount import loader
+from beancount.core import data
+from beancount.core.number import D
+from beancount.parser import parser
 from beancount.query.query import run_query
 
 from roastery import import_csv, Config, formats
+from roastery.importer import import_transactions, load_transactions, write_transactions
 
 
 def test_import_demo_csv(config: Config, demo_csv: Path) -> None:
@@ -59,16 +61,61 @@ def test_import_flags(config: Config, demo_csv: Path) -> None:
     assert res_rows[0][0] == md5
 
 
-@pytest.fixture
-def demo_csv(config: Config) -> Iterator[Path]:
-    config.statements_dir.mkdir(exist_ok=True)
-    csv_file = config.statements_dir / "test.csv"
+def test_import_transactions(config: Config, demo_csv: Path) -> None:
+    transactions = import_transactions(
+        config=config,
+        csv_file=demo_csv,
+        extract=formats.extract_demo,
+        csv_args=dict(delimiter=";"),
+    )
+    assert not demo_csv.with_suffix(".beancount").exists()
+    assert [txn.payee for txn in transactions] == [
+        "Employer",
+        "Supermarket Inc.",
+        "Housing Inc.",
+    ]
+
+    entries, errors, options = load_transactions(transactions)
+    assert errors == []
+    assert len([e for e in entries if isinstance(e, data.Transaction)]) == 3
+    # Booking fills in the elided posting.
+    assert entries[-1].postings[1].units == data.Amount(D("1000.00"), "EUR")
+
+
+def test_load_transactions_copies_options(config: Config, demo_csv: Path) -> None:
+    transactions = import_transactions(
+        config=config,
+        csv_file=demo_csv,
+        extract=formats.extract_demo,
+        csv_args=dict(delimiter=";"),
+    )
+    _, _, options_map = parser.parse_string("")
+    before = str(options_map["dcontext"])
 
-    csv_file.write_text("""\
-"date";"payee";"description";"amount";"type";"balance_after"
-"2024-05-28";"Employer";"Salary May";"3500.00";"TSFR";"4743.12"
-"2024-05-29";"Supermarket Inc.";"Card No: 1923; Transaction ID: 128938958283801";"-42.32";"CARD";"4700.80"
-"2024-05-30";"Housing Inc.";"Rent June";"-1000.00";"SEPA";"3700.80"
-""")
+    _, _, options = load_transactions(transactions, options_map=options_map)
+    assert str(options_map["dcontext"]) == before
+    assert str(options["dcontext"]) != before
 
-    yield csv_file
+
+def test_load_transactions_reports_errors(config: Config, demo_csv: Path) -> None:
+    transactions = import_transactions(
+        config=config,
+        csv_file=demo_csv,
+        extract=formats.extract_demo,
+        csv_args=dict(delimiter=";"),
+    )
+    entries, errors, options = load_transactions(transactions, auto_accounts=False)
+    assert len(errors) == 6
+
+
+def test_write_transactions_matches_import_csv(config: Config, demo_csv: Path) -> None:
+    kwargs = dict(
+        config=config,
+        csv_file=demo_csv,
+        extract=formats.extract_demo,
+        csv_args=dict(delimiter=";"),
+    )
+    import_csv(**kwargs)
+    written = config.statements_dir / "written.beancount"
+    write_transactions(import_transactions(**kwargs), written)
+    assert written.read_text() == demo_csv.with_suffix(".beancount").read_text()
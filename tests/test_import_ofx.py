@@ -0,0 +1,103 @@
+import io
+from pathlib import Path
+
+from beancount import loader
+
+from roastery import Config, formats
+from roastery.formats import _ofx_tags
+from roastery.importer import import_ofx
+
+OFX_SGML = """\
+OFXHEADER:100
+DATA:OFXSGML
+VERSION:102
+
+<OFX>
+<BANKMSGSRSV1><STMTTRNRS><STMTRS>
+<CURDEF>EUR
+<BANKACCTFROM><BANKID>1234<ACCTID>987654321<ACCTTYPE>CHECKING</BANKACCTFROM>
+<BANKTRANLIST>
+<STMTTRN>
+<TRNTYPE>DEBIT
+<DTPOSTED>20240529120000.000[-5:EST]
+<TRNAMT>-42.32
+<FITID>20240529-1
+<NAME>Supermarket Inc.
+<MEMO>Card No: 1923
+</STMTTRN>
+<STMTTRN>
+<TRNTYPE>CREDIT
+<DTPOSTED>20240528
+<TRNAMT>3500.00
+<FITID>20240528-1
+<NAME>Employer
+</STMTTRN>
+</BANKTRANLIST>
+</STMTRS></STMTTRNRS></BANKMSGSRSV1>
+</OFX>
+"""
+
+OFX_XML = """\
+<?xml version="1.0" encoding="UTF-8"?>
+<?OFX OFXHEADER="200" VERSION="220"?>
+<OFX><BANKMSGSRSV1><STMTTRNRS><STMTRS>
+<CURDEF>EUR</CURDEF>
+<BANKACCTFROM><ACCTID>987654321</ACCTID></BANKACCTFROM>
+<BANKTRANLIST>
+<STMTTRN><TRNTYPE>DEBIT</TRNTYPE><DTPOSTED>20240529</DTPOSTED>
+<TRNAMT>-42.32</TRNAMT><FITID>20240529-1</FITID><NAME>Supermarket Inc.</NAME></STMTTRN>
+</BANKTRANLIST>
+</STMTRS></STMTTRNRS></BANKMSGSRSV1></OFX>
+"""
+
+
+def test_read_ofx_sgml(config: Config) -> None:
+    first, second = formats.read_ofx(_write(config, OFX_SGML))
+    assert first == {
+        "account_id": "987654321",
+        "currency": "EUR",
+        "trntype": "DEBIT",
+        "dtposted": "20240529120000.000[-5:EST]",
+        "trnamt": "-42.32",
+        "fitid": "20240529-1",
+        "name": "Supermarket Inc.",
+        "memo": "Card No: 1923",
+    }
+    assert second["name"] == "Employer"
+
+
+def test_read_ofx_xml(config: Config) -> None:
+    (row,) = formats.read_ofx(_write(config, OFX_XML))
+    assert row["name"] == "Supermarket Inc."
+    assert row["account_id"] == "987654321"
+
+
+def test_read_ofx_unescapes(config: Config) -> None:
+    ofx = OFX_XML.replace("Supermarket Inc.", "Bread &amp; Butter &#8211; Caf&eacute;")
+    (row,) = formats.read_ofx(_write(config, ofx))
+    assert row["name"] == "Bread & Butter \u2013 Caf\u00e9"
+
+
+def test_tags_across_chunks() -> None:
+    whole = list(_ofx_tags(io.StringIO(OFX_SGML)))
+    assert list(_ofx_tags(io.StringIO(OFX_SGML), chunk_size=7)) == whole
+
+
+def test_import_ofx(config: Config) -> None:
+    ofx_file = _write(config, OFX_SGML)
+    import_ofx(ofx_file=ofx_file, config=config)
+
+    entries, errors, options = loader.load_file(ofx_file.with_suffix(".beancount"))
+    assert [(str(e.date), e.payee) for e in entries] == [
+        ("2024-05-28", "Employer"),
+        ("2024-05-29", "Supermarket Inc."),
+    ]
+    assert entries[1].narration == "Card No: 1923"
+    assert entries[1].meta["fitid"] == "20240529-1"
+
+
+def _write(config: Config, contents: str) -> Path:
+    config.statements_dir.mkdir(exist_ok=True)
+    path = config.statements_dir / "statement.ofx"
+    path.write_text(contents)
+    return path
@@ -0,0 +1,72 @@
+from pathlib import Path
+
+import pytest
+from beancount import loader
+
+from typer.testing import CliRunner
+
+from roastery import Config, loading, make_cli
+
+
+@pytest.fixture
+def split_journal(config: Config, journal: Path) -> Path:
+    """The demo journal, with the opens moved to included files."""
+    text = journal.read_text()
+    opens = [line for line in text.splitlines() if " open " in line]
+    for i, line in enumerate(opens):
+        (journal.parent / f"accounts-{i}.beancount").write_text(line + "\n")
+
+    journal.write_text(
+        "\n".join(line for line in text.splitlines() if " open " not in line)
+        + '\ninclude "accounts-*.beancount"\n'
+    )
+    return journal
+
+
+def test_same_as_beancount(config: Config, split_journal: Path) -> None:
+    entries, errors, options = loading.load_journal(config, workers=2)
+    expected_entries, expected_errors, expected_options = loader.load_file(
+        split_journal
+    )
+
+    assert entries == expected_entries
+    assert errors == expected_errors == []
+    assert options["include"] == expected_options["include"]
+    assert options["input_hash"] == expected_options["input_hash"]
+
+
+def test_cache(
+    config: Config, split_journal: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    entries, _, _ = loading.load_journal(config)
+
+    parsed = []
+    parse = loading._parse
+    monkeypatch.setattr(
+        loading,
+        "_parse",
+        lambda filename: parsed.append(filename) or parse(filename),
+    )
+    assert loading.load_journal(config, workers=1)[0] == entries
+    assert parsed == []
+
+    changed = split_journal.parent / "accounts-0.beancount"
+    changed.write_text("2023-01-01 open Assets:Bank\n")
+    entries, errors, _ = loading.load_journal(config, workers=1)
+    assert parsed == [str(changed)]
+    assert errors == []
+
+
+def test_errors(config: Config, journal: Path) -> None:
+    journal.write_text(journal.read_text() + 'include "missing.beancount"\n')
+    _, errors, _ = loading.load_journal(config)
+    assert len(errors) == 1
+    assert "does not match any files" in errors[0].message
+
+
+def test_check_cmd(config: Config, journal: Path) -> None:
+    runner = CliRunner()
+    assert runner.invoke(make_cli(config), ["check"]).exit_code == 0
+
+    journal.write_text(journal.read_text() + "2024-06-01 close Assets:Missing\n")
+    assert runner.invoke(make_cli(config), ["check"]).exit_code == 1
@@ -0,0 +1,76 @@
+import json
+from pathlib import Path
+
+import pytest
+from typer.testing import CliRunner
+
+from roastery import Config, formats, import_csv, make_cli
+from roastery.locator import DigestIndex, index_path
+
+runner = CliRunner()
+
+
+@pytest.fixture
+def digests(config: Config, demo_csv: Path) -> list[str]:
+    """Digests of the demo CSV, imported with the index enabled and sorted output."""
+    config.index_digests = True
+    config.sort_entries = True
+    demo_csv.write_text(demo_csv.read_text().replace('"2024-05-28"', '"2024-05-31"'))
+    import_csv(
+        config=config,
+        csv_file=demo_csv,
+        extract=formats.extract_demo,
+        csv_args=dict(delimiter=";"),
+    )
+    text = demo_csv.with_suffix(".beancount").read_text()
+    return [line.split('"')[1] for line in text.splitlines() if "digest:" in line]
+
+
+def test_lookup(config: Config, demo_csv: Path, digests: list[str]) -> None:
+    with DigestIndex(config) as index:
+        locations = [index.lookup(digest) for digest in digests]
+        assert index.lookup("0" * 32) is None
+
+    # The first row of the statement is written last, because of the sorting.
+    assert [loc.row for loc in locations] == [2, 3, 1]
+    assert {loc.statement for loc in locations} == {str(demo_csv)}
+
+    lines = demo_csv.with_suffix(".beancount").read_text().splitlines()
+    for loc in locations:
+        text = loc.read_transaction()
+        assert text.splitlines()[0] == lines[loc.line - 1]
+        assert loc.digest in text
+
+
+def test_reimport_replaces(config: Config, demo_csv: Path, digests: list[str]) -> None:
+    demo_csv.write_text("\n".join(demo_csv.read_text().splitlines()[:2]) + "\n")
+    import_csv(
+        config=config,
+        csv_file=demo_csv,
+        extract=formats.extract_demo,
+        csv_args=dict(delimiter=";"),
+    )
+
+    with DigestIndex(config) as index:
+        found = [d for d in digests if index.lookup(d) is not None]
+    assert len(found) == 1
+
+
+def test_stale_file(config: Config, demo_csv: Path, digests: list[str]) -> None:
+    demo_csv.with_suffix(".beancount").write_text("")
+    with DigestIndex(config) as index:
+        assert index.lookup(digests[0]).read_transaction() is None
+
+
+def test_show_cmd(config: Config, digests: list[str]) -> None:
+    config.flags_path.write_text(json.dumps([digests[0]]))
+    res = runner.invoke(make_cli(config), ["show", digests[0]])
+    assert res.exit_code == 0
+    assert "Flagged:     yes" in res.stdout
+    assert f'digest: "{digests[0]}"' in res.stdout
+
+
+def test_show_cmd_without_index(config: Config) -> None:
+    res = runner.invoke(make_cli(config), ["show", "0" * 32])
+    assert res.exit_code == 1
+    assert not index_path(config).exists()
@@ -0,0 +1,126 @@
+import json
+from pathlib import Path
+
+import pytest
+from beancount import loader
+from beancount.core import data
+
+from roastery import Config, formats, import_csv
+from roastery.importer import Entry
+from roastery.plugin import STORES_OPTION
+
+
+@pytest.fixture
+def overlay_journal(config: Config, journal: Path) -> Path:
+    """The demo journal with the plugin, imported with ``overlay_edits``."""
+    config.overlay_edits = True
+    journal.write_text('plugin "roastery.plugin"\n' + journal.read_text())
+    return journal
+
+
+def transactions(journal: Path) -> dict[str, data.Transaction]:
+    entries, errors, _ = loader.load_file(journal)
+    assert errors == []
+    return {e.payee: e for e in entries if isinstance(e, data.Transaction)}
+
+
+def test_overlay(config: Config, overlay_journal: Path) -> None:
+    digest = transactions(overlay_journal)["Supermarket Inc."].meta["digest"]
+    config.manual_edits_path.parent.mkdir(exist_ok=True)
+    config.manual_edits_path.write_text(
+        json.dumps(
+            {
+                digest: {
+                    "account": "Expenses:Groceries",
+                    "payee": "Supermarket",
+                    "narration": "Weekly groceries",
+                    "tags": ["food"],
+                }
+            }
+        )
+    )
+    config.flags_path.write_text(json.dumps([digest]))
+
+    txn = transactions(overlay_journal)["Supermarket"]
+    assert txn.narration == "Weekly groceries"
+    assert [p.account for p in txn.postings] == ["Assets:Bank", "Expenses:Groceries"]
+    assert txn.tags == {"food"}
+    assert txn.flag == "!"
+
+
+def test_import_leaves_out_edits(
+    config: Config, overlay_journal: Path, demo_csv: Path
+) -> None:
+    digest = transactions(overlay_journal)["Employer"].meta["digest"]
+    config.manual_edits_path.parent.mkdir(exist_ok=True)
+    config.manual_edits_path.write_text(json.dumps({digest: {"payee": "Boss"}}))
+
+    import_csv(
+        config=config,
+        csv_file=demo_csv,
+        extract=formats.extract_demo,
+        csv_args=dict(delimiter=";"),
+    )
+    assert "Boss" not in demo_csv.with_suffix(".beancount").read_text()
+    assert "Boss" in transactions(overlay_journal)
+
+
+def test_overlay_matches_import(config: Config, journal: Path, demo_csv: Path) -> None:
+    def extract(row: formats.DemoCsvRow) -> Entry:
+        entry = formats.extract_demo(row)
+        entry.tags.add("imported")
+        entry.links.add("statement")
+        return entry
+
+    def load(overlay: bool) -> dict[str, tuple]:
+        config.overlay_edits = overlay
+        import_csv(
+            config=config,
+            csv_file=demo_csv,
+            extract=extract,
+            csv_args=dict(delimiter=";"),
+        )
+        entries, errors, _ = loader.load_file(journal)
+        assert errors == []
+        return {
+            e.meta["digest"]: (
+                e.flag,
+                e.payee,
+                e.narration,
+                e.tags,
+                e.links,
+                [p.account for p in e.postings],
+            )
+            for e in entries
+            if isinstance(e, data.Transaction)
+        }
+
+    digests = list(load(False))
+    config.manual_edits_path.write_text(
+        json.dumps(
+            {
+                digests[0]: {"payee": "Boss"},
+                digests[1]: {
+                    "account": "Expenses:Groceries",
+                    "narration": "Weekly groceries",
+                    "tags": ["food"],
+                    "links": ["receipt"],
+                },
+            }
+        )
+    )
+    config.flags_path.write_text(json.dumps([digests[2]]))
+
+    imported = load(False)
+    journal.write_text('plugin "roastery.plugin"\n' + journal.read_text())
+    overlaid = load(True)
+    assert overlaid == imported
+    assert imported[digests[1]][3:5] == ({"food"}, {"receipt"})
+
+
+def test_edits_are_watched(config: Config, overlay_journal: Path) -> None:
+    config.flags_path.parent.mkdir(exist_ok=True)
+    config.flags_path.write_text("[]")
+    _, _, options = loader.load_file(overlay_journal)
+    assert str(config.flags_path.resolve()) in options[STORES_OPTION]
+    assert str(config.flags_path.resolve()) not in options["include"]
@@ -0,0 +1,160 @@
+import dataclasses
+import importlib
+import os
+from pathlib import Path
+
+import pytest
+
+from roastery import Config, Entry, formats, synthesis
+from roastery.reclean import FieldChange, reclean
+from roastery.rules import rule_fingerprint
+
+
+class Classify:
+    def __init__(self, payee: str, account: str) -> None:
+        self.payee = payee
+        self.account = account
+
+    def __call__(self, entry: Entry) -> None:
+        if entry.payee.value == self.payee:
+            entry.account.cleaned = self.account
+
+
+def rename_housing(entry: Entry) -> None:
+    if entry.payee.value == "Housing Inc.":
+        entry.payee.cleaned = "Landlord"
+
+
+def test_rule_fingerprint() -> None:
+    a = Classify("Employer", "Income:Salary")
+    b = Classify("Employer", "Income:Bonus")
+    assert rule_fingerprint(a) == rule_fingerprint(
+        Classify("Employer", "Income:Salary")
+    )
+    assert rule_fingerprint(a) != rule_fingerprint(b)
+    assert rule_fingerprint(rename_housing) != rule_fingerprint(a)
+
+
+ACCOUNTS = {"Employer": "Income:Salary"}
+
+
+def classify_by_table(entry: Entry) -> None:
+    entry.account.cleaned = ACCOUNTS.get(entry.payee.value)
+
+
+def test_rule_fingerprint_covers_globals(monkeypatch: pytest.MonkeyPatch) -> None:
+    before = rule_fingerprint(classify_by_table)
+    monkeypatch.setitem(ACCOUNTS, "Employer", "Income:Bonus")
+    assert rule_fingerprint(classify_by_table) != before
+
+    monkeypatch.setattr(classify_by_table, "version", 2, raising=False)
+    assert rule_fingerprint(classify_by_table) != before
+
+
+def test_rule_fingerprint_covers_helpers(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.syspath_prepend(str(tmp_path))
+    helpers = tmp_path / "my_helpers.py"
+    helpers.write_text("def normalise(payee):\n    return payee.lower()\n")
+    (tmp_path / "my_rules.py").write_text(
+        "from my_helpers import normalise\n\n"
+        + "def rule(entry):\n"
+        + "    entry.payee.cleaned = normalise(entry.payee.value)\n"
+    )
+    my_rules = importlib.import_module("my_rules")
+    before = rule_fingerprint(my_rules.rule)
+
+    helpers.write_text("def normalise(payee):\n    return payee.upper()\n")
+    os.utime(helpers, (1, 1))
+    assert rule_fingerprint(my_rules.rule) != before
+
+
+def test_first_run_adds_everything(config: Config, demo_csv: Path) -> None:
+    diff = _reclean(config, demo_csv, [rename_housing], write=False)
+    assert len(diff.added) == 3
+    assert diff.changes == []
+    assert not demo_csv.with_suffix(".beancount").exists()
+
+
+def test_unchanged_rules_evaluate_nothing(config: Config, demo_csv: Path) -> None:
+    rules = [Classify("Employer", "Income:Salary"), rename_housing]
+    _reclean(config, demo_csv, rules, write=True)
+
+    diff = _reclean(config, demo_csv, rules)
+    assert diff.evaluated == 0
+    assert diff.changes == [] and diff.added == [] and diff.removed == []
+
+
+def test_changed_rule_diff(config: Config, demo_csv: Path) -> None:
+    _reclean(config, demo_csv, [Classify("Employer", "Income:Salary")], write=True)
+    salary = demo_csv.with_suffix(".beancount").read_text()
+    assert "Income:Salary" in salary
+
+    diff = _reclean(config, demo_csv, [Classify("Employer", "Income:Bonus")])
+    (change,) = diff.changes
+    assert change == FieldChange(
+        digest=change.digest, field="account", old="Income:Salary", new="Income:Bonus"
+    )
+    # Previewing doesn't write anything.
+    assert demo_csv.with_suffix(".beancount").read_text() == salary
+
+    _reclean(config, demo_csv, [Classify("Employer", "Income:Bonus")], write=True)
+    assert "Income:Bonus" in demo_csv.with_suffix(".beancount").read_text()
+
+
+def test_downstream_rules_only_run_when_affected(
+    config: Config, demo_csv: Path
+) -> None:
+    calls = []
+
+    def tail(entry: Entry) -> None:
+        calls.append(entry.digest)
+
+    rules = [Classify("Employer", "Income:Salary"), tail]
+    _reclean(config, demo_csv, rules, write=True)
+    calls.clear()
+
+    rules = [Classify("Housing Inc.", "Expenses:Rent"), tail]
+    diff = _reclean(config, demo_csv, rules)
+    assert diff.evaluated == 3
+    # Employer lost its account and Housing Inc. got one. Supermarket is unaffected.
+    assert len(calls) == 2
+    assert {(c.field, c.new) for c in diff.changes} == {
+        ("account", None),
+        ("account", "Expenses:Rent"),
+    }
+
+
+def test_learned_rules_run_after_rules(config: Config, demo_csv: Path) -> None:
+    config = dataclasses.replace(config, apply_rules=True)
+    synthesis.write_rules(
+        config,
+        [synthesis.Rule(field="payee", key="employer", account="Income:Learned")],
+    )
+
+    def fallback(entry: Entry) -> None:
+        if entry.account.value is None:
+            entry.account.cleaned = "Expenses:Other"
+
+    _reclean(config, demo_csv, [], write=True)
+    assert "Income:Learned" in demo_csv.with_suffix(".beancount").read_text()
+
+    # As in an import, the learned rule only classifies what the rules left open.
+    diff = _reclean(config, demo_csv, [fallback], write=True)
+    assert {(c.field, c.old, c.new) for c in diff.changes} == {
+        ("account", "Income:Learned", "Expenses:Other"),
+        ("account", None, "Expenses:Other"),
+    }
+    assert "Income:Learned" not in demo_csv.with_suffix(".beancount").read_text()
+
+
+def _reclean(config: Config, csv_file: Path, rules: list, write: bool = False):
+    return reclean(
+        config=config,
+        csv_file=csv_file,
+        extract=formats.extract_demo,
+        csv_args=dict(delimiter=";"),
+        rules=rules,
+        write=write,
+    )
@@ -0,0 +1,55 @@
+from pathlib import Path
+
+import pytest
+
+from roastery import Config, edit
+from roastery.registry import FormatRegistry, default_registry
+from roastery.regenerate import regenerate
+
+
+@pytest.fixture
+def registry(config: Config, demo_csv: Path) -> FormatRegistry:
+    """A registry that imported the demo CSV and a copy of it, with an index."""
+    config.index_digests = True
+    other = demo_csv.with_name("other.csv")
+    other.write_text(demo_csv.read_text().replace("Employer", "Other Employer"))
+
+    registry = default_registry(config)
+    registry.import_statements(config.statements_dir)
+    return registry
+
+
+def digest_of(beancount_file: Path, payee: str) -> str:
+    lines = beancount_file.read_text().splitlines()
+    i = next(i for i, line in enumerate(lines) if f'"{payee}"' in line)
+    return next(line for line in lines[i:] if "digest:" in line).split('"')[1]
+
+
+def test_regenerate(config: Config, registry: FormatRegistry, demo_csv: Path) -> None:
+    beancount_file = demo_csv.with_suffix(".beancount")
+    other_file = demo_csv.with_name("other.beancount")
+    other_mtime = other_file.stat().st_mtime_ns
+
+    digest = digest_of(beancount_file, "Employer")
+    edit.save(config, {digest: {"account": "Income:Salary", "payee": "Boss"}}, set())
+    assert edit.read_changed(config) == {digest}
+
+    assert regenerate(config, registry) == [beancount_file.resolve()]
+    assert '"Boss"' in beancount_file.read_text()
+    assert other_file.stat().st_mtime_ns == other_mtime
+    assert edit.read_changed(config) == set()
+
+
+def test_regenerate_unknown_digest(config: Config, registry: FormatRegistry) -> None:
+    edit.mark_changed(config, ["0" * 32])
+    assert regenerate(config, registry) == []
+    assert edit.read_changed(config) == {"0" * 32}
+
+
+def test_overlay_needs_no_regeneration(
+    config: Config, registry: FormatRegistry
+) -> None:
+    config.overlay_edits = True
+    edit.mark_changed(config, ["0" * 32])
+    assert regenerate(config, registry) == []
+    assert edit.read_changed(config) == set()
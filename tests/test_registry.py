@@ -0,0 +1,117 @@
+import dataclasses
+import gzip
+from pathlib import Path
+
+import pytest
+
+from roastery import Config, formats
+from roastery.registry import CsvFormat, FormatRegistry, default_registry
+
+ASN_ROW = (
+    "02-01-2024,NL12ASNB0123456789,NL34BANK0123456789,Supermarket,,,,EUR,1000.00,"
+    + "EUR,-10.00,02-01-2024,02-01-2024,8810,IBA,12345678,,'Groceries',1\n"
+)
+
+
+@pytest.fixture
+def registry(config: Config) -> FormatRegistry:
+    return default_registry(config)
+
+
+def test_detect_exact_header(registry: FormatRegistry, demo_csv: Path) -> None:
+    assert registry.detect(demo_csv).name == "demo"
+
+
+def test_detect_by_score(registry: FormatRegistry, demo_csv: Path) -> None:
+    demo_csv.write_text(
+        demo_csv.read_text().replace('"balance_after"', '"balance_after";"iban"', 1)
+    )
+    assert registry.detect(demo_csv).name == "demo"
+
+
+def test_detect_headerless(registry: FormatRegistry, config: Config) -> None:
+    config.statements_dir.mkdir()
+    path = config.statements_dir / "asn.csv"
+    path.write_text(ASN_ROW)
+    assert registry.detect(path).name == "asn"
+
+
+def test_detect_headerless_needs_parsable_row(
+    registry: FormatRegistry, config: Config
+) -> None:
+    config.statements_dir.mkdir()
+    path = config.statements_dir / "wide.csv"
+    path.write_text(",".join(f"column {i}" for i in range(19)) + "\n")
+    assert registry.detect(path) is None
+
+
+def test_detect_unknown(registry: FormatRegistry, tmp_path: Path) -> None:
+    path = tmp_path / "other.csv"
+    path.write_text("a,b\n1,2\n")
+    assert registry.detect(path) is None
+
+
+def test_decision_is_cached(
+    registry: FormatRegistry, demo_csv: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    assert registry.detect(demo_csv).name == "demo"
+    assert registry.cache_path.exists()
+
+    fresh = default_registry(registry.config)
+    monkeypatch.setattr(fresh, "_decide", lambda sample: pytest.fail("not cached"))
+    assert fresh.detect(demo_csv).name == "demo"
+
+
+def test_decision_depends_on_definition(
+    registry: FormatRegistry, demo_csv: Path
+) -> None:
+    assert registry.detect(demo_csv).name == "demo"
+
+    # Same name, different columns: the cached decision must not be used.
+    fresh = default_registry(registry.config)
+    fresh.register(
+        CsvFormat(
+            name="demo",
+            extract=formats.extract_demo,
+            columns=("date", "payee"),
+            csv_args=dict(delimiter=";"),
+        )
+    )
+    assert fresh.detect(demo_csv) is None
+
+    # Same name and columns, different extract function.
+    fresh = default_registry(registry.config)
+    demo = fresh.formats["demo"]
+    fresh.register(dataclasses.replace(demo, extract=formats.extract_asn))
+    assert fresh.detect(demo_csv).extract is formats.extract_asn
+    assert len(fresh.cache_path.read_text().splitlines()) == 3
+
+
+def test_register_replaces(registry: FormatRegistry, demo_csv: Path) -> None:
+    registry.register(
+        CsvFormat(
+            name="demo",
+            extract=formats.extract_demo,
+            columns=("date", "payee"),
+            csv_args=dict(delimiter=";"),
+        )
+    )
+    assert registry.detect(demo_csv) is None
+
+
+def test_import_statements(
+    registry: FormatRegistry, config: Config, demo_csv: Path
+) -> None:
+    with gzip.open(config.statements_dir / "asn.csv.gz", "wt") as f:
+        f.write(ASN_ROW)
+    (config.statements_dir / "notes.csv").write_text("a,b\n")
+
+    detected = registry.import_statements(config.statements_dir)
+
+    assert {s.path.name: f and f.name for s, f in detected.items()} == {
+        "asn.csv.gz": "asn",
+        "notes.csv": None,
+        "test.csv": "demo",
+    }
+    assert "Groceries" in (config.statements_dir / "asn.beancount").read_text()
+    assert "Employer" in (config.statements_dir / "test.beancount").read_text()
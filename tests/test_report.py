@@ -0,0 +1,130 @@
+import dataclasses
+from decimal import Decimal
+from pathlib import Path
+
+import pytest
+from beancount.core.amount import Amount
+
+from roastery import Config, formats, import_csv
+from roastery.importer import Entry
+
+np = pytest.importorskip("numpy")
+report = pytest.importorskip("roastery.report")
+
+
+def test_import_exports_columns(columns_config: Config, demo_csv: Path) -> None:
+    columns = report.read_columns(columns_config)
+    assert len(columns) == 3
+    assert list(columns.decode("payee")) == [
+        "Employer",
+        "Supermarket Inc.",
+        "Housing Inc.",
+    ]
+    assert list(columns.decode("account")) == [
+        "Income:Unknown",
+        "Expenses:Unknown",
+        "Expenses:Unknown",
+    ]
+    assert columns.date[0] == np.datetime64("2024-05-28")
+
+
+def test_reimport_replaces_columns(columns_config: Config, demo_csv: Path) -> None:
+    _import(columns_config, demo_csv)
+    assert len(report.read_columns(columns_config)) == 3
+
+
+def test_merge_dictionaries(columns_config: Config, demo_csv: Path) -> None:
+    other = demo_csv.with_name("other.csv")
+    other.write_text(demo_csv.read_text().replace("Employer", "Other Employer"))
+    _import(columns_config, other)
+
+    columns = report.read_columns(columns_config)
+    assert len(columns) == 6
+    assert len(columns.values["payee"]) == 4
+    assert sorted(columns.decode("payee")).count("Housing Inc.") == 2
+
+
+def test_monthly_totals(columns_config: Config) -> None:
+    columns = report.read_columns(columns_config)
+    assert report.monthly_totals(columns) == [
+        ("Expenses:Unknown", "2024-05", "EUR", Decimal("-1042.32")),
+        ("Income:Unknown", "2024-05", "EUR", Decimal("3500.00")),
+    ]
+
+
+def test_exact_totals(columns_config: Config, demo_csv: Path) -> None:
+    other = demo_csv.with_name("other.csv")
+    other.write_text(demo_csv.read_text().replace("-42.32", "-0.10"))
+    for i in range(3):
+        other.with_name(f"other{i}.csv").write_text(other.read_text())
+        _import(columns_config, other.with_name(f"other{i}.csv"))
+
+    columns = report.read_columns(columns_config)
+    assert columns.amount.dtype == np.int64
+    assert report.monthly_totals(columns)[0][3] == Decimal("-4042.62")
+
+
+def test_top_payees(columns_config: Config) -> None:
+    columns = report.read_columns(columns_config)
+    assert report.top_payees(columns, n=1) == [
+        ("Housing Inc.", "EUR", 1, Decimal("1000.00"))
+    ]
+    assert len(report.top_payees(columns)) == 2
+
+
+def test_top_payees_per_currency(columns_config: Config, demo_csv: Path) -> None:
+    other = demo_csv.with_name("other.csv")
+    other.write_text(demo_csv.read_text())
+    import_csv(
+        config=columns_config,
+        csv_file=other,
+        extract=_extract_usd,
+        csv_args=dict(delimiter=";"),
+    )
+
+    columns = report.read_columns(columns_config)
+    assert report.top_payees(columns, n=1) == [
+        ("Housing Inc.", "EUR", 1, Decimal("1000.00")),
+        ("Housing Inc.", "USD", 1, Decimal("1000.00")),
+    ]
+
+
+def test_deleted_statement_is_removed(columns_config: Config, demo_csv: Path) -> None:
+    other = demo_csv.with_name("other.csv")
+    other.write_text(demo_csv.read_text())
+    _import(columns_config, other)
+    assert len(report.read_columns(columns_config)) == 6
+
+    other.unlink()
+    assert len(report.read_columns(columns_config)) == 3
+    assert not report.columns_path(
+        columns_config, other.with_suffix(".beancount")
+    ).exists()
+
+
+def test_no_columns(config: Config) -> None:
+    columns = report.read_columns(config)
+    assert len(columns) == 0
+    assert report.monthly_totals(columns) == []
+    assert report.top_payees(columns) == []
+
+
+def _extract_usd(row: dict) -> Entry:
+    entry = formats.extract_demo(row)
+    return dataclasses.replace(entry, amount=Amount(entry.amount.number, "USD"))
+
+
+def _import(config: Config, csv_file: Path) -> None:
+    import_csv(
+        config=config,
+        csv_file=csv_file,
+        extract=formats.extract_demo,
+        csv_args=dict(delimiter=";"),
+    )
+
+
+@pytest.fixture
+def columns_config(config: Config, demo_csv: Path) -> Config:
+    config.export_columns = True
+    _import(config, demo_csv)
+    return config
@@ -0,0 +1,70 @@
+from pathlib import Path
+
+from beancount import loader
+
+from roastery import Config, Entry, formats, import_csv
+from roastery.rules import RuleProfiler, rule_name
+
+
+def groceries(entry: Entry) -> None:
+    if entry.payee.value == "Supermarket Inc.":
+        entry.account.cleaned = "Expenses:Groceries"
+        entry.payee.cleaned = "Supermarket"
+
+
+def supermarket_payee(entry: Entry) -> None:
+    if entry.payee.value == "Supermarket":
+        entry.payee.cleaned = "The Supermarket"
+
+
+class Never:
+    def __call__(self, entry: Entry) -> None:
+        if entry.payee.value == "Nobody":
+            entry.flag = "!"
+
+
+def test_rule_name() -> None:
+    assert rule_name(groceries) == "test_rules.groceries"
+    assert rule_name(Never()) == "test_rules.Never"
+
+
+def test_profiler(config: Config, demo_csv: Path, capsys) -> None:
+    with RuleProfiler([groceries, supermarket_payee, Never()]) as profiler:
+        _import(config, demo_csv, profiler)
+
+    stats = {s.name: s for s in profiler.stats}
+    assert stats["test_rules.groceries"].calls == 3
+    assert stats["test_rules.groceries"].matches == 1
+    assert stats["test_rules.supermarket_payee"].matches == 1
+    assert [s.name for s in profiler.never_matched()] == ["test_rules.Never"]
+
+    (provenance,) = profiler.provenance.values()
+    assert provenance == {
+        "account": "test_rules.groceries",
+        "payee": "test_rules.supermarket_payee",
+    }
+
+    out = capsys.readouterr().out
+    assert "Hottest rules" in out
+    assert "never matched" in out
+
+
+def test_provenance_meta(config: Config, demo_csv: Path) -> None:
+    profiler = RuleProfiler([groceries, supermarket_payee], provenance_meta=True)
+    _import(config, demo_csv, profiler)
+
+    entries, _, _ = loader.load_file(demo_csv.with_suffix(".beancount"))
+    (txn,) = [e for e in entries if e.payee == "The Supermarket"]
+    assert txn.meta["account_rule"] == "test_rules.groceries"
+    assert txn.meta["payee_rule"] == "test_rules.supermarket_payee"
+    assert "narration_rule" not in txn.meta
+
+
+def _import(config: Config, csv_file: Path, clean: RuleProfiler) -> None:
+    import_csv(
+        config=config,
+        csv_file=csv_file,
+        extract=formats.extract_demo,
+        csv_args=dict(delimiter=";"),
+        clean=clean,
+    )
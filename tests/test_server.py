@@ -0,0 +1,94 @@
+import json
+import os
+import socket
+from pathlib import Path
+
+import pytest
+
+from roastery import Config, server
+from roastery.server import Client, JournalState, LocalClient, connect
+
+
+def test_accounts_and_unprocessed(client: LocalClient) -> None:
+    assert "Expenses:Groceries" in client.accounts()
+    assert "Assets:Bank" not in client.accounts()
+
+    unprocessed = client.unprocessed()
+    assert len(unprocessed) == 3
+    assert {item.payee for item in unprocessed} == {
+        "Employer",
+        "Supermarket Inc.",
+        "Housing Inc.",
+    }
+    assert all(item.position.units.currency == "EUR" for item in unprocessed)
+
+
+def test_save_drops_from_queue(config: Config, client: LocalClient) -> None:
+    first, second, _ = client.unprocessed()
+    edits = {first.digest: {"account": "Income:Salary", "payee": "Employer"}}
+    client.save(edits, {second.digest})
+
+    assert len(client.unprocessed()) == 1
+    assert json.loads(config.manual_edits_path.read_text()) == edits
+    assert json.loads(config.skip_path.read_text()) == [second.digest]
+
+
+def test_flag(config: Config, client: LocalClient) -> None:
+    digest = client.unprocessed()[0].digest
+    client.flag(digest)
+    assert json.loads(config.flags_path.read_text()) == [digest]
+
+
+def test_query(client: LocalClient) -> None:
+    columns, rows = client.query("select date, payee where account ~ 'Assets'")
+    assert columns == ["date", "payee"]
+    assert rows[0] == ["2024-05-28", "Employer"]
+
+
+def test_refresh_only_on_change(journal: Path, state: JournalState) -> None:
+    assert not state.refresh()
+
+    mtime = journal.stat().st_mtime
+    journal.write_text(journal.read_text() + "\n2024-01-01 open Expenses:Rent\n")
+    # Don't depend on the granularity of the file system's timestamps.
+    os.utime(journal, (mtime + 10, mtime + 10))
+    assert state.refresh()
+    assert "Expenses:Rent" in state.accounts
+
+
+def test_connect_without_server(config: Config) -> None:
+    assert connect(config) is None
+
+
+def test_connect_to_stale_socket(
+    config: Config, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(server, "PING_TIMEOUT", 0.1)
+    config.socket_path.parent.mkdir(parents=True, exist_ok=True)
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        # Accepts connections, but never answers.
+        sock.bind(str(config.socket_path))
+        sock.listen()
+        assert connect(config) is None
+
+
+def test_client_is_abstract() -> None:
+    with pytest.raises(TypeError):
+        Client()
+
+
+def test_unknown_command(client: LocalClient) -> None:
+    with pytest.raises(RuntimeError, match="Unknown command"):
+        client._checked("foo")
+
+
+@pytest.fixture
+def state(config: Config, journal: Path) -> JournalState:
+    state = JournalState(config)
+    state.refresh()
+    return state
+
+
+@pytest.fixture
+def client(state: JournalState) -> LocalClient:
+    return LocalClient(state)
@@ -0,0 +1,66 @@
+import datetime
+from pathlib import Path
+
+from beancount.core import data
+from beancount.core.number import D
+
+from roastery import Config, formats, import_csv
+from roastery.importer import Entry
+from roastery.sorting import sort_entries, sort_key
+
+
+def make_entries(n: int) -> list[Entry]:
+    return [
+        Entry.from_row(
+            digest=f"{(i * 7919) % n:032x}",
+            date=datetime.date(2024, 1, 1) + datetime.timedelta(days=(i * 31) % 97),
+            amount=data.Amount(D("-1.00"), "EUR"),
+            asset_account="Assets:Bank",
+            original_payee=f"Payee {i}",
+        )
+        for i in range(n)
+    ]
+
+
+def test_sort_in_memory(tmp_path: Path) -> None:
+    entries = make_entries(100)
+    result = list(
+        sort_entries(entries, memory_limit=2**30, spill_dir=tmp_path / "sort")
+    )
+    assert result == sorted(entries, key=sort_key)
+    assert not (tmp_path / "sort").exists()
+
+
+def test_sort_spills(tmp_path: Path) -> None:
+    entries = make_entries(1000)
+    spill_dir = tmp_path / "sort"
+
+    sorted_entries = sort_entries(entries, memory_limit=10_000, spill_dir=spill_dir)
+    first = next(sorted_entries)
+    assert len(list(spill_dir.glob("*/run-*.pickle"))) > 1
+
+    result = [first, *sorted_entries]
+    assert [sort_key(e) for e in result] == [
+        sort_key(e) for e in sorted(entries, key=sort_key)
+    ]
+    assert list(spill_dir.iterdir()) == []
+
+
+def test_import_sorted(config: Config, demo_csv: Path) -> None:
+    demo_csv.write_text("""\
+"date";"payee";"description";"amount";"type";"balance_after"
+"2024-05-30";"Housing Inc.";"Rent June";"-1000.00";"SEPA";"3700.80"
+"2024-05-29";"Supermarket Inc.";"Groceries";"-42.32";"CARD";"4700.80"
+"2024-05-28";"Employer";"Salary May";"3500.00";"TSFR";"4743.12"
+""")
+    config.sort_entries = True
+    config.sort_memory_limit = 1
+    import_csv(
+        config=config,
+        csv_file=demo_csv,
+        extract=formats.extract_demo,
+        csv_args=dict(delimiter=";"),
+    )
+
+    text = demo_csv.with_suffix(".beancount").read_text()
+    assert text.index("Employer") < text.index("Supermarket") < text.index("Housing")
@@ -0,0 +1,71 @@
+import gzip
+import zipfile
+from pathlib import Path
+
+from beancount import loader
+
+from roastery import Config, formats, import_csv
+from roastery.sources import Source, as_source, iter_sources
+
+
+def test_source_names(tmp_path: Path) -> None:
+    assert (
+        as_source(tmp_path / "foo.csv").beancount_file() == tmp_path / "foo.beancount"
+    )
+    assert (
+        as_source(tmp_path / "foo.csv.gz").beancount_file()
+        == tmp_path / "foo.beancount"
+    )
+
+    member = Source(path=tmp_path / "bank.zip", member="2024/may.csv")
+    assert member.beancount_file() == tmp_path / "bank-2024-may.beancount"
+    assert member.name == f"{tmp_path}/bank.zip:2024/may.csv"
+
+
+def test_import_gzip(config: Config, demo_csv: Path) -> None:
+    gz = demo_csv.with_name("demo.csv.gz")
+    gz.write_bytes(gzip.compress(demo_csv.read_bytes()))
+
+    _import(config, as_source(gz))
+    entries, _, _ = loader.load_file(gz.with_name("demo.beancount"))
+    assert len(entries) == 3
+
+
+def test_iter_sources_zip(config: Config, demo_csv: Path) -> None:
+    archive = config.statements_dir / "bank.zip"
+    with zipfile.ZipFile(archive, "w") as f:
+        f.writestr("2024/may.csv", demo_csv.read_text())
+        f.writestr("2024/june.csv.gz", gzip.compress(demo_csv.read_bytes()))
+        f.writestr("README.txt", "Not a statement")
+    demo_csv.unlink()
+
+    sources = list(iter_sources(config.statements_dir))
+    assert [s.member for s in sources] == ["2024/june.csv.gz", "2024/may.csv"]
+
+    for source in sources:
+        _import(config, source)
+
+    assert sorted(p.name for p in config.statements_dir.glob("*.beancount")) == [
+        "bank-2024-june.beancount",
+        "bank-2024-may.beancount",
+    ]
+    june = config.statements_dir / "bank-2024-june.beancount"
+    assert (
+        june.read_text()
+        == (config.statements_dir / "bank-2024-may.beancount").read_text()
+    )
+
+
+def test_content_hash_ignores_compression(demo_csv: Path) -> None:
+    gz = demo_csv.with_name("demo.csv.gz")
+    gz.write_bytes(gzip.compress(demo_csv.read_bytes()))
+    assert as_source(gz).content_hash() == as_source(demo_csv).content_hash()
+
+
+def _import(config: Config, source: Source) -> None:
+    import_csv(
+        config=config,
+        csv_file=source,
+        extract=formats.extract_demo,
+        csv_args=dict(delimiter=";"),
+    )
@@ -0,0 +1,166 @@
+import json
+from pathlib import Path
+
+import pytest
+
+from typer.testing import CliRunner
+
+from roastery import Config, edit, formats, make_cli
+from roastery.importer import Entry, iter_entries, process_entries
+from roastery.registry import FormatRegistry, default_registry
+from roastery.synthesis import load_rules, synthesize, write_rules
+
+
+@pytest.fixture
+def registry(config: Config) -> FormatRegistry:
+    return default_registry(config)
+
+
+@pytest.fixture
+def entries(config: Config) -> list[Entry]:
+    config.statements_dir.mkdir()
+    csv_file = config.statements_dir / "test.csv"
+    csv_file.write_text("""\
+"date";"payee";"description";"amount";"type";"balance_after"
+"2024-05-01";"Supermarket Inc.";"Card No: 1923; Transaction ID: 1001";"-10.00";"CARD";"990.00"
+"2024-05-02";"SUPERMARKET INC.";"Card No: 1923; Transaction ID: 1002";"-11.00";"CARD";"979.00"
+"2024-05-03";"Supermarket Inc.";"Card No: 1923; Transaction ID: 1003";"-12.00";"CARD";"967.00"
+"2024-05-04";"Supermarket Inc.";"Card No: 1923; Transaction ID: 1004";"-13.00";"CARD";"954.00"
+"2024-05-05";"Supermarket Inc.";"Card No: 1923; Transaction ID: 1005";"-14.00";"CARD";"940.00"
+"2024-05-06";"Employer";"Salary May";"3500.00";"TSFR";"4440.00"
+"2024-05-07";"Employer";"Bonus";"500.00";"TSFR";"4940.00"
+"2024-05-08";"Supermarket Amsterdam";"Card No: 1923; Transaction ID: 1006";"-15.00";"CARD";"4925.00"
+""")
+    return list(
+        iter_entries(
+            csv_file=csv_file,
+            config=config,
+            extract=formats.extract_demo,
+            csv_args=dict(delimiter=";"),
+        )
+    )
+
+
+def groceries(entry: Entry) -> edit.ManualEdits:
+    return {
+        "account": "Expenses:Groceries",
+        "payee": "Supermarket",
+        "narration": entry.narration.value,
+    }
+
+
+def test_synthesize(
+    config: Config, registry: FormatRegistry, entries: list[Entry]
+) -> None:
+    edits = {entry.digest: groceries(entry) for entry in entries[:4]}
+    edits[entries[5].digest] = {"account": "Income:Salary"}
+    edit.save(config, edits, set())
+
+    result = synthesize(config, registry)
+
+    [rule] = result.rules
+    assert (rule.field, rule.key) == ("payee", "supermarket inc.")
+    assert (rule.account, rule.payee) == ("Expenses:Groceries", "Supermarket")
+    assert (rule.support, rule.confidence, rule.matches, rule.unedited) == (
+        4,
+        1.0,
+        5,
+        1,
+    )
+    assert result.redundant == {entry.digest for entry in entries[:4]}
+    assert result.edits == 5
+
+
+def test_keeps_edits_that_change_more(
+    config: Config, registry: FormatRegistry, entries: list[Entry]
+) -> None:
+    edits = {entry.digest: groceries(entry) for entry in entries[:4]}
+    edits[entries[0].digest] |= {"narration": "Weekly shopping"}
+    edits[entries[1].digest] |= {"tags": ["holiday"]}
+    edit.save(config, edits, set())
+
+    result = synthesize(config, registry)
+
+    assert len(result.rules) == 1
+    assert result.redundant == {entries[2].digest, entries[3].digest}
+
+
+def test_rejects_rules_that_contradict_skips(
+    config: Config, registry: FormatRegistry, entries: list[Entry]
+) -> None:
+    edits = {entry.digest: groceries(entry) for entry in entries[:4]}
+    edit.save(config, edits, {entries[4].digest})
+
+    result = synthesize(config, registry)
+    assert result.rules == []
+    rejected = [(rule.field, rule.confidence, why) for rule, why in result.rejected]
+    assert rejected == [
+        ("payee", 0.8, "only 4 of 5 matching entries agree"),
+        ("narration", 0.8, "only 4 of 5 matching entries agree"),
+    ]
+
+    assert synthesize(config, registry, min_confidence=0.8).rules
+
+
+def test_narration_rules(
+    config: Config, registry: FormatRegistry, entries: list[Entry]
+) -> None:
+    # The payees differ, so only the narration template has enough support.
+    edits = {
+        entry.digest: groceries(entry) | {"payee": entry.payee.value}
+        for entry in [entries[0], entries[1], entries[7]]
+    }
+    edit.save(config, edits, set())
+
+    assert synthesize(config, registry, min_support=4).rules == []
+
+    result = synthesize(config, registry)
+    [rule] = result.rules
+    assert (rule.field, rule.key) == ("narration", "card no: #; transaction id: #")
+    assert (rule.payee, rule.matches, rule.unedited) == (None, 6, 3)
+    assert result.redundant == edits.keys()
+
+
+def test_rules_applied_on_import(
+    tmp_path: Path, registry: FormatRegistry, entries: list[Entry]
+) -> None:
+    config = Config.with_defaults(project_root=tmp_path, apply_rules=True)
+    edit.save(config, {entry.digest: groceries(entry) for entry in entries[:4]}, set())
+    result = synthesize(config, registry)
+    write_rules(config, result.rules)
+    assert edit.remove_manual_edits(config, result.redundant) == 4
+    assert json.loads(config.manual_edits_path.read_text()) == {}
+
+    assert load_rules(config).rules == result.rules
+    imported = list(process_entries(entries, config=config))
+    assert [entry.account.value for entry in imported] == [
+        *["Expenses:Groceries"] * 5,
+        None,
+        None,
+        None,
+    ]
+    assert {entry.payee.value for entry in imported[:5]} == {"Supermarket"}
+
+
+def test_write_twice_keeps_rules(
+    tmp_path: Path, registry: FormatRegistry, entries: list[Entry]
+) -> None:
+    config = Config.with_defaults(project_root=tmp_path, apply_rules=True)
+    edit.save(config, {entry.digest: groceries(entry) for entry in entries[:5]}, set())
+    cli = make_cli(config, registry=default_registry(config))
+
+    for _ in range(2):
+        res = CliRunner().invoke(cli, ["synthesize", "--write"])
+        assert res.exit_code == 0, res.output
+    assert edit.read_manual_edits(config) == {}
+
+    [rule] = load_rules(config).rules
+    assert (rule.field, rule.key) == ("payee", "supermarket inc.")
+    imported = list(process_entries(entries, config=config))
+    assert [entry.account.value for entry in imported[:5]] == ["Expenses:Groceries"] * 5
+
+    # Later edits that contradict a stored rule count against it.
+    edit.save(config, {entries[0].digest: {"account": "Expenses:Other"}}, set())
+    [kept] = synthesize(config, registry, min_confidence=0.8).rules
+    assert (kept.key, kept.confidence) == (rule.key, 0.8)
+    assert [r.key for r, _ in synthesize(config, registry).rejected] == [rule.key]
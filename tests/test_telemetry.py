@@ -0,0 +1,124 @@
+import io
+import json
+import subprocess
+from pathlib import Path
+
+import pytest
+from typer.testing import CliRunner
+
+from roastery import Config, edit, make_cli, telemetry, term
+from roastery.telemetry import sessions_path, summarize
+
+
+@pytest.fixture
+def timed(tmp_path: Path) -> Config:
+    return Config.with_defaults(project_root=tmp_path, record_timings=True)
+
+
+def event(session: str, kind: str, name: str, at: float, duration: float) -> str:
+    return json.dumps(
+        dict(session=session, event=kind, name=name, at=at, duration=duration)
+    )
+
+
+def test_edit_session_is_recorded(
+    timed: Config, journal: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    answers = ["Income:Salary", "Skip", ""]
+
+    class Fzf:
+        def __init__(self, cmd, *, stdin, stdout, text) -> None:
+            self.stdin = io.StringIO()
+            self.stdout = io.StringIO(answers.pop(0) + "\n")
+
+        def __enter__(self) -> "Fzf":
+            return self
+
+        def __exit__(self, *exc) -> None:
+            pass
+
+    monkeypatch.setattr(subprocess, "Popen", Fzf)
+    monkeypatch.setattr(term, "prompt", lambda *args, default=None, **kwargs: default)
+    monkeypatch.setattr(term, "log", lambda *contents, **kwargs: None)
+    edit.main(timed)
+
+    lines = sessions_path(timed).read_text().splitlines()
+    events = [json.loads(line) for line in lines]
+    assert len({e["session"] for e in events}) == 1
+    names = [(e["event"], e["name"]) for e in events if e["event"] != "end"]
+    assert [name for name in names if name[0] == "prompt"] == [
+        ("prompt", "fzf"),
+        ("prompt", "ask"),
+        ("prompt", "ask"),
+        ("prompt", "fzf"),
+        ("prompt", "fzf"),
+    ]
+    foreground = {e.get("name") for e in events if not e.get("background")}
+    assert {"load_journal", "get_unprocessed", "final_write"} <= foreground
+    assert ("phase", "write") in names
+    # Starting fzf is tool time, separate from waiting for the selection.
+    assert names.count(("phase", "fzf_start")) == 3
+    assert events[-1]["counts"] == {"classified": 1, "skipped": 1}
+
+
+def test_not_recorded_by_default(config: Config, journal: Path, monkeypatch) -> None:
+    monkeypatch.setattr(term, "select_fuzzy_search", lambda *a, **kw: "Skip")
+    monkeypatch.setattr(term, "log", lambda *contents, **kwargs: None)
+    edit.main(config)
+    assert not sessions_path(config).exists()
+
+
+def test_summarize(timed: Config) -> None:
+    path = sessions_path(timed)
+    path.parent.mkdir(parents=True)
+    path.write_text(
+        "\n".join(
+            [
+                event("a", "phase", "load_journal", 0.0, 1.5),
+                event("a", "prompt", "fzf", 2.0, 10.0),
+                event("a", "prompt", "ask", 12.1, 3.0),
+                event("a", "phase", "write", 12.2, 0.5),
+                event("a", "prompt", "fzf", 15.5, 4.0),
+                json.dumps(
+                    {
+                        "session": "a",
+                        "event": "end",
+                        "duration": 30.0,
+                        "counts": {"classified": 2, "skipped": 1},
+                    }
+                ),
+                # Cut off before it ended.
+                event("b", "prompt", "fzf", 1.0, 5.0),
+                event("b", "prompt", "fzf", 6.2, 8.8),
+                "{not json",
+            ]
+        )
+        + "\n"
+    )
+
+    stats = summarize(timed)
+    assert stats.sessions == 2
+    assert stats.startup == [2.0, 1.0]
+    assert stats.latency == pytest.approx([0.1, 0.2, 0.4])
+    assert stats.latency_percentile(0.5) == pytest.approx(0.2)
+    assert stats.latency_percentile(0.95) == pytest.approx(0.4)
+    assert stats.wait == pytest.approx(30.8)
+    assert stats.tool == pytest.approx(14.2)
+    assert stats.phases == {"load_journal": [1.5], "write": [0.5]}
+    assert stats.items_per_minute == pytest.approx(2 / (45 / 60))
+
+
+def test_stats_cmd(timed: Config) -> None:
+    res = CliRunner().invoke(make_cli(timed), ["stats"])
+    assert res.exit_code == 0
+    assert "No sessions recorded yet" in res.output
+
+    with telemetry.session(timed):
+        with telemetry.phase("load_journal"):
+            pass
+        telemetry.count("classified")
+
+    res = CliRunner().invoke(make_cli(timed), ["stats"])
+    assert res.exit_code == 0
+    assert "load_journal" in res.output
+    assert "Classified:       1" in res.output
@@ -0,0 +1,97 @@
+from pathlib import Path
+
+from typer.testing import CliRunner
+
+from roastery import Config, formats, import_csv, make_cli
+from roastery.importer import Entry
+from roastery.templates import TemplateIndex, TemplateStage, template_of
+
+
+def test_template_of() -> None:
+    assert (
+        template_of("Card No: 1923; Transaction ID: 128938958283801")
+        == "card no: #; transaction id: #"
+    )
+    assert template_of("Betaalautomaat 12:03 pasnr. 042") == (
+        "betaalautomaat <time> pasnr. #"
+    )
+    assert template_of("SEPA  Incasso 2024-05-01 NL12ABNA0123456789") == (
+        "sepa incasso <date> <iban>"
+    )
+    assert template_of("Rent June") == "rent june"
+
+
+def test_index_clusters_near_duplicates() -> None:
+    index = TemplateIndex()
+    first = "card no: #; transaction id: #"
+    assert index.canonical(first) == first
+    assert index.canonical("card no: #, transaction id: #") == first
+    assert index.canonical("rent june") == "rent june"
+    assert len(index) == 2
+
+
+def test_index_roundtrip(tmp_path: Path) -> None:
+    index = TemplateIndex()
+    index.canonical("card no: #; transaction id: #")
+    index.canonical("card no: #, transaction id: #")
+    index.save(tmp_path / "templates.json")
+
+    loaded = TemplateIndex.load(tmp_path / "templates.json")
+    assert loaded.canonical("card no: #, transaction id: #") == (
+        "card no: #; transaction id: #"
+    )
+    assert len(TemplateIndex.load(tmp_path / "templates.json", threshold=0.5)) == 0
+
+
+def test_stage(config: Config, demo_csv: Path) -> None:
+    seen: list[Entry] = []
+
+    def rule(entry: Entry) -> None:
+        seen.append(entry)
+        if entry.narration_template == "card no: #; transaction id: #":
+            entry.narration.cleaned = "Card payment"
+
+    with TemplateStage(config, meta=True) as templates:
+
+        def clean(entry: Entry) -> None:
+            templates(entry)
+            rule(entry)
+
+        import_csv(
+            config=config,
+            csv_file=demo_csv,
+            extract=formats.extract_demo,
+            clean=clean,
+            csv_args=dict(delimiter=";"),
+        )
+
+    assert [entry.payee_template for entry in seen] == [
+        "employer",
+        "supermarket inc.",
+        "housing inc.",
+    ]
+    text = demo_csv.with_suffix(".beancount").read_text()
+    assert '"Supermarket Inc." "Card payment"' in text
+    assert 'narration_template: "card no: #; transaction id: #"' in text
+    assert (config.state_dir / "templates.json").exists()
+
+
+def test_export_sorted_by_template(
+    config: Config, demo_csv: Path, journal: Path
+) -> None:
+    with TemplateStage(config, meta=True) as templates:
+        import_csv(
+            config=config,
+            csv_file=demo_csv,
+            extract=formats.extract_demo,
+            clean=templates,
+            csv_args=dict(delimiter=";"),
+        )
+
+    out = config.statements_dir / "queue.tsv"
+    result = CliRunner().invoke(
+        make_cli(config), ["export", str(out), "--sort", "template"]
+    )
+    assert result.exit_code == 0, result.output
+    payees = [line.split("\t")[4] for line in out.read_text().splitlines()[1:]]
+    assert payees == ["Supermarket Inc.", "Housing Inc.", "Employer"]
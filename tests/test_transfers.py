@@ -0,0 +1,93 @@
+import datetime
+import itertools
+
+from beancount.core import data
+from beancount.core.number import D
+
+from roastery.importer import Entry, load_transactions
+from roastery.transfers import match_transfers
+
+
+def entry(digest: str, day: int, amount: str, asset_account: str) -> Entry:
+    return Entry.from_row(
+        digest=digest,
+        date=datetime.date(2024, 5, day),
+        amount=data.Amount(D(amount), "EUR"),
+        asset_account=asset_account,
+    )
+
+
+def test_match_transfers() -> None:
+    bank = [
+        entry("b1", 1, "-100.00", "Assets:Bank"),
+        entry("b2", 10, "-50.00", "Assets:Bank"),
+        entry("b3", 20, "-75.00", "Assets:Bank"),
+    ]
+    card = [
+        # Too far away from b1.
+        entry("c0", 20, "100.00", "Assets:CreditCard"),
+        entry("c1", 3, "100.00", "Assets:CreditCard"),
+        # Both match b2, c3 is closer.
+        entry("c2", 8, "50.00", "Assets:CreditCard"),
+        entry("c3", 11, "50.00", "Assets:CreditCard"),
+        # Same account as b3.
+        entry("c4", 20, "75.00", "Assets:Bank"),
+    ]
+
+    transfers = match_transfers(itertools.chain(bank, card))
+
+    assert [(t.outgoing.digest, t.incoming.digest) for t in transfers] == [
+        ("b1", "c1"),
+        ("b2", "c3"),
+    ]
+    for t in transfers:
+        assert t.outgoing.links == t.incoming.links == {t.link}
+        assert t.outgoing.account.value == "Assets:Transfers"
+    assert card[2].account.value is None
+    assert bank[2].links == set()
+
+
+def test_match_many_of_the_same_amount() -> None:
+    n = 5000
+    bank = [entry(f"b{i:05}", 1 + i % 28, "-10.00", "Assets:Bank") for i in range(n)]
+    card = [
+        entry(f"c{i:05}", 1 + i % 28, "10.00", "Assets:CreditCard") for i in range(n)
+    ]
+    own = [entry(f"o{i:05}", 1 + i % 28, "10.00", "Assets:Bank") for i in range(n)]
+
+    transfers = match_transfers(itertools.chain(bank, own, card))
+
+    assert len(transfers) == n
+    assert all(t.outgoing.date == t.incoming.date for t in transfers)
+    assert len({t.incoming.digest for t in transfers}) == n
+    assert all(e.account.value is None for e in own)
+
+
+def test_match_transfers_skips_classified() -> None:
+    out = entry("b1", 1, "-100.00", "Assets:Bank")
+    out.account.edited = "Expenses:Rent"
+    assert match_transfers([out, entry("c1", 1, "100.00", "Assets:CreditCard")]) == []
+
+
+def test_transfers_balance() -> None:
+    entries = [
+        entry("b1", 1, "-100.00", "Assets:Bank"),
+        entry("c1", 2, "100.00", "Assets:CreditCard"),
+    ]
+    match_transfers(entries, account="Assets:Transfers")
+
+    loaded, errors, _ = load_transactions(e.as_transaction() for e in entries)
+    assert errors == []
+    totals = {}
+    for txn in loaded:
+        if not isinstance(txn, data.Transaction):
+            continue
+        for posting in txn.postings:
+            totals[posting.account] = (
+                totals.get(posting.account, 0) + posting.units.number
+            )
+    assert totals == {
+        "Assets:Bank": D("-100.00"),
+        "Assets:CreditCard": D("100.00"),
+        "Assets:Transfers": D("0.00"),
+    }